@@ -7,18 +7,30 @@ items and provides interactive Swagger documentation for easy testing.
 
 Endpoints:
     - GET /health: Health check endpoint
-    - GET /data: Retrieve all data items
+    - GET /data: Retrieve data items, paginated with ?limit=&after=
     - POST /data: Add a new data item
-    - GET /items: Retrieve all items with descriptions
+    - GET /items: Retrieve items with descriptions, paginated with ?limit=&after=
+    - GET /items/{item_id}: Retrieve one item
     - POST /items: Add a new item with description
 """
 
-from fastapi import FastAPI
+import bisect
+import json
+import os
+import threading
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 from datetime import datetime
 
 app = FastAPI()
 
+# Plik logu z dodanymi danymi (przezywaja restart), pusty = tylko pamiec
+DATA_LOG = os.getenv("DATA_LOG", "")
+# Ile gotowych stron trzymac miedzy dodaniami (klucz to limit i after z zapytania)
+PAGE_CACHE_SIZE = 256
+
 # Model danych
 class Item(BaseModel):
     name: str
@@ -42,17 +54,142 @@ class ItemWithDescription(BaseModel):
             }
         }
 
+class Journal:
+    """
+    Append-only log of posted rows as JSON lines [table, row], replayed on start
+    (a torn last line from a crash is cut off). Records are written under a lock
+    and made durable by sync(): the first waiting thread fsyncs for everybody
+    who wrote before it (group commit), the rest find their record synced.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "ab+")
+        self.write_lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.written = 0
+        self.synced = 0
+        self.rows = self._replay()
+
+    def _replay(self):
+        rows = {}
+        valid = 0
+        self.file.seek(0)
+        for line in self.file:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                table, row = json.loads(line)
+            except ValueError:
+                break
+            valid += len(line)
+            rows.setdefault(table, []).append(row)
+        self.file.truncate(valid)
+        return rows
+
+    def write(self, table, row):
+        """Buffers the record, returns its position for sync()"""
+        with self.write_lock:
+            self.file.write(json.dumps([table, row], ensure_ascii=False).encode() + b"\n")
+            self.written += 1
+            return self.written
+
+    def sync(self, position):
+        with self.sync_lock:
+            if self.synced >= position:
+                return
+            with self.write_lock:
+                self.file.flush()
+                target = self.written
+            os.fsync(self.file.fileno())
+            self.synced = target
+
+
+class Store:
+    """
+    In-memory table: ids allocated under a lock (handlers run in a threadpool,
+    len(rows) + 1 could repeat an id), an id index, and each row encoded to JSON
+    once. Listed pages are cached as bytes until the next append. With a
+    journal, appended rows are logged under `table` and loaded back on start.
+    """
+
+    def __init__(self, rows, table=None, journal=None):
+        self.table = table
+        self.journal = journal
+        self.lock = threading.Lock()
+        self.ids = []
+        self.encoded = []
+        self.by_id = {}
+        self.pages = {}
+        for row in rows:
+            self._add(row)
+        if journal is not None:
+            for row in journal.rows.get(table, []):
+                self._add(row)
+        self.next_id = self.ids[-1] + 1 if self.ids else 1
+
+    def _add(self, row):
+        # Rows of concurrent appends can become durable out of id order
+        index = bisect.bisect_left(self.ids, row["id"])
+        self.ids.insert(index, row["id"])
+        self.encoded.insert(index, json.dumps(row, ensure_ascii=False).encode())
+        self.by_id[row["id"]] = row
+        return row
+
+    def append(self, values):
+        position = None
+        with self.lock:
+            row = {"id": self.next_id, **values}
+            self.next_id += 1
+            # Written in id order under the lock, the fsync happens outside it
+            if self.journal is not None:
+                position = self.journal.write(self.table, row)
+        if position is not None:
+            self.journal.sync(position)
+        # Served only once durable - a failed write or fsync leaves no row that vanishes on restart
+        with self.lock:
+            self._add(row)
+            self.pages = {}
+        return row
+
+    def page(self, limit, after):
+        """(JSON bytes, id of the last row if more rows follow)"""
+        pages = self.pages
+        cached = pages.get((limit, after))
+        if cached is None:
+            with self.lock:
+                start = bisect.bisect_right(self.ids, after) if after is not None else 0
+                end = min(start + limit, len(self.ids))
+                cached = (b"[" + b",".join(self.encoded[start:end]) + b"]",
+                          self.ids[end - 1] if end < len(self.ids) else None)
+                if pages is self.pages:
+                    # Every after= value is a new key, without a bound the cache grows per request
+                    if len(pages) >= PAGE_CACHE_SIZE:
+                        pages.clear()
+                    pages[(limit, after)] = cached
+        return cached
+
+
+def page_response(store, request, limit, after):
+    body, last = store.page(limit, after)
+    response = Response(body, media_type="application/json")
+    if last is not None:
+        response.headers["Link"] = f'<{request.url.include_query_params(after=last, limit=limit)}>; rel="next"'
+    return response
+
+
+journal = Journal(DATA_LOG) if DATA_LOG else None
+
 # Dane w pamięci
-data = [
+data = Store([
     {"id": 1, "name": "Element 1"},
     {"id": 2, "name": "Element 2"}
-]
+], "data", journal)
 
 # Items z opisami
-items = [
+items = Store([
     {"id": 1, "name": "Element 1", "description": "description 1"},
     {"id": 2, "name": "Element 2", "description": "description 2"}
-]
+], "items", journal)
 
 @app.get(
     "/health",
@@ -80,7 +217,7 @@ def get_health():
     "/data",
     responses={
         200: {
-            "description": "List of all data items",
+            "description": "Page of data items by id, Link header points to the next one",
             "content": {
                 "application/json": {
                     "example": [
@@ -92,14 +229,14 @@ def get_health():
         }
     }
 )
-def get_data():
-    return data
+def get_data(request: Request, limit: int = Query(50, ge=1, le=200), after: Optional[int] = None):
+    return page_response(data, request, limit, after)
 
 @app.get(
     "/items",
     responses={
         200: {
-            "description": "List of all items with descriptions",
+            "description": "Page of items by id, Link header points to the next one",
             "content": {
                 "application/json": {
                     "example": [
@@ -111,8 +248,28 @@ def get_data():
         }
     }
 )
-def get_items():
-    return items
+def get_items(request: Request, limit: int = Query(50, ge=1, le=200), after: Optional[int] = None):
+    return page_response(items, request, limit, after)
+
+@app.get(
+    "/items/{item_id}",
+    responses={
+        200: {
+            "description": "Item with description",
+            "content": {
+                "application/json": {
+                    "example": {"id": 1, "name": "Element 1", "description": "Opis"}
+                }
+            }
+        },
+        404: {"description": "Item not found"}
+    }
+)
+def get_item(item_id: int):
+    item = items.by_id.get(item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return item
 
 @app.post(
     "/items",
@@ -132,13 +289,10 @@ def get_items():
     }
 )
 def add_item(item: ItemWithDescription):
-    new_item = {
-        "id": len(items) + 1,
+    return items.append({
         "name": item.name,
         "description": item.description
-    }
-    items.append(new_item)
-    return new_item
+    })
 
 @app.post(
     "/data",
@@ -157,9 +311,6 @@ def add_item(item: ItemWithDescription):
     }
 )
 def add_data(item: Item):
-    new_item = {
-        "id": len(data) + 1,
+    return data.append({
         "name": item.name
-    }
-    data.append(new_item)
-    return new_item
\ No newline at end of file
+    })
\ No newline at end of file
@@ -1,12 +1,17 @@
+import copy
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from database import supabase, SUPABASE_URL, SUPABASE_ANON_KEY
-from supabase import create_client, Client
+from supabase import create_client
+from postgrest import SyncPostgrestClient
 from schemas import UserAuth
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 security = HTTPBearer()
 
+# Shared PostgREST client - one HTTP connection pool (keep-alive) for all requests
+_postgrest = create_client(SUPABASE_URL, SUPABASE_ANON_KEY).postgrest
+
 @router.post('/register', status_code=201)
 async def register(user_data: UserAuth):
     try:
@@ -45,7 +50,9 @@ async def get_current_user(
 # NEW: Get authenticated Supabase client
 def get_authenticated_supabase(
     credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> Client:
-    client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-    client.postgrest.auth(credentials.credentials)
+) -> SyncPostgrestClient:
+    # Copy of the shared client, only the Authorization header is different
+    client = copy.copy(_postgrest)
+    client.headers = _postgrest.headers.copy()
+    client.auth(credentials.credentials)
     return client
\ No newline at end of file
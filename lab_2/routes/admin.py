@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from auth import get_current_user, get_authenticated_supabase
-from supabase import Client
+from postgrest import SyncPostgrestClient
 from database import supabase as admin_supabase
 
 router = APIRouter(prefix='/admin', tags=['admin'])
@@ -16,7 +16,7 @@ async def require_admin(user = Depends(get_current_user)):
 @router.get('/users')
 async def get_all_users(
     user = Depends(require_admin),
-    supabase: Client = Depends(get_authenticated_supabase)
+    supabase: SyncPostgrestClient = Depends(get_authenticated_supabase)
 ):
     response = supabase.table('profiles').select('id, email, role, created_at').execute()
     return response.data
@@ -25,7 +25,7 @@ async def get_all_users(
 async def delete_user(
     user_id: str,
     user = Depends(require_admin),
-    supabase: Client = Depends(get_authenticated_supabase)
+    supabase: SyncPostgrestClient = Depends(get_authenticated_supabase)
 ):
     check_response = admin_supabase.table('profiles').select('id').eq('id', user_id).execute()
     
@@ -1,14 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends
 from schemas import TaskCreate, TaskUpdate, Task
 from auth import get_current_user, get_authenticated_supabase
-from supabase import Client
+from postgrest import SyncPostgrestClient
 
 router = APIRouter(prefix='/tasks', tags=['tasks'])
 
 @router.get('/')
 async def get_tasks(
     user = Depends(get_current_user),
-    supabase: Client = Depends(get_authenticated_supabase)
+    supabase: SyncPostgrestClient = Depends(get_authenticated_supabase)
 ):
     response = supabase.table('tasks').select('*').order(
         'created_at', desc=True).execute()
@@ -18,7 +18,7 @@ async def get_tasks(
 async def create_task(
     task: TaskCreate, 
     user = Depends(get_current_user),
-    supabase: Client = Depends(get_authenticated_supabase)
+    supabase: SyncPostgrestClient = Depends(get_authenticated_supabase)
 ):
     response = supabase.table('tasks').insert(
         {'title': task.title}).execute()
@@ -29,7 +29,7 @@ async def update_task(
     task_id: str, 
     task: TaskUpdate,
     user = Depends(get_current_user),
-    supabase: Client = Depends(get_authenticated_supabase)
+    supabase: SyncPostgrestClient = Depends(get_authenticated_supabase)
 ):
 
     response = supabase.table('tasks').update(
@@ -53,7 +53,7 @@ async def update_task(
 async def delete_task(
     task_id: str, 
     user = Depends(get_current_user),
-    supabase: Client = Depends(get_authenticated_supabase)
+    supabase: SyncPostgrestClient = Depends(get_authenticated_supabase)
 ):
 
     response = supabase.table('tasks').delete().eq('id', task_id).execute()
@@ -1,34 +1,33 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from database import supabase, SUPABASE_URL, SUPABASE_ANON_KEY
-from supabase import create_client, Client
+from database import supabase
+from postgrest import AsyncPostgrestClient
 from schemas import UserAuth
 
 from infrastructure.middleware.rateLimit import limiter
+from infrastructure.database.pool import postgrest_pool
+from infrastructure.monitoring.upstream import call_auth
+from infrastructure.cache.roles import get_role
+from infrastructure.security.tokens import TokenVerifier
+from infrastructure.security.passwords import password_policy
 from schemas import LoginResponse
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 security = HTTPBearer(auto_error=False)
 
+async def _get_user_remote(token: str):
+    return await call_auth(supabase.auth.get_user, token)
+
+# Verifies tokens locally, supabase.auth.get_user is only used as a fallback
+token_verifier = TokenVerifier(remote=_get_user_remote)
+
 @router.post('/register', status_code=201)
 async def register(request: Request, user_data: UserAuth):
-    import re
-    v = user_data.password
-    if len(v) < 8:
-        raise HTTPException(400, 'Password must be at least 8 characters long')
-    if not re.search(r'[A-Z]', v):
-        raise HTTPException(400, 'Password must contain an uppercase letter')
-    if not re.search(r'[a-z]', v):
-        raise HTTPException(400, 'Password must contain a lowercase letter')
-    if not re.search(r'[0-9]', v):
-        raise HTTPException(400, 'Password must contain a digit')
-    if not re.search(r'[^A-Za-z0-9]', v):
-        raise HTTPException(400, 'Password must contain a special character')
-    weak = ['123', 'password', 'abc', '1234', 'qwerty']
-    if v.lower() in weak:
-        raise HTTPException(400, 'Password too weak')
+    error = password_policy.check(user_data.password)
+    if error:
+        raise HTTPException(400, error)
     try:
-        response = supabase.auth.sign_up({
+        response = await call_auth(supabase.auth.sign_up, {
             'email': user_data.email,
             'password': user_data.password
         })
@@ -38,9 +37,7 @@ async def register(request: Request, user_data: UserAuth):
         user_email = user_obj.email if hasattr(user_obj, 'email') else user_obj.get('email')
         role = 'user'
         try:
-            profile_response = supabase.table('profiles').select('role').eq('id', user_id).execute()
-            if profile_response.data and 'role' in profile_response.data[0]:
-                role = profile_response.data[0]['role']
+            role = await get_role(user_id) or 'user'
         except Exception:
             pass
         user_data_out = {
@@ -58,7 +55,7 @@ async def login(request: Request, user_data: UserAuth):
     max_body_size = 1024 * 1024  # 1MB
     body = await request.body()
     try:
-        response = supabase.auth.sign_in_with_password({
+        response = await call_auth(supabase.auth.sign_in_with_password, {
             'email': user_data.email,
             'password': user_data.password
         })
@@ -67,9 +64,7 @@ async def login(request: Request, user_data: UserAuth):
         user_email = user_obj.email if hasattr(user_obj, 'email') else user_obj.get('email')
         role = 'user'
         try:
-            profile_response = supabase.table('profiles').select('role').eq('id', user_id).execute()
-            if profile_response.data and 'role' in profile_response.data[0]:
-                role = profile_response.data[0]['role']
+            role = await get_role(user_id) or 'user'
         except Exception:
             pass
         user_data_out = {
@@ -87,15 +82,13 @@ async def get_current_user(
     if credentials is None or not credentials.credentials:
         raise HTTPException(401, 'Not authenticated')
     try:
-        user = supabase.auth.get_user(credentials.credentials)
-        return user
+        return await token_verifier.verify(credentials.credentials)
     except Exception:
         raise HTTPException(401, 'Invalid token')
 
 
 def get_authenticated_supabase(
     credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> Client:
-    client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-    client.postgrest.auth(credentials.credentials)
-    return client
\ No newline at end of file
+) -> AsyncPostgrestClient:
+    # Per-request view over the shared connection pool, only Authorization differs
+    return postgrest_pool.for_token(credentials.credentials)
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""Minimal ASGI driver - calls an app without a server or HTTP client in the way"""
+
+import asyncio
+import time
+
+
+def client_address(i: int) -> tuple:
+    return (f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}', 50000)
+
+
+async def call(app, method: str = 'GET', path: str = '/', headers=(), body: bytes = b'',
+               client=('127.0.0.1', 50000), chunk_size: int = 65536):
+    """Run one request through `app`, returns (status, headers, body)"""
+    raw_headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': raw_headers,
+        'client': client,
+        'server': ('testserver', 80),
+    }
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b'']
+    position = 0
+    response = {'status': None, 'headers': [], 'body': []}
+
+    async def receive():
+        nonlocal position
+        if position < len(chunks):
+            position += 1
+            return {'type': 'http.request', 'body': chunks[position - 1], 'more_body': position < len(chunks)}
+        await asyncio.sleep(3600)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = message.get('headers', [])
+        elif message['type'] == 'http.response.body':
+            response['body'].append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return response['status'], response['headers'], b''.join(response['body'])
+
+
+async def measure(app, requests: int, **kwargs) -> float:
+    """Mean wall time per request in microseconds, client address rotates per request"""
+    started = time.perf_counter()
+    for i in range(requests):
+        await call(app, client=client_address(i), **kwargs)
+    return (time.perf_counter() - started) / requests * 1e6
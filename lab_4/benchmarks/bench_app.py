@@ -0,0 +1,233 @@
+"""
+Load test of the whole app in process: requests go through httpx's ASGI
+transport into main.app (full middleware stack, auth, routes, serialization)
+and Supabase is replaced by the in-memory stub, so results depend only on
+this code. Each scenario runs at every concurrency level of the sweep and
+reports throughput and p50/p99 latency.
+
+The /auth/login limit (7/minute) is switched off, the global limit is raised
+so no scenario is answered with 429. health_bare serves the same route from
+an app without the middleware - its difference to health is the cost of the
+middleware stack. live and ready are the load balancer probes answered by
+the pipeline itself, ready from the background probe of the stub.
+
+Run from lab_4/:
+    python -m benchmarks.bench_app [--scenarios list create] [--concurrency 1 10 50]
+        [--requests 2000] [--output results.json] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from devtools import supabase_stub
+
+STUB_URL = 'http://supabase.stub'
+
+# Must be in place before main (and the modules reading env at import) is imported
+os.environ.update({
+    'SUPABASE_URL': STUB_URL,
+    'SUPABASE_ANON_KEY': supabase_stub.ANON_KEY,
+    'SUPABASE_JWT_SECRET': supabase_stub.JWT_SECRET,
+    'SENTRY_DSN': '',
+    'AUTH_VERIFY_MODE': 'local',
+    'RATE_LIMIT_STORAGE': 'memory',
+    'RATE_LIMIT_GLOBAL_LIMIT': str(10**9),
+    'TASK_EVENTS_SOURCE': 'local',
+    'METRICS_DIR': '',
+    'PASSWORD_BLOOM_PATH': '',
+})
+
+import httpx  # noqa: E402
+
+USERS = 20
+TASKS_PER_USER = 100
+PASSWORD = 'Benchmark#Password1'
+
+SCENARIOS = ('health', 'health_bare', 'live', 'ready', 'login', 'list', 'create', 'update', 'delete')
+
+
+def install_stub(stub: supabase_stub.SupabaseStub):
+    """Point the app's Supabase clients at the stub, returns main.app"""
+    import main
+    from database import supabase
+    from infrastructure.database.pool import postgrest_pool
+    from infrastructure.monitoring.health import upstream_probe
+
+    postgrest_pool.transport = httpx.MockTransport(stub.handle)
+    upstream_probe.transport = httpx.MockTransport(stub.handle)
+    auth_client = httpx.Client(transport=httpx.MockTransport(stub.handle))
+    supabase.auth._http_client = auth_client
+    supabase.auth.admin._http_client = auth_client
+    # Login throughput is the point here, not the 7/minute limit
+    main.limiter.enabled = False
+    return main.app
+
+
+def bare_app():
+    from fastapi import FastAPI
+    from routes import last_lessons_endpoints
+
+    app = FastAPI()
+    app.include_router(last_lessons_endpoints.router)
+    return app
+
+
+class Fixture:
+    """Users with tokens and tasks, created directly in the stub"""
+
+    def __init__(self, stub: supabase_stub.SupabaseStub):
+        self.stub = stub
+        self.users = [stub.create_user(f'bench{i}@example.com', PASSWORD) for i in range(USERS)]
+        self.tokens = [stub.access_token(user) for user in self.users]
+        for user in self.users:
+            stub.create_tasks(user['id'], TASKS_PER_USER)
+
+    def headers(self, i: int) -> dict:
+        return {'Authorization': f'Bearer {self.tokens[i % USERS]}'}
+
+    def task_ids(self, i: int) -> list:
+        user_id = self.users[i % USERS]['id']
+        return [task['id'] for task in self.stub.tables['tasks'].values() if task['user_id'] == user_id]
+
+
+def build_requests(scenario: str, fixture: Fixture, count: int) -> tuple:
+    """([(method, path, kwargs)], expected status) for `count` requests of a scenario"""
+    if scenario in ('health', 'health_bare'):
+        return [('GET', '/health', {})] * count, 200
+    if scenario == 'live':
+        return [('GET', '/health/live', {})] * count, 200
+    if scenario == 'ready':
+        return [('GET', '/health/ready', {})] * count, 200
+    if scenario == 'login':
+        return [('POST', '/auth/login', {'json': {'email': fixture.users[i % USERS]['email'], 'password': PASSWORD}})
+                for i in range(count)], 200
+    if scenario == 'list':
+        return [('GET', '/tasks/?limit=50', {'headers': fixture.headers(i)}) for i in range(count)], 200
+    if scenario == 'create':
+        return [('POST', '/tasks/', {'headers': fixture.headers(i), 'json': {'title': f'Bench task {i}'}})
+                for i in range(count)], 201
+    if scenario == 'update':
+        ids = [fixture.task_ids(u) for u in range(USERS)]
+        return [('PATCH', f'/tasks/{ids[i % USERS][i // USERS % len(ids[i % USERS])]}',
+                 {'headers': fixture.headers(i), 'json': {'completed': i % 2 == 0}})
+                for i in range(count)], 200
+    if scenario == 'delete':
+        # One fresh task per request, spread over the users
+        for user in fixture.users:
+            fixture.stub.create_tasks(user['id'], count // USERS + 1, title='Doomed')
+        doomed = [[task['id'] for task in fixture.stub.tables['tasks'].values()
+                   if task['user_id'] == user['id'] and task['title'].startswith('Doomed')]
+                  for user in fixture.users]
+        return [('DELETE', f'/tasks/{doomed[i % USERS][i // USERS]}', {'headers': fixture.headers(i)})
+                for i in range(count)], 204
+    raise ValueError(f'Unknown scenario: {scenario}')
+
+
+def percentile(sorted_values: list, share: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(share * len(sorted_values)))]
+
+
+async def run_level(app, requests: list, expected: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    position = 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        async def worker():
+            nonlocal position, errors
+            while position < len(requests):
+                method, path, kwargs = requests[position]
+                position += 1
+                started = time.perf_counter()
+                response = await client.request(method, path, **kwargs)
+                latencies.append(time.perf_counter() - started)
+                errors += response.status_code != expected
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1e3, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1e3, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1e3, 3),
+    }
+
+
+async def run(scenarios, levels, count: int) -> dict:
+    stub = supabase_stub.SupabaseStub(STUB_URL)
+    app = install_stub(stub)
+    fixture = Fixture(stub)
+    results = {}
+
+    # Lifespan as under uvicorn: background tasks, and the pool closed at the end
+    async with app.router.lifespan_context(app):
+        for scenario in scenarios:
+            target = bare_app() if scenario == 'health_bare' else app
+            warmup, _ = build_requests(scenario, fixture, min(count, 50))
+            await run_level(target, warmup, 0, 1)
+            results[scenario] = []
+            for level in levels:
+                requests, expected = build_requests(scenario, fixture, count)
+                calls = stub.calls
+                result = await run_level(target, requests, expected, level)
+                result['upstream_calls_per_request'] = round((stub.calls - calls) / count, 2)
+                results[scenario].append(result)
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario and concurrency level')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = {
+        'environment': environment(),
+        'parameters': {'requests': args.requests, 'concurrency': args.concurrency,
+                       'users': USERS, 'tasks_per_user': TASKS_PER_USER},
+        'scenarios': asyncio.run(run(args.scenarios, args.concurrency, args.requests)),
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'scenario':<15}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'upstream':>10}")
+    for scenario, levels in results['scenarios'].items():
+        for r in levels:
+            print(f"{scenario:<15}{r['concurrency']:>6}{r['rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}"
+                  f"{r['errors']:>8}{r['upstream_calls_per_request']:>10}")
+
+
+if __name__ == '__main__':
+    main()
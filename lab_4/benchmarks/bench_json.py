@@ -0,0 +1,108 @@
+"""
+JSON cost of task lists: FastAPI's default path (jsonable_encoder + json.dumps)
+vs FastJSONResponse (orjson, returned directly), and body decoding with json
+vs orjson. Payloads of 1k and 10k tasks shaped like PostgREST rows.
+
+Run from lab_4/:
+    python -m benchmarks.bench_json [--sizes 1000 10000] [--repeat 20] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.asgi import call
+from infrastructure.serialization.codec import FastJSONResponse, dumps, loads
+
+
+def make_tasks(count: int) -> list:
+    return [
+        {
+            'id': f'5f0c6a52-0000-4000-8000-{i:012d}',
+            'title': f'Task number {i} with a reasonably long title',
+            'completed': i % 3 == 0,
+            'user_id': '0b7e3c55-1111-4222-8333-444455556666',
+            'created_at': f'2024-05-{i % 28 + 1:02d}T12:{i % 60:02d}:00.123456+00:00',
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(repeat: int, func) -> float:
+    """Fastest run in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1e3
+
+
+def build_app(tasks: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.get('/default')
+    async def default():
+        return tasks
+
+    @app.get('/fast')
+    async def fast():
+        return FastJSONResponse(tasks)
+
+    return app
+
+
+def run(sizes, repeat: int) -> dict:
+    results = {}
+    for size in sizes:
+        tasks = make_tasks(size)
+        body = json.dumps(tasks).encode()
+        assert loads(dumps(tasks)) == json.loads(JSONResponse(jsonable_encoder(tasks)).body)
+
+        app = build_app(tasks)
+        loop = asyncio.new_event_loop()
+        try:
+            endpoint = {
+                path: best_of(repeat, lambda path=path: loop.run_until_complete(call(app, path=path)))
+                for path in ('/default', '/fast')
+            }
+        finally:
+            loop.close()
+
+        results[f'{size} tasks'] = {
+            'body_kb': round(len(body) / 1024),
+            'encode_default_ms': round(best_of(repeat, lambda: JSONResponse(jsonable_encoder(tasks))), 2),
+            'encode_orjson_ms': round(best_of(repeat, lambda: FastJSONResponse(tasks)), 2),
+            'decode_json_ms': round(best_of(repeat, lambda: json.loads(body)), 2),
+            'decode_orjson_ms': round(best_of(repeat, lambda: loads(body)), 2),
+            'endpoint_default_ms': round(endpoint['/default'], 2),
+            'endpoint_fast_ms': round(endpoint['/fast'], 2),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = ('body_kb', 'encode_default_ms', 'encode_orjson_ms', 'decode_json_ms', 'decode_orjson_ms',
+               'endpoint_default_ms', 'endpoint_fast_ms')
+    print(f"{'payload':<14}" + ''.join(f'{c:>21}' for c in columns))
+    for name, r in results.items():
+        print(f'{name:<14}' + ''.join(f'{r[c]:>21}' for c in columns))
+
+
+if __name__ == '__main__':
+    main()
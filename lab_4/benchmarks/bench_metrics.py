@@ -0,0 +1,154 @@
+"""
+Cost of request metrics: MetricsStage bookkeeping alone (check + on_response +
+on_complete, no app), the same through a whole app compared to the pipeline
+without it, and rendering /metrics for many route series.
+
+Run from lab_4/:
+    python -m benchmarks.bench_metrics [--requests 20000] [--routes 50] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, Response
+from starlette.datastructures import MutableHeaders
+
+from benchmarks.asgi import call, measure
+from infrastructure.middleware.metrics import MetricsStage
+from infrastructure.middleware.pipeline import (
+    SecurityPipelineMiddleware, BodySizeLimit, HeaderSizeLimit, RequestContext, SecurityHeaders
+)
+from infrastructure.middleware.rateLimit import GlobalRateLimit, create_storage
+from infrastructure.monitoring.metrics import MetricsRegistry, Histogram, SIZE_BUCKETS
+
+
+class Route:
+    path = '/tasks/{task_id}'
+
+
+def stage_cost(requests: int) -> float:
+    """Microseconds of metrics work per request, measured on the stage itself"""
+    stage = MetricsStage()
+    route = Route()
+    headers = [(b'host', b'testserver'), (b'content-length', b'128')]
+    response_headers = [(b'content-type', b'application/json'), (b'content-length', b'512')]
+    loop = asyncio.new_event_loop()
+
+    async def run() -> float:
+        started = time.perf_counter()
+        for _ in range(requests):
+            scope = {'method': 'PATCH', 'path': '/tasks/1', 'headers': headers}
+            ctx = RequestContext(scope, None)
+            await stage.check(ctx)
+            scope['route'] = route
+            ctx.status = 200
+            stage.on_response(ctx, 200, MutableHeaders(raw=list(response_headers)))
+            stage.on_complete(ctx)
+        return (time.perf_counter() - started) / requests * 1e6
+
+    async def baseline() -> float:
+        # Same loop without the stage calls: scope/context/headers construction only
+        started = time.perf_counter()
+        for _ in range(requests):
+            scope = {'method': 'PATCH', 'path': '/tasks/1', 'headers': headers}
+            RequestContext(scope, None)
+            MutableHeaders(raw=list(response_headers))
+        return (time.perf_counter() - started) / requests * 1e6
+
+    try:
+        return loop.run_until_complete(run()) - loop.run_until_complete(baseline())
+    finally:
+        loop.close()
+
+
+def build_app(with_metrics: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get('/tasks/{task_id}')
+    async def get_task(task_id: str):
+        return Response(b'{}', media_type='application/json')
+
+    # A budget no benchmark run can exhaust, the limiter cost stays in both variants
+    stages = [BodySizeLimit(), GlobalRateLimit(create_storage('memory', limit=10**9)), HeaderSizeLimit(), SecurityHeaders()]
+    if with_metrics:
+        stages.insert(0, MetricsStage())
+    app.add_middleware(SecurityPipelineMiddleware, stages=stages)
+    return app
+
+
+async def app_cost(requests: int) -> dict:
+    timings = {}
+    for with_metrics in (False, True):
+        app = build_app(with_metrics)
+        await call(app, path='/tasks/1')  # warm up, builds the middleware stack
+        # Best of three evens out GC pauses and noisy neighbours
+        timings[with_metrics] = min([await measure(app, requests, path='/tasks/1') for _ in range(3)])
+    return {
+        'pipeline_us': round(timings[False], 2),
+        'pipeline_with_metrics_us': round(timings[True], 2),
+        'metrics_overhead_us': round(timings[True] - timings[False], 2),
+    }
+
+
+def render_cost(routes: int) -> dict:
+    registry = MetricsRegistry(directory='')
+    requests = registry.counter('http_requests_total', 'requests', ('method', 'route', 'status'))
+    duration = registry.histogram('http_request_duration_seconds', 'latency', ('method', 'route'))
+    size = registry.histogram('http_response_size_bytes', 'size', ('method', 'route'), SIZE_BUCKETS)
+    for i in range(routes):
+        for method in ('GET', 'POST', 'PATCH', 'DELETE'):
+            for status in ('200', '400', '404'):
+                requests.inc((method, f'/route{i}/{{id}}', status))
+            duration.observe(0.01 * (i % 10), (method, f'/route{i}/{{id}}'))
+            size.observe(100 * i, (method, f'/route{i}/{{id}}'))
+    started = time.perf_counter()
+    body = registry.render()
+    return {
+        'series': sum(len(metric.series) for metric in registry.metrics.values()),
+        'lines': body.count(b'\n'),
+        'render_ms': round((time.perf_counter() - started) * 1e3, 2),
+    }
+
+
+def observe_cost(count: int) -> float:
+    histogram = Histogram('h', 'h', ('method', 'route'))
+    labels = ('GET', '/tasks/{task_id}')
+    started = time.perf_counter()
+    for i in range(count):
+        histogram.observe(0.001 * (i & 1023), labels)
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def run(requests: int, routes: int) -> dict:
+    return {
+        'stage_us_per_request': round(stage_cost(requests), 3),
+        'app': asyncio.run(app_cost(requests)),
+        'render': render_cost(routes),
+        'histogram_observe_ns': round(observe_cost(requests * 10) * 1e3, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--routes', type=int, default=50, help='route templates for the /metrics render test')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.requests, args.routes)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    app = results['app']
+    render = results['render']
+    print(f"histogram observe:          {results['histogram_observe_ns']} ns")
+    print(f"MetricsStage per request:   {results['stage_us_per_request']} us")
+    print(f"pipeline request:           {app['pipeline_us']} us, with metrics {app['pipeline_with_metrics_us']} us "
+          f"(+{app['metrics_overhead_us']} us)")
+    print(f"/metrics render:            {render['series']} series, {render['lines']} lines in {render['render_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
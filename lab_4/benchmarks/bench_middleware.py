@@ -0,0 +1,85 @@
+"""
+Per-request overhead of the middleware stack: the legacy BaseHTTPMiddleware
+layers vs SecurityPipelineMiddleware, both measured against a bare app.
+
+Run from lab_4/:
+    python -m benchmarks.bench_middleware [--requests 20000] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+
+from fastapi import FastAPI, Request, Response
+
+from benchmarks import legacy_middleware
+from benchmarks.asgi import call, measure
+from infrastructure.middleware.pipeline import (
+    SecurityPipelineMiddleware, BodySizeLimit, HeaderSizeLimit, SecurityHeaders
+)
+from infrastructure.middleware.rateLimit import GlobalRateLimit
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get('/ping')
+    async def ping():
+        return Response(b'ok')
+
+    @app.post('/echo')
+    async def echo(request: Request):
+        return Response(await request.body())
+
+    if stack == 'legacy':
+        legacy_middleware.install(app)
+    elif stack == 'pipeline':
+        app.add_middleware(
+            SecurityPipelineMiddleware,
+            stages=[BodySizeLimit(), GlobalRateLimit(), HeaderSizeLimit(), SecurityHeaders()],
+        )
+    return app
+
+
+SCENARIOS = {
+    'GET /ping': {'method': 'GET', 'path': '/ping'},
+    'POST /echo 1KB': {
+        'method': 'POST', 'path': '/echo', 'body': b'x' * 1024,
+        'headers': [('content-type', 'application/octet-stream'), ('content-length', '1024')],
+    },
+}
+
+
+async def run(requests: int) -> dict:
+    results = {}
+    for name, request in SCENARIOS.items():
+        timings = {}
+        for stack in ('bare', 'legacy', 'pipeline'):
+            app = build_app(stack)
+            await call(app, **request)  # warm up, builds the middleware stack
+            timings[stack] = await measure(app, requests, **request)
+        results[name] = {
+            'bare_us': round(timings['bare'], 2),
+            'legacy_overhead_us': round(timings['legacy'] - timings['bare'], 2),
+            'pipeline_overhead_us': round(timings['pipeline'] - timings['bare'], 2),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.requests))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'scenario':<18}{'bare':>10}{'legacy +':>12}{'pipeline +':>12}  (us/request)")
+    for name, r in results.items():
+        print(f"{name:<18}{r['bare_us']:>10}{r['legacy_overhead_us']:>12}{r['pipeline_overhead_us']:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Breached-password Bloom filter: build time, file size, lookup latency,
+measured false positive rate and resident memory added by mapping the file.
+
+Run from lab_4/:
+    python -m benchmarks.bench_password_filter [--entries 1000000] [--fp-rate 0.001] [--json]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from infrastructure.security.passwords import BloomFilter, write_bloom_filter
+
+
+def resident_kb() -> int:
+    """RSS of this process from /proc (Linux)"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def run(entries: int, fp_rate: float, lookups: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), 'breached.bloom')
+    digests = (hashlib.sha1(f'breached-{i}'.encode()).digest() for i in range(entries))
+    started = time.perf_counter()
+    write_bloom_filter(digests, entries, path, fp_rate)
+    build_s = time.perf_counter() - started
+
+    hits = [f'breached-{i}' for i in range(0, entries, max(1, entries // lookups))][:lookups]
+    misses = [f'fresh-{i}' for i in range(lookups)]
+    # Mapped pages are shared page cache - the same pages serve every worker
+    before = resident_kb()
+    bloom = BloomFilter(path)
+
+    started = time.perf_counter()
+    found = sum(password in bloom for password in hits)
+    hit_us = (time.perf_counter() - started) / len(hits) * 1e6
+    started = time.perf_counter()
+    false_positives = sum(password in bloom for password in misses)
+    miss_us = (time.perf_counter() - started) / len(misses) * 1e6
+    after = resident_kb()
+    bloom.close()
+
+    result = {
+        'entries': entries,
+        'file_mb': round(os.path.getsize(path) / 1024 / 1024, 2),
+        'build_s': round(build_s, 1),
+        'hashes': bloom.hashes,
+        'lookup_hit_us': round(hit_us, 2),
+        'lookup_miss_us': round(miss_us, 2),
+        'found': f'{found}/{len(hits)}',
+        'false_positive_rate': round(false_positives / len(misses), 5),
+        'resident_kb_added': after - before,
+    }
+    os.remove(path)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=1_000_000)
+    parser.add_argument('--fp-rate', type=float, default=0.001)
+    parser.add_argument('--lookups', type=int, default=20_000)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    result = run(args.entries, args.fp_rate, args.lookups)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for name, value in result.items():
+        print(f'{name:<22}{value}')
+
+
+if __name__ == '__main__':
+    main()
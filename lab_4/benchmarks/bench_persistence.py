@@ -0,0 +1,140 @@
+"""
+Persistence of /data and /items: append throughput and latency of each backend
+through IndexedStore at several concurrency levels (group commit shares one
+fsync between the writers waiting for it), and restart time - loading the same
+rows from a log alone, from a snapshot, and from SQLite.
+
+Files go to a temporary directory, put it on the disk you deploy to with --dir:
+fsync cost is the whole story here.
+
+Run from lab_4/:
+    python -m benchmarks.bench_persistence [--appends 2000] [--concurrency 1 16 128]
+        [--restart-rows 100000] [--dir /var/tmp] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from infrastructure.database.memory import IndexedStore
+from infrastructure.database.persistence import LogPersistence, SQLitePersistence
+
+BACKENDS = {
+    'log': lambda path: LogPersistence(path + '.log', snapshot_every=10**9),
+    'sqlite': lambda path: SQLitePersistence(path + '.db'),
+    'sqlite-normal': lambda path: SQLitePersistence(path + '.db', synchronous='NORMAL'),
+}
+
+
+def percentile(sorted_values: list, share: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(share * len(sorted_values)))]
+
+
+async def appends(store: IndexedStore, count: int, concurrency: int) -> tuple:
+    latencies = []
+    remaining = count
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            await store.append({'name': f'Element {remaining}', 'description': 'Benchmark row'})
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return time.perf_counter() - started, sorted(latencies)
+
+
+def write_throughput(directory: str, count: int, levels) -> dict:
+    results = {}
+    for name, factory in BACKENDS.items():
+        results[name] = []
+        for level in levels:
+            persistence = factory(os.path.join(directory, f'{name}-{level}'))
+            store = IndexedStore(table='items', persistence=persistence)
+            elapsed, latencies = asyncio.run(appends(store, count, level))
+            results[name].append({
+                'concurrency': level,
+                'appends_per_s': round(count / elapsed, 1),
+                'records_per_commit': round(persistence.records / max(persistence.commits, 1), 1),
+                'p50_ms': round(percentile(latencies, 0.50) * 1e3, 3),
+                'p99_ms': round(percentile(latencies, 0.99) * 1e3, 3),
+            })
+            persistence.close()
+    return results
+
+
+def timed_open(factory) -> tuple:
+    started = time.perf_counter()
+    persistence = factory()
+    store = IndexedStore(table='items', persistence=persistence)
+    elapsed = time.perf_counter() - started
+    return persistence, len(store), elapsed
+
+
+def restart(directory: str, rows: int) -> dict:
+    log_path = os.path.join(directory, 'restart.log')
+    db_path = os.path.join(directory, 'restart.db')
+    # Written in bulk, one commit each, the restart is what is measured
+    batch = [('items', {'id': i, 'name': f'Element {i}', 'description': 'Benchmark row'}, None)
+             for i in range(1, rows + 1)]
+    log = LogPersistence(log_path, snapshot_every=10**9)
+    log._commit(batch)
+    log._file.close()
+    db = SQLitePersistence(db_path)
+    db._commit([(table, {key: value for key, value in row.items() if key != 'id'}, None)
+                for table, row, _ in batch])
+    db.close()
+
+    results = {}
+    log, loaded, results['log_only_s'] = timed_open(lambda: LogPersistence(log_path, snapshot_every=10**9))
+    log_size = os.path.getsize(log_path)
+    log.close()  # folds the log into the snapshot
+    snapshot, loaded_snapshot, results['snapshot_s'] = timed_open(lambda: LogPersistence(log_path))
+    snapshot.close()
+    db, loaded_db, results['sqlite_s'] = timed_open(lambda: SQLitePersistence(db_path))
+    db.close()
+    assert loaded == loaded_snapshot == loaded_db == rows
+    results = {key: round(value, 4) for key, value in results.items()}
+    results.update(rows=rows, log_bytes=log_size, snapshot_bytes=os.path.getsize(log_path + '.snapshot'))
+    return results
+
+
+def run(count: int, levels, rows: int, directory: str = None) -> dict:
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        return {
+            'appends': write_throughput(tmp, count, levels),
+            'restart': restart(tmp, rows),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--appends', type=int, default=2000, help='appends per backend and concurrency level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 128])
+    parser.add_argument('--restart-rows', type=int, default=100_000)
+    parser.add_argument('--dir', help='directory for the files (default: system temp)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.appends, args.concurrency, args.restart_rows, args.dir)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'backend':<15}{'conc':>6}{'appends/s':>12}{'per commit':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for backend, levels in results['appends'].items():
+        for r in levels:
+            print(f"{backend:<15}{r['concurrency']:>6}{r['appends_per_s']:>12}{r['records_per_commit']:>12}"
+                  f"{r['p50_ms']:>10}{r['p99_ms']:>10}")
+    r = results['restart']
+    print(f"\nrestart with {r['rows']} rows: log only {r['log_only_s'] * 1e3:.1f} ms ({r['log_bytes']} B), "
+          f"snapshot {r['snapshot_s'] * 1e3:.1f} ms ({r['snapshot_bytes']} B), sqlite {r['sqlite_s'] * 1e3:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
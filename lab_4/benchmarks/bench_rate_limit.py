@@ -0,0 +1,117 @@
+"""
+Rate limit engine at many distinct client keys: cost per hit, memory per key
+and eviction time, compared with the old datetime-list store.
+
+Run from lab_4/:
+    python -m benchmarks.bench_rate_limit [--keys 100000] [--passes 5] [--json]
+"""
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from infrastructure.middleware.rateLimit import ALGORITHMS, RateLimitEngine
+
+
+LIMIT = 50
+WINDOW = 900.0
+
+
+def legacy_hit(storage, identifier):
+    """Per-request work of the old GlobalRateLimitMiddleware"""
+    current_time = datetime.now()
+    window_start = current_time - timedelta(seconds=WINDOW)
+    if identifier in storage:
+        storage[identifier] = [ts for ts in storage[identifier] if ts > window_start]
+    request_count = len(storage[identifier])
+    if request_count < LIMIT:
+        storage[identifier].append(current_time)
+    return request_count < LIMIT
+
+
+def timed(fill, keys, passes: int):
+    """Nanoseconds per hit, and bytes per key measured in a separate traced run"""
+    started = time.perf_counter()
+    fill(keys, passes)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    state = fill(keys, passes)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del state
+    return round(elapsed / (passes * len(keys)) * 1e9), round(memory / len(keys))
+
+
+def run_legacy(keys, passes: int) -> dict:
+    def fill(keys, passes):
+        storage = defaultdict(list)
+        for _ in range(passes):
+            for key in keys:
+                legacy_hit(storage, key)
+        return storage
+
+    ns_per_hit, bytes_per_key = timed(fill, keys, passes)
+    return {'ns_per_hit': ns_per_hit, 'bytes_per_key': bytes_per_key, 'evict_all_ms': None}  # never evicts
+
+
+def run_engine(name: str, keys, passes: int) -> dict:
+    clock = [1_000_000.0]
+
+    def fill(keys, passes):
+        engine = RateLimitEngine(ALGORITHMS[name](LIMIT, WINDOW), sweep_interval=1e12, clock=lambda: clock[0])
+        for _ in range(passes):
+            for key in keys:
+                clock[0] += 0.0001
+                engine.hit(key, clock[0])
+        return engine
+
+    ns_per_hit, bytes_per_key = timed(fill, keys, passes)
+
+    # Every key goes idle, then one sweep removes them all
+    engine = fill(keys, 1)
+    clock[0] += 3 * WINDOW
+    sweep_started = time.perf_counter()
+    evicted = engine.sweep(clock[0])
+    sweep_elapsed = time.perf_counter() - sweep_started
+    return {
+        'ns_per_hit': ns_per_hit,
+        'bytes_per_key': bytes_per_key,
+        'evict_all_ms': round(sweep_elapsed * 1e3, 2),
+        'evicted': evicted,
+    }
+
+
+def run(keys_count: int, passes: int) -> dict:
+    keys = [f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}' for i in range(keys_count)]
+    random.Random(42).shuffle(keys)
+    results = {'datetime_list (old)': run_legacy(keys, passes)}
+    for name in ALGORITHMS:
+        results[name] = run_engine(name, keys, passes)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=100_000)
+    parser.add_argument('--passes', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.keys, args.passes)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.keys} keys, {args.passes} hits per key")
+    print(f"{'store':<22}{'ns/hit':>10}{'bytes/key':>12}{'evict all (ms)':>16}")
+    for name, r in results.items():
+        evict = '-' if r['evict_all_ms'] is None else r['evict_all_ms']
+        print(f"{name:<22}{r['ns_per_hit']:>10}{r['bytes_per_key']:>12}{evict:>16}")
+
+
+if __name__ == '__main__':
+    main()
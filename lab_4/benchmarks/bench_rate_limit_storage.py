@@ -0,0 +1,96 @@
+"""
+Rate limit storages under concurrent load: per-worker memory vs the shared
+memory table, with and without batching, in several worker processes at once.
+Total allowed requests show whether the budget is really shared.
+
+Run from lab_4/:
+    python -m benchmarks.bench_rate_limit_storage [--workers 4] [--requests 20000] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from infrastructure.middleware.rateLimit import ALGORITHMS, create_engine
+from infrastructure.middleware.rateLimitStorage import BatchedStorage, MemoryStorage, SharedMemoryStorage
+
+
+LIMIT = 50
+WINDOW = 900.0
+CLIENTS = 1000
+CONCURRENCY = 100
+
+
+def make_storage(kind: str, path: str):
+    if kind == 'memory':
+        return MemoryStorage(create_engine(LIMIT, WINDOW, 'sliding_window'))
+    backend = SharedMemoryStorage(ALGORITHMS['sliding_window'](LIMIT, WINDOW), path, slots=65536)
+    return BatchedStorage(backend) if kind == 'shm_batched' else backend
+
+
+def worker(kind: str, path: str, requests: int, queue) -> None:
+    async def run():
+        storage = make_storage(kind, path)
+        allowed = 0
+
+        async def client(offset: int):
+            nonlocal allowed
+            for i in range(offset, requests, CONCURRENCY):
+                result = await storage.hit(f'10.0.{(i % CLIENTS) >> 8}.{(i % CLIENTS) & 255}', time.time())
+                allowed += result[0]
+                # Let other requests in, like a real server between hits
+                await asyncio.sleep(0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[client(offset) for offset in range(CONCURRENCY)])
+        queue.put((time.perf_counter() - started, allowed))
+
+    asyncio.run(run())
+
+
+def run_kind(kind: str, workers: int, requests: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), 'ratelimit.bin')
+    queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(kind, path, requests, queue)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    slowest = max(elapsed for elapsed, _ in results)
+    per_client = requests // CLIENTS
+    if kind == 'memory':
+        # Every worker has its own full budget
+        expected = workers * CLIENTS * min(LIMIT, per_client)
+    else:
+        expected = CLIENTS * min(LIMIT, workers * per_client)
+    return {
+        'us_per_hit': round(slowest / requests * 1e6, 2),
+        'allowed': sum(allowed for _, allowed in results),
+        'expected_allowed': expected,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=20_000, help='requests per worker')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = {kind: run_kind(kind, args.workers, args.requests) for kind in ('memory', 'shm', 'shm_batched')}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.workers} workers, {args.requests} requests each, {CLIENTS} clients, limit {LIMIT}")
+    print(f"{'storage':<14}{'us/hit':>10}{'allowed':>10}{'expected':>10}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['us_per_hit']:>10}{r['allowed']:>10}{r['expected_allowed']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Cold start of a worker: each run is a fresh interpreter importing main.
+Reports wall time until the first response (/health/live) and the first
+/openapi.json, with and without Sentry and a prebuilt schema, and the import
+time per module (python -X importtime) - per top-level package and the
+slowest modules.
+
+Run from lab_4/:
+    python -m benchmarks.bench_startup [--runs 5] [--top 20] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from devtools import supabase_stub
+
+LAB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENV = {
+    'SUPABASE_URL': 'http://supabase.stub',
+    'SUPABASE_ANON_KEY': supabase_stub.ANON_KEY,
+    'SUPABASE_JWT_SECRET': supabase_stub.JWT_SECRET,
+    'SENTRY_DSN': '',
+    'METRICS_DIR': '',
+    'LESSONS_PERSISTENCE': '',
+    'PASSWORD_BLOOM_PATH': '',
+    'OPENAPI_SCHEMA_PATH': '',
+}
+# Never contacted: sentry_sdk.init only parses the DSN
+FAKE_DSN = 'https://public@sentry.invalid/1'
+
+CHILD = '''
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+import asyncio, httpx
+
+async def first_requests():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url='http://test') as client:
+        t = time.perf_counter()
+        await client.get('/health/live')
+        live = time.perf_counter() - t
+        t = time.perf_counter()
+        await client.get('/openapi.json')
+        return live, time.perf_counter() - t
+
+live, openapi = asyncio.run(first_requests())
+print(json.dumps({'import_s': imported - started, 'first_live_s': live, 'first_openapi_s': openapi}))
+'''
+
+
+def child(env: dict, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=LAB_DIR, env={**os.environ, **env},
+                          capture_output=True, text=True, check=True)
+
+
+def cold_start(env: dict, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = child(env, '-c', CHILD)
+        wall = time.perf_counter() - started
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+        sample['process_s'] = wall
+        samples.append(sample)
+    return {key: round(statistics.median(s[key] for s in samples) * 1e3, 1)
+            for key in ('process_s', 'import_s', 'first_live_s', 'first_openapi_s')}
+
+
+def parse_importtime(stderr: str) -> list:
+    """[(module, self us, cumulative us, depth)] from -X importtime output"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def import_times(env: dict, runs: int) -> dict:
+    """Median self/cumulative time per module over `runs` interpreters"""
+    per_module = {}
+    for _ in range(runs):
+        result = child(env, '-X', 'importtime', '-c', 'import main')
+        for name, self_us, cumulative_us, _ in parse_importtime(result.stderr):
+            per_module.setdefault(name, []).append((self_us, cumulative_us))
+    return {
+        name: (statistics.median(s for s, _ in samples), statistics.median(c for _, c in samples))
+        for name, samples in per_module.items()
+    }
+
+
+def by_package(modules: dict) -> list:
+    totals = {}
+    for name, (self_us, _) in modules.items():
+        package = name.split('.')[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def run(runs: int, top: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        schema_path = os.path.join(tmp, 'openapi.json')
+        child(ENV, '-m', 'tools.build_openapi', schema_path)
+        configurations = {
+            'default': ENV,
+            'prebuilt_openapi': {**ENV, 'OPENAPI_SCHEMA_PATH': schema_path},
+            'sentry_enabled': {**ENV, 'SENTRY_DSN': FAKE_DSN},
+        }
+        cold = {name: cold_start(env, runs) for name, env in configurations.items()}
+
+    modules = import_times(ENV, runs)
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return {
+        'cold_start_ms': cold,
+        'import_main_ms': round(modules.get('main', (0, 0))[1] / 1e3, 1),
+        'packages_ms': [(package, round(us / 1e3, 1)) for package, us in by_package(modules)[:top]],
+        'modules_ms': [(name, round(s / 1e3, 1), round(c / 1e3, 1)) for name, (s, c) in slowest],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='interpreters per measurement (median is reported)')
+    parser.add_argument('--top', type=int, default=20, help='packages and modules listed')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.runs, args.top)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'configuration':<20}{'process':>10}{'import':>10}{'1st live':>10}{'1st openapi':>13}  (ms)")
+    for name, r in results['cold_start_ms'].items():
+        print(f"{name:<20}{r['process_s']:>10}{r['import_s']:>10}{r['first_live_s']:>10}{r['first_openapi_s']:>13}")
+    print(f"\nimport main: {results['import_main_ms']} ms\n\n{'package':<40}{'self ms':>10}")
+    for package, ms in results['packages_ms']:
+        print(f'{package:<40}{ms:>10}')
+    print(f"\n{'module':<40}{'self ms':>10}{'cumul ms':>10}")
+    for name, self_ms, cumulative_ms in results['modules_ms']:
+        print(f'{name:<40}{self_ms:>10}{cumulative_ms:>10}')
+
+
+if __name__ == '__main__':
+    main()
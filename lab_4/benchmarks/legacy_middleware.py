@@ -0,0 +1,111 @@
+"""
+Middleware stack used before SecurityPipelineMiddleware, kept only as a
+baseline for benchmarks/bench_middleware.py.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import ClientDisconnect
+from starlette.responses import JSONResponse
+from slowapi.util import get_remote_address
+
+
+class HeaderSizeLimitMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        max_header_size = 16 * 1024  # 16KB
+        total_size = sum(len(k) + len(v) for k, v in request.headers.items())
+        if total_size > max_header_size:
+            return JSONResponse(status_code=431, content={"error": "Request Header Fields Too Large"})
+        return await call_next(request)
+
+
+class BodySizeLimitMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        max_body_size = 1024 * 1024  # 1MB
+        body = None
+        if request.method in ("POST", "PUT", "PATCH"):
+            try:
+                body = await request.body()
+            except ClientDisconnect:
+                body = None
+        if body is not None and len(body) > max_body_size:
+            return JSONResponse(status_code=413, content={"error": "Payload Too Large"})
+        return await call_next(request)
+
+
+class HelmetMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-Frame-Options"] = "SAMEORIGIN"
+        response.headers["X-XSS-Protection"] = "0"
+        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        response.headers["Content-Security-Policy"] = "default-src 'self'"
+        response.headers["Referrer-Policy"] = "no-referrer"
+        return response
+
+
+class NoopMiddleware(BaseHTTPMiddleware):
+    """Stands in for SlowAPIMiddleware (no default limits configured)"""
+
+    async def dispatch(self, request: Request, call_next):
+        return await call_next(request)
+
+
+_rate_limit_storage = defaultdict(list)
+
+
+class GlobalRateLimitMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path.startswith(("/docs", "/openapi.json", "/redoc", "/favicon.ico")):
+            return await call_next(request)
+
+        identifier = get_remote_address(request)
+        current_time = datetime.now()
+        window_start = current_time - timedelta(minutes=15)
+
+        if identifier in _rate_limit_storage:
+            _rate_limit_storage[identifier] = [
+                ts for ts in _rate_limit_storage[identifier]
+                if ts > window_start
+            ]
+
+        request_count = len(_rate_limit_storage[identifier])
+        response = await call_next(request)
+
+        if getattr(response, 'status_code', None) == 413:
+            return response
+
+        if request_count >= 50:
+            reset_time = current_time + timedelta(minutes=15)
+            return JSONResponse(
+                status_code=429,
+                content={"error": "Zbyt wiele requestow. Sprobuj ponownie za 15 minut."},
+                headers={
+                    "Retry-After": "900",
+                    "RateLimit-Limit": "50",
+                    "RateLimit-Remaining": "0",
+                    "RateLimit-Reset": str(int(reset_time.timestamp()))
+                }
+            )
+
+        _rate_limit_storage[identifier].append(current_time)
+
+        remaining = 50 - request_count - 1
+        reset_time = current_time + timedelta(minutes=15)
+        response.headers["RateLimit-Limit"] = "50"
+        response.headers["RateLimit-Remaining"] = str(max(0, remaining))
+        response.headers["RateLimit-Reset"] = str(int(reset_time.timestamp()))
+        return response
+
+
+def install(app) -> None:
+    """Add the legacy stack in the same order main.py used to"""
+    app.add_middleware(HeaderSizeLimitMiddleware)
+    app.add_middleware(BodySizeLimitMiddleware)
+    app.add_middleware(HelmetMiddleware)
+    app.add_middleware(NoopMiddleware)
+    app.add_middleware(GlobalRateLimitMiddleware)
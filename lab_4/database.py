@@ -1,6 +1,6 @@
 import os
+import threading
 from dotenv import load_dotenv
-from supabase import create_client, Client
 
 
 load_dotenv()
@@ -9,8 +9,32 @@ SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY')
 
 
-supabase: Client = create_client(
-    SUPABASE_URL,
-    SUPABASE_ANON_KEY
-)
+class LazyClient:
+    """
+    supabase.Client created on first use. Importing supabase (realtime, storage,
+    functions, gotrue) is the largest part of startup and only the auth calls
+    need it - main's lifespan loads it in the background right after start.
+    """
 
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+def _create_client():
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+
+
+supabase = LazyClient(_create_client)
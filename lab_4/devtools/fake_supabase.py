@@ -0,0 +1,179 @@
+"""
+Fake Supabase project over HTTP, for running lab_2 / lab_4 and load tests
+without a live project. Serves the GoTrue and PostgREST subset of
+devtools.supabase_stub, with injected latency and errors to reproduce
+production tail latency locally. Realtime (TASK_EVENTS_SOURCE=realtime) is not
+available, keep TASK_EVENTS_SOURCE=local.
+
+Latency is drawn from a log-normal distribution through the given p50 and
+p99 (in ms), errors are returned instead of calling the stub, both from a
+seeded generator so a run can be repeated.
+
+Run from lab_4/:
+    python -m devtools.fake_supabase [--port 54321] [--users 10] [--tasks 100]
+        [--latency 20,250] [--auth-latency 80,600] [--error-rate 0.01] [--seed 1]
+then start the app with the printed SUPABASE_* variables.
+"""
+
+import argparse
+import asyncio
+import math
+import random
+
+import httpx
+
+from devtools.supabase_stub import SupabaseStub
+
+# z-score of the 99th percentile of the standard normal distribution
+Z_99 = 2.326
+DEMO_PASSWORD = 'Password#123'
+
+
+class FaultInjector:
+    """Latency and error decisions for one service (auth or rest)"""
+
+    def __init__(self, p50_ms: float = 0.0, p99_ms: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, rng: random.Random = None):
+        self.p50_ms = p50_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = rng or random.Random()
+        self.mu = math.log(p50_ms) if p50_ms > 0 else 0.0
+        self.sigma = math.log(p99_ms / p50_ms) / Z_99 if p50_ms > 0 and p99_ms > p50_ms else 0.0
+        self.injected_errors = 0
+
+    def delay(self) -> float:
+        """Seconds to wait before answering"""
+        if self.p50_ms <= 0:
+            return 0.0
+        return math.exp(self.random.gauss(self.mu, self.sigma)) / 1000
+
+    def error(self):
+        """Status of an injected failure, None to answer normally"""
+        if self.error_rate > 0 and self.random.random() < self.error_rate:
+            self.injected_errors += 1
+            return self.error_status
+        return None
+
+
+def _injected_error(service: str, status: int) -> httpx.Response:
+    # Same bodies as the real services, so client libraries raise their usual errors
+    if service == 'auth':
+        return httpx.Response(status, json={'code': status, 'error_code': 'injected_failure', 'msg': 'Injected failure'})
+    return httpx.Response(status, json={'code': 'PGRST000', 'message': 'Injected failure', 'details': None, 'hint': None})
+
+
+class FakeSupabaseApp:
+    """ASGI app translating requests to the stub's httpx interface"""
+
+    def __init__(self, stub: SupabaseStub, faults: dict):
+        self.stub = stub
+        self.faults = faults
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        service = 'auth' if scope['path'].startswith('/auth/') else 'rest'
+        faults = self.faults[service]
+        delay = faults.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+        status = faults.error()
+        if status is not None:
+            response = _injected_error(service, status)
+        else:
+            query = scope['query_string'].decode('latin-1')
+            request = httpx.Request(
+                scope['method'],
+                f"{self.stub.url}{scope['path']}" + (f'?{query}' if query else ''),
+                headers=[(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']],
+                content=body,
+            )
+            response = self.stub.handle(request)
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()],
+        })
+        await send({'type': 'http.response.body', 'body': response.content})
+
+
+def parse_latency(value: str) -> tuple:
+    """'p50,p99' in ms, a single number means a fixed delay"""
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) == 1:
+        return parts[0], parts[0]
+    if len(parts) != 2 or parts[1] < parts[0]:
+        raise argparse.ArgumentTypeError('expected P50,P99 in ms with P99 >= P50')
+    return parts[0], parts[1]
+
+
+def seed(stub: SupabaseStub, users: int, tasks: int, admin: str = None) -> list:
+    created = [stub.create_user(f'user{i}@example.com', DEMO_PASSWORD) for i in range(users)]
+    if admin:
+        created.append(stub.create_user(admin, DEMO_PASSWORD, role='admin'))
+    for user in created:
+        stub.create_tasks(user['id'], tasks)
+    return created
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--users', type=int, default=3, help=f'seeded users user<N>@example.com / {DEMO_PASSWORD}')
+    parser.add_argument('--tasks', type=int, default=10, help='seeded tasks per user')
+    parser.add_argument('--admin', help='email of an extra seeded user with the admin role')
+    parser.add_argument('--latency', type=parse_latency, default=(0.0, 0.0), metavar='P50,P99',
+                        help='injected PostgREST latency in ms')
+    parser.add_argument('--auth-latency', type=parse_latency, metavar='P50,P99',
+                        help='injected GoTrue latency in ms (default: --latency)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of PostgREST requests failing')
+    parser.add_argument('--auth-error-rate', type=float, help='share of GoTrue requests failing (default: --error-rate)')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--seed', type=int, help='random seed for latency and errors')
+    args = parser.parse_args()
+
+    import uvicorn
+
+    url = f'http://{args.host}:{args.port}'
+    stub = SupabaseStub(url)
+    users = seed(stub, args.users, args.tasks, args.admin)
+    rng = random.Random(args.seed)
+    auth_latency = args.auth_latency or args.latency
+    auth_error_rate = args.error_rate if args.auth_error_rate is None else args.auth_error_rate
+    faults = {
+        'rest': FaultInjector(*args.latency, args.error_rate, args.error_status, rng),
+        'auth': FaultInjector(*auth_latency, auth_error_rate, args.error_status, rng),
+    }
+
+    print(f"SUPABASE_URL={url}")
+    print(f"SUPABASE_ANON_KEY={stub.anon_key}")
+    print(f"SUPABASE_SERVICE_ROLE_KEY={stub.service_role_key}")
+    print(f"SUPABASE_JWT_SECRET={stub.jwt_secret}")
+    print("TASK_EVENTS_SOURCE=local")
+    print(f"# {len(users)} users ({', '.join(user['email'] for user in users[:3])}{', ...' if len(users) > 3 else ''}), "
+          f"password {DEMO_PASSWORD}, {args.tasks} tasks each")
+    uvicorn.run(FakeSupabaseApp(stub, faults), host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
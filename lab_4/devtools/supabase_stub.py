@@ -0,0 +1,410 @@
+"""
+In-memory stand-in for the parts of Supabase this app uses: GoTrue health, sign up,
+password login, get_user and admin user deletion, and PostgREST on `tasks`
+and `profiles` (select/insert/update/delete with eq/in/or filters, order,
+limit) plus the rpc functions from sql/. Row access follows the policies the
+app relies on: users see and change their own tasks, anon can only read.
+
+Ids and timestamps come from counters, so the same sequence of calls always
+produces the same data. handle() takes an httpx.Request and returns an
+httpx.Response: benchmarks use it as a MockTransport handler (the same instance
+serves the async PostgREST pool and the sync supabase-py auth client),
+devtools.fake_supabase serves it over HTTP.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl
+
+import httpx
+import jwt
+
+
+JWT_SECRET = 'stub-jwt-secret-with-at-least-32-bytes'
+TOKEN_LIFETIME = 3600
+
+
+def project_key(role: str, secret: str = JWT_SECRET) -> str:
+    """API key as Supabase issues them: a long lived JWT with only a role claim"""
+    return jwt.encode({'iss': 'supabase-stub', 'role': role, 'iat': 1700000000, 'exp': 2000000000},
+                      secret, algorithm='HS256')
+
+
+ANON_KEY = project_key('anon')
+SERVICE_ROLE_KEY = project_key('service_role')
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+NAMESPACE = uuid.UUID('6f1c2d9a-0000-4000-8000-000000000000')
+
+TABLES = {
+    'tasks': ('id', 'title', 'completed', 'user_id', 'created_at', 'updated_at'),
+    'profiles': ('id', 'email', 'role', 'created_at', 'updated_at'),
+}
+
+
+class StubError(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def _split(text: str) -> list:
+    """Split on top level commas, parentheses and double quoted values stay whole"""
+    parts, depth, quoted, current = [], 0, False, []
+    escaped = False
+    for char in text:
+        if escaped:
+            current.append(char)
+            escaped = False
+            continue
+        if char == '\\' and quoted:
+            current.append(char)
+            escaped = True
+            continue
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and char == ',':
+            parts.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    if current:
+        parts.append(''.join(current))
+    return parts
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+    return value
+
+
+def _coerce(value: str, like):
+    if value == 'null':
+        return None
+    if isinstance(like, bool):
+        return value == 'true'
+    if isinstance(like, int):
+        return int(value)
+    return value
+
+
+OPERATORS = {
+    'eq': lambda a, b: a == b,
+    'neq': lambda a, b: a != b,
+    'lt': lambda a, b: a is not None and a < b,
+    'lte': lambda a, b: a is not None and a <= b,
+    'gt': lambda a, b: a is not None and a > b,
+    'gte': lambda a, b: a is not None and a >= b,
+    'is': lambda a, b: a is b,
+}
+
+
+def _condition(column: str, operation: str):
+    """Predicate for one PostgREST filter, e.g. column 'id' with 'in.(1,2)'"""
+    op, _, value = operation.partition('.')
+    if op == 'in':
+        values = [_unquote(v) for v in _split(value[1:-1])]
+        return lambda row: any(row.get(column) == _coerce(v, row.get(column)) for v in values)
+    if op not in OPERATORS:
+        raise StubError(400, 'PGRST100', f'Unsupported operator: {op}')
+    compare = OPERATORS[op]
+    value = _unquote(value)
+    return lambda row: compare(row.get(column), _coerce(value, row.get(column)))
+
+
+def _logic(text: str):
+    """Predicate for or=(...)/and=(...) trees built by pagination.keyset_filter"""
+    if text.startswith(('and(', 'or(')):
+        name, _, inner = text.partition('(')
+        children = [_logic(part) for part in _split(inner[:-1])]
+        combine = all if name == 'and' else any
+        return lambda row: combine(child(row) for child in children)
+    column, _, operation = text.partition('.')
+    return _condition(column, operation)
+
+
+class SupabaseStub:
+    """Users, tables and keys of one fake Supabase project"""
+
+    def __init__(self, url: str, jwt_secret: str = JWT_SECRET):
+        self.url = url.rstrip('/')
+        self.issuer = f'{self.url}/auth/v1'
+        self.jwt_secret = jwt_secret
+        self.anon_key = project_key('anon', jwt_secret)
+        self.service_role_key = project_key('service_role', jwt_secret)
+        self.users = {}  # email -> user dict with password_hash
+        self.tables = {name: {} for name in TABLES}
+        self.calls = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    # ---- deterministic ids and clock ----
+
+    def _next(self, kind: str) -> tuple:
+        self._sequence += 1
+        timestamp = (EPOCH + timedelta(milliseconds=self._sequence)).isoformat()
+        return str(uuid.uuid5(NAMESPACE, f'{kind}-{self._sequence}')), timestamp
+
+    # ---- direct setup, without going through HTTP ----
+
+    def create_user(self, email: str, password: str, role: str = 'user') -> dict:
+        with self._lock:
+            return self._create_user(email, password, role)
+
+    def create_tasks(self, user_id: str, count: int, title: str = 'Task') -> list:
+        with self._lock:
+            return [self._insert_task({'title': f'{title} {i}', 'user_id': user_id}) for i in range(count)]
+
+    def access_token(self, user: dict) -> str:
+        now = int(time.time())
+        claims = {
+            'sub': user['id'], 'aud': 'authenticated', 'role': 'authenticated', 'email': user['email'],
+            'iss': self.issuer, 'iat': now, 'exp': now + TOKEN_LIFETIME,
+            'app_metadata': user['app_metadata'], 'user_metadata': user['user_metadata'],
+        }
+        return jwt.encode(claims, self.jwt_secret, algorithm='HS256')
+
+    def _create_user(self, email: str, password: str, role: str = 'user') -> dict:
+        if email in self.users:
+            raise StubError(422, 'user_already_exists', 'User already registered')
+        user_id, created_at = self._next('user')
+        user = {
+            'id': user_id, 'aud': 'authenticated', 'role': 'authenticated', 'email': email,
+            'app_metadata': {'provider': 'email'}, 'user_metadata': {},
+            'created_at': created_at, 'updated_at': created_at,
+            'password_hash': hashlib.sha256(password.encode()).hexdigest(),
+        }
+        self.users[email] = user
+        # handle_new_user trigger
+        self.tables['profiles'][user_id] = {
+            'id': user_id, 'email': email, 'role': role, 'created_at': created_at, 'updated_at': created_at,
+        }
+        return user
+
+    def _insert_task(self, values: dict) -> dict:
+        task_id, created_at = self._next('task')
+        row = {'id': task_id, 'title': values['title'], 'completed': bool(values.get('completed', False)),
+               'user_id': values['user_id'], 'created_at': created_at, 'updated_at': created_at}
+        self.tables['tasks'][task_id] = row
+        return row
+
+    # ---- transport ----
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        path = request.url.path
+        try:
+            with self._lock:
+                if path.startswith('/auth/v1/'):
+                    return self._auth(request, path[len('/auth/v1/'):])
+                if path.startswith('/rest/v1/'):
+                    return self._rest(request, path[len('/rest/v1/'):])
+            raise StubError(404, 'not_found', f'No stub for {path}')
+        except StubError as e:
+            if path.startswith('/auth/v1/'):
+                return httpx.Response(e.status, json={'code': e.status, 'error_code': e.code, 'msg': e.message})
+            return httpx.Response(e.status, json={'code': e.code, 'message': e.message, 'details': None, 'hint': None})
+
+    def _caller(self, request: httpx.Request):
+        """(role, user_id) of the bearer token: anon, service_role or authenticated"""
+        token = request.headers.get('authorization', '').removeprefix('Bearer ').strip()
+        try:
+            claims = jwt.decode(token, self.jwt_secret, algorithms=['HS256'], options={'verify_aud': False})
+        except jwt.InvalidTokenError:
+            raise StubError(401, 'bad_jwt', 'invalid JWT')
+        role = claims.get('role')
+        if role in ('anon', 'service_role'):
+            return role, None
+        if role != 'authenticated' or not claims.get('sub'):
+            raise StubError(401, 'bad_jwt', 'invalid JWT')
+        return 'authenticated', claims['sub']
+
+    # ---- GoTrue ----
+
+    def _session(self, user: dict) -> dict:
+        public = {k: v for k, v in user.items() if k != 'password_hash'}
+        return {
+            'access_token': self.access_token(user), 'token_type': 'bearer',
+            'expires_in': TOKEN_LIFETIME, 'expires_at': int(time.time()) + TOKEN_LIFETIME,
+            'refresh_token': self._refresh_token(user), 'user': public,
+        }
+
+    @staticmethod
+    def _refresh_token(user: dict) -> str:
+        return hashlib.sha256(user['id'].encode()).hexdigest()[:16]
+
+    def _auth(self, request: httpx.Request, endpoint: str) -> httpx.Response:
+        if endpoint == 'health' and request.method == 'GET':
+            return httpx.Response(200, json={'version': 'stub', 'name': 'GoTrue', 'description': 'Supabase stub'})
+
+        if endpoint == 'signup' and request.method == 'POST':
+            body = json.loads(request.content)
+            user = self._create_user(body['email'], body['password'])
+            return httpx.Response(200, json=self._session(user))
+
+        if endpoint == 'token' and request.url.params.get('grant_type') == 'password':
+            body = json.loads(request.content)
+            user = self.users.get(body.get('email'))
+            if user is None or user['password_hash'] != hashlib.sha256(body.get('password', '').encode()).hexdigest():
+                raise StubError(400, 'invalid_credentials', 'Invalid login credentials')
+            return httpx.Response(200, json=self._session(user))
+
+        if endpoint == 'token' and request.url.params.get('grant_type') == 'refresh_token':
+            refresh_token = json.loads(request.content).get('refresh_token')
+            user = next((u for u in self.users.values() if self._refresh_token(u) == refresh_token), None)
+            if user is None:
+                raise StubError(400, 'refresh_token_not_found', 'Invalid Refresh Token: Refresh Token Not Found')
+            return httpx.Response(200, json=self._session(user))
+
+        if endpoint == 'user' and request.method == 'GET':
+            role, user_id = self._caller(request)
+            user = next((u for u in self.users.values() if u['id'] == user_id), None)
+            if user is None:
+                raise StubError(403, 'user_not_found', 'User from sub claim in JWT does not exist')
+            return httpx.Response(200, json={k: v for k, v in user.items() if k != 'password_hash'})
+
+        if endpoint.startswith('admin/users/') and request.method == 'DELETE':
+            role, _ = self._caller(request)
+            if role != 'service_role':
+                raise StubError(403, 'not_admin', 'User not allowed')
+            user_id = endpoint[len('admin/users/'):]
+            email = next((e for e, u in self.users.items() if u['id'] == user_id), None)
+            if email is None:
+                raise StubError(404, 'user_not_found', 'User not found')
+            del self.users[email]
+            return httpx.Response(200, json={})
+
+        raise StubError(404, 'not_found', f'No stub for auth endpoint {endpoint}')
+
+    # ---- PostgREST ----
+
+    def _visible(self, table: str, role: str, user_id, write: bool = False) -> list:
+        rows = self.tables[table].values()
+        if role == 'service_role':
+            return list(rows)
+        if role == 'anon':
+            if write:
+                raise StubError(401, '42501', f'permission denied for table {table}')
+            return list(rows)
+        if table == 'tasks':
+            return [row for row in rows if row['user_id'] == user_id]
+        admin = self.tables['profiles'].get(user_id, {}).get('role') == 'admin'
+        return list(rows) if admin else [row for row in rows if row['id'] == user_id]
+
+    @staticmethod
+    def _filters(params: list):
+        predicates = []
+        for name, value in params:
+            if name in ('select', 'order', 'limit', 'offset', 'columns', 'on_conflict'):
+                continue
+            if name in ('or', 'and'):
+                predicates.append(_logic(f'{name}{value}'))
+            else:
+                predicates.append(_condition(name, value))
+        return lambda row: all(predicate(row) for predicate in predicates)
+
+    @staticmethod
+    def _respond(request: httpx.Request, rows: list, status: int = 200, params: dict = None) -> httpx.Response:
+        params = params or {}
+        select = params.get('select', '*')
+        if select != '*':
+            columns = [column.strip() for column in select.split(',')]
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        headers = {'content-range': f'0-{len(rows) - 1}/*' if rows else '*/*'}
+        if request.method != 'GET' and 'return=representation' not in request.headers.get('prefer', ''):
+            return httpx.Response(204 if status == 200 else status, headers=headers)
+        return httpx.Response(status, json=rows, headers=headers)
+
+    def _rest(self, request: httpx.Request, resource: str) -> httpx.Response:
+        role, user_id = self._caller(request)
+        if resource.startswith('rpc/'):
+            return self._rpc(resource[4:], json.loads(request.content or b'{}'), role, user_id)
+        if resource not in self.tables:
+            raise StubError(404, 'PGRST205', f"Could not find the table 'public.{resource}' in the schema cache")
+
+        pairs = parse_qsl(request.url.query.decode(), keep_blank_values=True)
+        params = dict(pairs)
+        matches = self._filters(pairs)
+        method = request.method
+
+        if method == 'GET':
+            rows = [row for row in self._visible(resource, role, user_id) if matches(row)]
+            for key in reversed(params.get('order', '').split(',') if params.get('order') else []):
+                column, _, direction = key.partition('.')
+                rows.sort(key=lambda row: row.get(column), reverse=direction.startswith('desc'))
+            offset = int(params.get('offset', 0))
+            limit = int(params['limit']) if 'limit' in params else None
+            rows = rows[offset:offset + limit if limit is not None else None]
+            return self._respond(request, rows, 200, params)
+
+        if method == 'POST':
+            if resource != 'tasks':
+                raise StubError(405, 'PGRST105', f'Inserts into {resource} are not stubbed')
+            body = json.loads(request.content)
+            values = body if isinstance(body, list) else [body]
+            # user_id defaults to auth.uid() (lab_2 relies on it)
+            values = [{'user_id': user_id, **value} for value in values]
+            if role != 'authenticated' or any(value.get('user_id') != user_id for value in values):
+                raise StubError(403, '42501', 'new row violates row-level security policy for table "tasks"')
+            rows = [self._insert_task(value) for value in values]
+            return self._respond(request, rows, 201, params)
+
+        if method == 'PATCH':
+            patch = json.loads(request.content)
+            rows = [row for row in self._visible(resource, role, user_id, write=True) if matches(row)]
+            _, updated_at = self._next('update')
+            for row in rows:
+                row.update(patch)
+                row['updated_at'] = updated_at
+            return self._respond(request, rows, 200, params)
+
+        if method == 'DELETE':
+            rows = [row for row in self._visible(resource, role, user_id, write=True) if matches(row)]
+            for row in rows:
+                del self.tables[resource][row['id']]
+            return self._respond(request, rows, 200, params)
+
+        raise StubError(405, 'PGRST117', f'Unsupported HTTP method: {method}')
+
+    def _version(self, table: str, role: str, user_id) -> dict:
+        rows = self._visible(table, role, user_id)
+        return {'count': len(rows), 'updated_at': max((row['updated_at'] for row in rows), default=None)}
+
+    def _rpc(self, function: str, args: dict, role: str, user_id) -> httpx.Response:
+        if function == 'tasks_version':
+            return httpx.Response(200, json=self._version('tasks', role, user_id))
+        if function == 'profiles_version':
+            return httpx.Response(200, json=self._version('profiles', role, user_id))
+
+        if function in ('task_exists', 'update_task_checked', 'delete_task_checked'):
+            try:
+                task_id = str(uuid.UUID(str(args.get('p_id'))))
+            except ValueError:
+                raise StubError(400, '22P02', f'invalid input syntax for type uuid: "{args.get("p_id")}"')
+            row = self.tables['tasks'].get(task_id)
+            if function == 'task_exists':
+                return httpx.Response(200, json=row is not None)
+            if row is None:
+                return httpx.Response(200, json={'status': 404})
+            if row['user_id'] != user_id:
+                return httpx.Response(200, json={'status': 403})
+            if function == 'delete_task_checked':
+                del self.tables['tasks'][task_id]
+                return httpx.Response(200, json={'status': 204})
+            patch = args.get('p_patch') or {}
+            row.update({key: patch[key] for key in ('title', 'completed') if key in patch})
+            row['updated_at'] = self._next('update')[1]
+            return httpx.Response(200, json={'status': 200, 'task': row})
+
+        raise StubError(404, 'PGRST202', f'Could not find the function public.{function} in the schema cache')
@@ -0,0 +1,63 @@
+import hashlib
+import logging
+from typing import Optional
+
+from starlette.responses import Response
+
+
+logger = logging.getLogger(__name__)
+
+# Functions already reported as failing (sql/002 not applied) - warn once, not on every request
+_failing = set()
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the version stamp and whatever else selects the representation"""
+    digest = hashlib.sha256('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison (RFC 9110 13.1.2)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers['ETag'] = etag
+    # Clients may keep the body but have to revalidate before using it
+    response.headers['Cache-Control'] = 'private, no-cache'
+
+
+async def version_stamp(client, function: str) -> Optional[str]:
+    """
+    count + max(updated_at) of the rows visible to `client` (RLS applies),
+    from one of the *_version() functions in sql/002. None when unavailable.
+    """
+    try:
+        response = await client.rpc(function, {}).execute()
+    except Exception as e:
+        if function not in _failing:
+            _failing.add(function)
+            logger.warning(f'Version stamp {function}() failed, ETag skipped: {e}')
+        return None
+    _failing.discard(function)
+    data = response.data
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if not isinstance(data, dict):
+        return None
+    return f"{data.get('count')}:{data.get('updated_at')}"
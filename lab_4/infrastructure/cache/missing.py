@@ -0,0 +1,23 @@
+import os
+
+from infrastructure.cache.ttl import TTLCache
+
+
+MISSING_TASK_CACHE_SIZE = int(os.getenv('MISSING_TASK_CACHE_SIZE', '10000'))
+MISSING_TASK_CACHE_TTL = float(os.getenv('MISSING_TASK_CACHE_TTL', '30'))
+
+# task_id -> True for ids that returned 404, repeated misses are answered without a query.
+# Per process: a task created through another worker with a cached id is visible after the TTL at most.
+missing_tasks = TTLCache(maxsize=MISSING_TASK_CACHE_SIZE, ttl=MISSING_TASK_CACHE_TTL)
+
+
+def is_missing(task_id: str) -> bool:
+    return missing_tasks.get(task_id) is not None
+
+
+def mark_missing(task_id: str) -> None:
+    missing_tasks.set(task_id, True)
+
+
+def forget_missing(task_id: str) -> None:
+    missing_tasks.pop(task_id)
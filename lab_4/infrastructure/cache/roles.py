@@ -0,0 +1,29 @@
+import os
+
+from infrastructure.cache.ttl import TTLCache
+from infrastructure.database.pool import postgrest_pool
+
+
+ROLE_CACHE_SIZE = int(os.getenv('ROLE_CACHE_SIZE', '10000'))
+ROLE_CACHE_TTL = float(os.getenv('ROLE_CACHE_TTL', '60'))
+
+# user_id -> profiles.role
+# Invalidation is per process, other workers pick up a change after ROLE_CACHE_TTL at most
+role_cache = TTLCache(maxsize=ROLE_CACHE_SIZE, ttl=ROLE_CACHE_TTL)
+
+
+async def get_role(user_id: str):
+    """Role from profiles, None when the user has no profile (not cached)"""
+    role = role_cache.get(user_id)
+    if role is not None:
+        return role
+    response = await postgrest_pool.base.table('profiles').select('role').eq('id', user_id).execute()
+    if not response.data or 'role' not in response.data[0]:
+        return None
+    role = response.data[0]['role']
+    role_cache.set(user_id, role)
+    return role
+
+
+def invalidate_role(user_id: str) -> None:
+    role_cache.pop(user_id)
@@ -0,0 +1,38 @@
+import functools
+import os
+
+import anyio
+from anyio import to_thread
+
+
+# supabase-py auth (GoTrue) calls are synchronous - they run in this bounded thread pool
+# so they never block the event loop
+SUPABASE_MAX_THREADS = int(os.getenv('SUPABASE_MAX_THREADS', '64'))
+
+_limiter = None
+
+
+def _capacity_limiter() -> anyio.CapacityLimiter:
+    # Created lazily, anyio needs a running event loop for it
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(SUPABASE_MAX_THREADS)
+    return _limiter
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run a blocking supabase-py call in the worker pool and await the result"""
+    return await to_thread.run_sync(
+        functools.partial(func, *args, **kwargs),
+        limiter=_capacity_limiter(),
+    )
+
+
+def stats() -> dict:
+    if _limiter is None:
+        return {'max_threads': SUPABASE_MAX_THREADS, 'busy': 0, 'waiting': 0}
+    return {
+        'max_threads': SUPABASE_MAX_THREADS,
+        'busy': int(_limiter.borrowed_tokens),
+        'waiting': _limiter.statistics().tasks_waiting,
+    }
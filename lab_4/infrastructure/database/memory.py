@@ -0,0 +1,151 @@
+import asyncio
+import bisect
+import threading
+
+from infrastructure.serialization.codec import dumps
+
+# Encoded pages kept between appends, per store
+PAGE_CACHE_SIZE = 256
+
+
+class _Index:
+    """Rows in id order with their ids (for bisect)"""
+
+    __slots__ = ('ids', 'rows')
+
+    def __init__(self):
+        self.ids = []
+        self.rows = []
+
+    def add(self, row: dict) -> None:
+        if self.ids and row['id'] < self.ids[-1]:
+            # Durable appends can complete out of id order
+            position = bisect.bisect_left(self.ids, row['id'])
+            self.ids.insert(position, row['id'])
+            self.rows.insert(position, row)
+            return
+        self.ids.append(row['id'])
+        self.rows.append(row)
+
+
+class IndexedStore:
+    """
+    Append-only in-memory table with sequential ids, lookup by id and by name.
+
+    Ids are allocated under a lock, sync handlers run in the threadpool and
+    len(rows) + 1 would hand out the same id twice. Each row is encoded once,
+    the first time a page includes it (not on load, restarts stay fast), a page
+    is those bytes joined and cached until the next append, so polling a list
+    costs a dict lookup however often it happens.
+
+    With a `persistence` backend (infrastructure.database.persistence) rows
+    appended under `table` are loaded back on start, a row is served and
+    append() returns only once it is durable. `rows` are seed data and are not
+    persisted.
+    """
+
+    def __init__(self, rows=(), table: str = None, persistence=None):
+        self.table = table
+        self._persistence = persistence
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._by_id = {}
+        self._all = _Index()
+        self._by_name = {}
+        # id -> encoded row, filled by page()
+        self._encoded = {}
+        # (name, after_id, limit) -> (body, last row or None), cleared on append
+        self._pages = {}
+        for row in rows:
+            self._add(dict(row))
+        if persistence is not None:
+            for row in persistence.load(table, self._next_id - 1):
+                self._add(row)
+
+    def _add(self, row: dict) -> dict:
+        if 'id' not in row:
+            row = {'id': self._next_id, **row}
+        elif row['id'] in self._by_id:
+            return self._by_id[row['id']]
+        self._next_id = max(self._next_id, row['id'] + 1)
+        self._by_id[row['id']] = row
+        self._all.add(row)
+        index = self._by_name.get(row.get('name'))
+        if index is None:
+            index = self._by_name[row.get('name')] = _Index()
+        index.add(row)
+        return row
+
+    async def append(self, values: dict) -> dict:
+        """Stores `values` under the next id, returns the stored row"""
+        persistence = self._persistence
+        if persistence is not None and persistence.shared:
+            # Id allocated by the backend, the row arrives with the other workers' rows
+            row = await asyncio.wrap_future(persistence.append(self.table, dict(values)))
+            self.refresh()
+            return row
+
+        with self._lock:
+            row = {'id': self._next_id, **values}
+            self._next_id += 1
+            # Queued under the lock, so the log has this table's rows in id order
+            written = persistence.append(self.table, row) if persistence is not None else None
+        if written is not None:
+            # Served only once durable - a failed write leaves no row that vanishes on restart
+            await asyncio.wrap_future(written)
+        with self._lock:
+            row = self._add(row)
+            self._pages = {}
+        return row
+
+    def refresh(self) -> None:
+        """Takes in rows other processes appended to a shared backend"""
+        persistence = self._persistence
+        if persistence is None or not persistence.shared:
+            return
+        with self._lock:
+            rows = persistence.poll(self.table, self._all.ids[-1] if self._all.ids else 0)
+            if rows:
+                for row in rows:
+                    self._add(row)
+                self._pages = {}
+
+    def get(self, row_id: int):
+        self.refresh()
+        return self._by_id.get(row_id)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def page(self, limit: int = None, after: int = None, name: str = None) -> tuple:
+        """
+        (JSON array bytes, last row or None) of up to `limit` rows with id > `after`,
+        only rows called `name` if given. The last row is returned only when more
+        rows follow it, as the position for the next page.
+        """
+        self.refresh()
+        key = (name, after, limit)
+        pages = self._pages
+        cached = pages.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            index = self._all if name is None else self._by_name.get(name, _Index())
+            start = bisect.bisect_right(index.ids, after) if after is not None else 0
+            end = len(index.ids) if limit is None else min(start + limit, len(index.ids))
+            encoded = self._encoded
+            parts = []
+            for row in index.rows[start:end]:
+                part = encoded.get(row['id'])
+                if part is None:
+                    part = encoded[row['id']] = dumps(row)
+                parts.append(part)
+            body = b'[' + b','.join(parts) + b']'
+            last = index.rows[end - 1] if end < len(index.ids) else None
+            # Only cache against the rows it was built from, an append may have swapped the dict
+            if pages is self._pages:
+                if len(pages) >= PAGE_CACHE_SIZE:
+                    pages.clear()
+                pages[key] = (body, last)
+        return body, last
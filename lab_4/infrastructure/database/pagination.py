@@ -0,0 +1,86 @@
+import base64
+import json
+import os
+
+
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', '50'))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '200'))
+
+
+class InvalidCursor(Exception):
+    """Cursor is not one produced by encode_cursor"""
+
+
+def encode_cursor(row: dict, keys) -> str:
+    """Opaque cursor pointing just after `row` in an ordering by `keys`"""
+    raw = json.dumps([row[key] for key in keys], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    if not all(isinstance(value, (str, int)) and not isinstance(value, bool) for value in values):
+        raise InvalidCursor(cursor)
+    return values
+
+
+def _quote(value) -> str:
+    # Double quotes keep commas/parentheses in a value from breaking the PostgREST logic tree
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def keyset_filter(keys, values, desc: bool = True) -> str:
+    """
+    PostgREST or=(...) condition selecting rows after `values` in an ordering by
+    `keys` (all in the same direction), e.g. for (created_at, id) descending:
+    created_at.lt.X,and(created_at.eq.X,id.lt.Y)
+    """
+    op = 'lt' if desc else 'gt'
+    conditions = []
+    for i, key in enumerate(keys):
+        equal = [f'{k}.eq.{_quote(v)}' for k, v in zip(keys[:i], values[:i])]
+        last = f'{key}.{op}.{_quote(values[i])}'
+        conditions.append(f'and({",".join(equal + [last])})' if equal else last)
+    return ','.join(conditions)
+
+
+async def keyset_pages(select, keys, size: int, desc: bool = True):
+    """
+    All rows of a query in pages of `size`, ordered by `keys`. `select()` returns
+    a fresh filtered query, each page continues after the last row of the
+    previous one (keyset_filter), so deep pages cost as much as the first.
+    """
+    after = None
+    while True:
+        query = select()
+        if after is not None:
+            query = query.or_(keyset_filter(keys, after, desc))
+        for key in keys:
+            query = query.order(key, desc=desc)
+        rows = (await query.limit(size).execute()).data
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        after = [rows[-1][key] for key in keys]
+
+
+def parse_fields(fields: str, allowed, required) -> tuple:
+    """
+    Columns to select for a fields= projection. Returns (select, requested),
+    `required` columns (needed for the cursor) are always selected.
+    """
+    if not fields:
+        return '*', None
+    requested = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown or not requested:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}' if unknown else 'No fields requested')
+    columns = list(dict.fromkeys(requested + list(required)))
+    return ','.join(columns), requested
@@ -0,0 +1,362 @@
+import concurrent.futures
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from infrastructure.serialization.codec import dumps, loads
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory lock, one process per log is up to the operator
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# '' = memory only, 'log' = append-only log + snapshot (one worker), 'sqlite' = SQLite in WAL mode (any number of workers)
+LESSONS_PERSISTENCE = os.getenv('LESSONS_PERSISTENCE', '').lower()
+# Log file (the snapshot is <path>.snapshot) or SQLite database, default lessons.log / lessons.db
+LESSONS_PERSISTENCE_PATH = os.getenv('LESSONS_PERSISTENCE_PATH', '')
+# Extra wait (ms) before a commit so more writes share its fsync, 0 = only writes queued during the previous one
+PERSISTENCE_COMMIT_DELAY_MS = float(os.getenv('PERSISTENCE_COMMIT_DELAY_MS', '0'))
+# Log records after which the log is folded into the snapshot
+PERSISTENCE_SNAPSHOT_EVERY = int(os.getenv('PERSISTENCE_SNAPSHOT_EVERY', '10000'))
+# FULL survives power loss, NORMAL only process crashes (WAL mode)
+PERSISTENCE_SQLITE_SYNC = os.getenv('PERSISTENCE_SQLITE_SYNC', 'FULL').upper()
+
+# Records written by one commit at most
+MAX_BATCH = 1024
+SNAPSHOT_VERSION = 1
+
+
+class GroupCommitWriter(ABC):
+    """
+    Base of the backends. append() queues a row for one writer thread, which
+    writes everything queued so far and makes it durable with a single
+    fsync/commit, then resolves the futures. Appends arriving during an fsync
+    are batched into the next one, so concurrent writers share the cost.
+    """
+
+    # True when several processes write to the same storage, ids then come from the backend
+    shared = False
+
+    def __init__(self, commit_delay_ms: float = PERSISTENCE_COMMIT_DELAY_MS):
+        self.commit_delay = commit_delay_ms / 1000
+        self.commits = 0
+        self.records = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name=f'{type(self).__name__}-writer', daemon=True)
+        self._thread.start()
+
+    def append(self, table: str, row: dict) -> concurrent.futures.Future:
+        """Future resolved with the stored row once it is durable"""
+        future = concurrent.futures.Future()
+        self._queue.put((table, row, future))
+        return future
+
+    @abstractmethod
+    def load(self, table: str, floor: int) -> list:
+        """Stored rows of `table` in id order, ids allocated later start above `floor`"""
+
+    def poll(self, table: str, after: int) -> list:
+        """Rows with id > `after` written by other processes since the last poll"""
+        return []
+
+    @abstractmethod
+    def _commit(self, batch: list) -> list:
+        """Writes `batch` durably, returns the stored rows in batch order"""
+
+    def _after_commit(self) -> None:
+        pass
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.commit_delay:
+                time.sleep(self.commit_delay)
+            batch = [item]
+            while len(batch) < MAX_BATCH:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            # A cancelled request still gets its row written, its future is just not resolved
+            futures = [future if future.set_running_or_notify_cancel() else None for _, _, future in batch]
+            try:
+                rows = self._commit(batch)
+            except Exception as exc:
+                logger.exception(f'Persistence commit of {len(batch)} records failed')
+                for future in futures:
+                    if future is not None:
+                        future.set_exception(exc)
+                continue
+            self.commits += 1
+            self.records += len(batch)
+            for future, row in zip(futures, rows):
+                if future is not None:
+                    future.set_result(row)
+            self._after_commit()
+
+    def close(self) -> None:
+        """Writes out everything queued, then releases the storage"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._close()
+
+    def _close(self) -> None:
+        pass
+
+
+class LogPersistence(GroupCommitWriter):
+    """
+    Append-only log of JSON lines [table, row] plus a snapshot of all rows.
+    Startup loads the snapshot and replays the log after it, a torn last line
+    (crash mid-write) is cut off. Once the log has `snapshot_every` records it is
+    folded into a new snapshot and truncated, and on close, so a clean restart
+    reads only the snapshot. Ids come from the store, so the log has one writer:
+    the file is locked and a second process fails to open it.
+    """
+
+    def __init__(self, path: str, snapshot_every: int = PERSISTENCE_SNAPSHOT_EVERY,
+                 commit_delay_ms: float = PERSISTENCE_COMMIT_DELAY_MS):
+        super().__init__(commit_delay_ms)
+        self.path = path
+        self.snapshot_path = f'{path}.snapshot'
+        self.snapshot_every = snapshot_every
+        self.snapshots = 0
+        self._file = open(path, 'ab+')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._file.close()
+                raise RuntimeError(
+                    f'{path} is used by another process - the log has a single writer, '
+                    f'run one worker or set LESSONS_PERSISTENCE=sqlite'
+                )
+        self._log_records = 0
+        self._tables = {}
+        # Set when a failed commit could not be cut off the log, nothing may follow it
+        self._broken = False
+        self._replay()
+        if self._log_records >= self.snapshot_every:
+            self.snapshot()
+        self._start()
+
+    def _replay(self) -> None:
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = loads(f.read())
+            for table, stored in snapshot['tables'].items():
+                columns = stored['columns']
+                # Rows are value lists in `columns` order, a row with other keys is kept as an object
+                self._tables[table] = [
+                    dict(zip(columns, row)) if isinstance(row, list) else row for row in stored['rows']
+                ]
+
+        self._file.seek(0)
+        valid = 0
+        for line in self._file:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                table, row = loads(line)
+            except ValueError:
+                break
+            valid += len(line)
+            self._log_records += 1
+            rows = self._tables.setdefault(table, [])
+            # Records already in the snapshot: a crash between writing it and truncating the log
+            if not rows or row['id'] > rows[-1]['id']:
+                rows.append(row)
+
+        size = self._file.seek(0, os.SEEK_END)
+        if valid < size:
+            logger.warning(f'Persistence log {self.path}: dropping {size - valid} bytes of an incomplete record')
+            self._file.truncate(valid)
+            self._sync(self._file)
+
+    @staticmethod
+    def _sync(f) -> None:
+        f.flush()
+        os.fsync(f.fileno())
+
+    def load(self, table: str, floor: int) -> list:
+        return list(self._tables.get(table, ()))
+
+    def _commit(self, batch: list) -> list:
+        if self._broken:
+            raise RuntimeError(f'{self.path} has an unremovable failed write, appends are refused until restart')
+        data = memoryview(b''.join(dumps([table, row]) + b'\n' for table, row, _ in batch))
+        # Straight to the descriptor: a failed write leaves nothing in a buffer to be flushed later
+        fd = self._file.fileno()
+        start = os.lseek(fd, 0, os.SEEK_END)
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+            os.fsync(fd)
+        except OSError:
+            self._cut(start)
+            raise
+        for table, row, _ in batch:
+            self._tables.setdefault(table, []).append(row)
+        self._log_records += len(batch)
+        return [row for _, row, _ in batch]
+
+    def _cut(self, offset: int) -> None:
+        """
+        Removes a failed commit from the log. Left there, a torn record would end
+        replay early and drop later acknowledged ones, and a fully written one
+        would bring back a row its client got an error for.
+        """
+        fd = self._file.fileno()
+        try:
+            os.ftruncate(fd, offset)
+            os.fsync(fd)
+        except OSError:
+            logger.exception(f'Persistence log {self.path}: failed commit could not be removed')
+            self._broken = True
+
+    def _after_commit(self) -> None:
+        if self._log_records >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self) -> None:
+        """Writes all rows to the snapshot (atomically) and empties the log"""
+        tables = {}
+        for table, rows in self._tables.items():
+            columns = list(rows[0]) if rows else []
+            tables[table] = {
+                'columns': columns,
+                'rows': [list(row.values()) if list(row) == columns else row for row in rows],
+            }
+        temporary = f'{self.snapshot_path}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(dumps({'version': SNAPSHOT_VERSION, 'tables': tables}))
+            self._sync(f)
+        os.replace(temporary, self.snapshot_path)
+        # The rename itself is durable only once the directory is synced
+        directory = os.open(os.path.dirname(os.path.abspath(self.snapshot_path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self._file.truncate(0)
+        self._sync(self._file)
+        self._log_records = 0
+        self.snapshots += 1
+
+    def _close(self) -> None:
+        if self._log_records:
+            self.snapshot()
+        self._file.close()
+
+
+class SQLitePersistence(GroupCommitWriter):
+    """
+    Rows in one SQLite table in WAL mode. Every worker can write: ids are
+    allocated inside the write transaction, and poll() picks up rows of the
+    other workers when PRAGMA data_version says the database changed.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, commit_delay_ms: float = PERSISTENCE_COMMIT_DELAY_MS,
+                 synchronous: str = PERSISTENCE_SQLITE_SYNC):
+        super().__init__(commit_delay_ms)
+        self.path = path
+        self.synchronous = synchronous
+        self._writer = self._connect()
+        self._reader = self._connect()
+        self._reader_lock = threading.Lock()
+        # data_version seen by the last poll of each table
+        self._versions = {}
+        self._floors = {}
+        self._start()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode, transactions are explicit; used from the writer thread and the store's callers
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(f'PRAGMA synchronous={self.synchronous}')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS lesson_rows '
+            '(tbl TEXT NOT NULL, id INTEGER NOT NULL, body BLOB NOT NULL, PRIMARY KEY (tbl, id)) WITHOUT ROWID'
+        )
+        return connection
+
+    def _data_version(self) -> int:
+        return self._reader.execute('PRAGMA data_version').fetchone()[0]
+
+    def _select(self, table: str, after: int) -> list:
+        cursor = self._reader.execute(
+            'SELECT body FROM lesson_rows WHERE tbl = ? AND id > ? ORDER BY id', (table, after)
+        )
+        return [loads(body) for (body,) in cursor]
+
+    def load(self, table: str, floor: int) -> list:
+        with self._reader_lock:
+            self._floors[table] = floor
+            self._versions[table] = self._data_version()
+            return self._select(table, floor)
+
+    def poll(self, table: str, after: int) -> list:
+        with self._reader_lock:
+            version = self._data_version()
+            if version == self._versions.get(table):
+                return []
+            self._versions[table] = version
+            return self._select(table, after)
+
+    def _commit(self, batch: list) -> list:
+        db = self._writer
+        # IMMEDIATE takes the write lock first, so ids are allocated in commit order across processes
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            next_ids = {}
+            rows = []
+            for table, values, _ in batch:
+                row_id = next_ids.get(table)
+                if row_id is None:
+                    (last,) = db.execute('SELECT MAX(id) FROM lesson_rows WHERE tbl = ?', (table,)).fetchone()
+                    row_id = max(last or 0, self._floors.get(table, 0)) + 1
+                next_ids[table] = row_id + 1
+                rows.append((table, {'id': row_id, **values}))
+            db.executemany('INSERT INTO lesson_rows VALUES (?, ?, ?)',
+                           [(table, row['id'], dumps(row)) for table, row in rows])
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return [row for _, row in rows]
+
+    def _close(self) -> None:
+        self._writer.close()
+        self._reader.close()
+
+
+def open_persistence(kind: str = LESSONS_PERSISTENCE, path: str = LESSONS_PERSISTENCE_PATH):
+    """Backend selected by LESSONS_PERSISTENCE, None for memory only"""
+    if not kind:
+        return None
+    if kind == 'log':
+        return LogPersistence(path or 'lessons.log')
+    if kind == 'sqlite':
+        return SQLitePersistence(path or 'lessons.db')
+    raise ValueError(f'Unknown LESSONS_PERSISTENCE: {kind}')
@@ -0,0 +1,98 @@
+import copy
+import os
+
+import httpx
+from postgrest import AsyncPostgrestClient
+
+from infrastructure.monitoring.upstream import InstrumentedTransport
+
+
+SUPABASE_URL = os.getenv('SUPABASE_URL', '')
+SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY', '')
+
+SUPABASE_POOL_MAX_CONNECTIONS = int(os.getenv('SUPABASE_POOL_MAX_CONNECTIONS', '100'))
+SUPABASE_POOL_MAX_KEEPALIVE = int(os.getenv('SUPABASE_POOL_MAX_KEEPALIVE', '20'))
+SUPABASE_POOL_KEEPALIVE_EXPIRY = float(os.getenv('SUPABASE_POOL_KEEPALIVE_EXPIRY', '30'))
+SUPABASE_HTTP2 = os.getenv('SUPABASE_HTTP2', 'true').lower() == 'true'
+SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', '10'))
+
+
+class PostgrestPool:
+    """
+    One async PostgREST client (and one HTTP connection pool) shared by all requests.
+    for_token() returns a shallow copy that differs only in the Authorization header.
+    base is authorized with the anon key, same as database.supabase.
+    """
+
+    def __init__(self, url: str = SUPABASE_URL, key: str = SUPABASE_ANON_KEY,
+                 max_connections: int = SUPABASE_POOL_MAX_CONNECTIONS,
+                 max_keepalive: int = SUPABASE_POOL_MAX_KEEPALIVE,
+                 keepalive_expiry: float = SUPABASE_POOL_KEEPALIVE_EXPIRY,
+                 http2: bool = SUPABASE_HTTP2,
+                 timeout: float = SUPABASE_TIMEOUT,
+                 transport: httpx.AsyncBaseTransport = None):
+        self.rest_url = f'{url.rstrip("/")}/rest/v1'
+        self.key = key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.timeout = timeout
+        # Replaces the HTTP connection pool, e.g. with a stand-in for benchmarks
+        self.transport = transport
+        self.views_created = 0
+        self._base = None
+
+    @property
+    def base(self) -> AsyncPostgrestClient:
+        if self._base is None:
+            base = AsyncPostgrestClient(
+                self.rest_url,
+                headers={'apikey': self.key, 'Authorization': f'Bearer {self.key}'},
+            )
+            # The default session never opened a connection, just replace it.
+            # Every call through the pool is recorded by the instrumented transport.
+            base.session = httpx.AsyncClient(
+                base_url=self.rest_url,
+                headers=base.headers,
+                transport=InstrumentedTransport(
+                    self.transport or httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+                ),
+                timeout=self.timeout,
+                follow_redirects=True,
+            )
+            self._base = base
+        return self._base
+
+    def for_token(self, token: str) -> AsyncPostgrestClient:
+        view = copy.copy(self.base)
+        view.headers = self.base.headers.copy()
+        view.auth(token)
+        self.views_created += 1
+        return view
+
+    def stats(self) -> dict:
+        connections = []
+        if self._base is not None:
+            transport = self._base.session._transport
+            transport_pool = getattr(getattr(transport, 'transport', transport), '_pool', None)
+            connections = list(getattr(transport_pool, 'connections', []))
+        return {
+            'max_connections': self.limits.max_connections,
+            'max_keepalive_connections': self.limits.max_keepalive_connections,
+            'keepalive_expiry': self.limits.keepalive_expiry,
+            'http2': self.http2,
+            'connections': len(connections),
+            'idle_connections': sum(1 for c in connections if c.is_idle()),
+            'views_created': self.views_created,
+        }
+
+    async def close(self) -> None:
+        if self._base is not None:
+            await self._base.session.aclose()
+            self._base = None
+
+
+postgrest_pool = PostgrestPool()
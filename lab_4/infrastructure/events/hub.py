@@ -0,0 +1,129 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+from infrastructure.serialization.codec import dumps
+
+
+# local    - events come from this process' own mutations (one worker, or sticky clients)
+# realtime - one Supabase Realtime subscription per process, sees changes from every worker
+TASK_EVENTS_SOURCE = os.getenv('TASK_EVENTS_SOURCE', 'local')
+STREAM_QUEUE_SIZE = int(os.getenv('STREAM_QUEUE_SIZE', '100'))
+STREAM_HEARTBEAT = float(os.getenv('STREAM_HEARTBEAT', '15'))
+
+# Sent to a subscriber that could not keep up - it has to refetch GET /tasks/ and reconnect
+RESYNC_FRAME = b'event: resync\ndata: {}\n\n'
+HEARTBEAT_FRAME = b': ping\n\n'
+
+
+class Subscription:
+    """One stream connection: bounded buffer of ready-to-send SSE frames"""
+
+    __slots__ = ('user_id', 'frames', 'maxsize', 'lagged', '_ready')
+
+    def __init__(self, user_id: str, maxsize: int):
+        self.user_id = user_id
+        self.frames = deque()
+        self.maxsize = maxsize
+        self.lagged = False
+        self._ready = asyncio.Event()
+
+    def push(self, frame: bytes) -> bool:
+        """False when the buffer is full - the subscriber is then cut off instead of slowing down the publisher"""
+        if len(self.frames) >= self.maxsize:
+            self.lagged = True
+            self._ready.set()
+            return False
+        self.frames.append(frame)
+        self._ready.set()
+        return True
+
+    async def next(self, timeout: float):
+        """Next frame, HEARTBEAT_FRAME after `timeout` seconds of silence, RESYNC_FRAME once lagged"""
+        if not self.frames and not self.lagged:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return HEARTBEAT_FRAME
+        if self.lagged:
+            return RESYNC_FRAME
+        return self.frames.popleft()
+
+
+class TaskEventHub:
+    """
+    Fan-out of task changes to stream subscribers, grouped by task owner.
+    An event is serialized once and the same bytes are queued for every connection.
+    """
+
+    def __init__(self, source: str = TASK_EVENTS_SOURCE, queue_size: int = STREAM_QUEUE_SIZE):
+        self.source = source
+        self.queue_size = queue_size
+        self.published = 0
+        self.dropped = 0
+        self._subscribers = {}  # user_id -> set of Subscription
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscribers.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: str, event: str, task: dict) -> None:
+        subscriptions = self._subscribers.get(user_id)
+        if not subscriptions:
+            return
+        self.published += 1
+        frame = b'event: ' + event.encode() + b'\ndata: ' + dumps(task) + b'\n\n'
+        for subscription in list(subscriptions):
+            if not subscription.push(frame):
+                self.dropped += 1
+                self.unsubscribe(subscription)
+
+    def record_mutation(self, user_id: str, event: str, task: dict) -> None:
+        """Called by the routes after a successful write - ignored when Realtime delivers the change"""
+        if self.source == 'local':
+            self.publish(user_id, event, task)
+
+    def stats(self) -> dict:
+        return {
+            'source': self.source,
+            'users': len(self._subscribers),
+            'connections': sum(len(s) for s in self._subscribers.values()),
+            'published': self.published,
+            'dropped': self.dropped,
+        }
+
+
+task_events = TaskEventHub()
+
+
+async def event_stream(user_id: str, hub: TaskEventHub = task_events,
+                       heartbeat: float = STREAM_HEARTBEAT, expires_at: float = None):
+    """SSE body for the events of `user_id`, ends when the client lags behind or its token expires"""
+    # Subscribed here, not in the handler: a response that never starts never runs this
+    # generator, and only its finally removes the subscription
+    subscription = hub.subscribe(user_id)
+    try:
+        yield b'retry: 3000\n\n'
+        while True:
+            timeout = heartbeat
+            if expires_at is not None:
+                timeout = min(timeout, expires_at - time.time())
+                if timeout <= 0:
+                    return
+            frame = await subscription.next(timeout)
+            yield frame
+            if frame is RESYNC_FRAME:
+                return
+    finally:
+        hub.unsubscribe(subscription)
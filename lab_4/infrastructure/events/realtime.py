@@ -0,0 +1,47 @@
+import logging
+import os
+
+from infrastructure.events.hub import TaskEventHub
+
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_URL = os.getenv('SUPABASE_URL', '')
+# Realtime applies RLS to the subscriber - one subscription for all users needs the service role key
+SUPABASE_SERVICE_ROLE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+
+
+class RealtimeSource:
+    """Single Supabase Realtime subscription to public.tasks feeding a TaskEventHub"""
+
+    def __init__(self, hub: TaskEventHub, url: str = SUPABASE_URL, key: str = SUPABASE_SERVICE_ROLE_KEY):
+        self.hub = hub
+        self.url = url
+        self.key = key
+        self._client = None
+
+    async def start(self) -> None:
+        from realtime import AsyncRealtimeClient
+
+        if not self.key:
+            raise RuntimeError('TASK_EVENTS_SOURCE=realtime requires SUPABASE_SERVICE_ROLE_KEY')
+        self._client = AsyncRealtimeClient(f'{self.url.rstrip("/")}/realtime/v1', token=self.key)
+        await self._client.connect()
+        channel = self._client.channel('tasks-stream')
+        await channel.on_postgres_changes('*', callback=self._on_change, schema='public', table='tasks').subscribe()
+
+    def _on_change(self, payload) -> None:
+        data = payload['data']
+        event = str(getattr(data['type'], 'value', data['type'])).lower()
+        # DELETE carries only old_record (full row thanks to replica identity full, sql/004)
+        record = data.get('record') or data.get('old_record') or {}
+        user_id = record.get('user_id')
+        if user_id is None:
+            logger.warning(f'Realtime {event} without user_id, is sql/004 applied?')
+            return
+        self.hub.publish(user_id, event, {'id': record.get('id')} if event == 'delete' else record)
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
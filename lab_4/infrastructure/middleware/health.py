@@ -0,0 +1,39 @@
+from infrastructure.middleware.pipeline import PipelineStage, PrebuiltResponse, Rejection
+from infrastructure.monitoring.health import upstream_probe
+
+
+LIVE = Rejection(PrebuiltResponse(200, b'{"status":"OK"}'), decorate=False)
+
+
+class HealthStage(PipelineStage):
+    """
+    /health/live and /health/ready for load balancers, answered before the rate
+    limiter (frequent probes are expected) and without reaching the app.
+    Liveness is a constant response. Readiness is the last result of the
+    background upstream probe - its response is rebuilt only when the result changes.
+    """
+
+    methods = ('GET', 'HEAD')
+
+    def __init__(self, live_path: str = '/health/live', ready_path: str = '/health/ready', probe=upstream_probe):
+        self.live_path = live_path
+        self.ready_path = ready_path
+        self.probe = probe
+        self._ready_body = None
+        self._ready_rejection = None
+
+    def _ready(self) -> Rejection:
+        ready, body = self.probe.current()
+        if body is not self._ready_body:
+            self._ready_rejection = Rejection(PrebuiltResponse(200 if ready else 503, body), decorate=False)
+            self._ready_body = body
+        return self._ready_rejection
+
+    async def check(self, ctx):
+        scope = ctx.scope
+        path = scope['path']
+        if path == self.live_path and scope['method'] in self.methods:
+            return LIVE
+        if path == self.ready_path and scope['method'] in self.methods:
+            return self._ready()
+        return None
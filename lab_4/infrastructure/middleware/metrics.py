@@ -0,0 +1,110 @@
+import hmac
+import os
+import time
+
+from starlette.responses import JSONResponse, Response
+
+from infrastructure.middleware.pipeline import PipelineStage, Rejection
+from infrastructure.monitoring.metrics import (
+    metrics, http_requests, http_request_duration, http_request_size, http_response_size, http_requests_in_flight
+)
+from infrastructure.monitoring.upstream import RequestUpstream, current_request
+
+# Bearer token required for /metrics, empty = open (scraped from the internal network)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Adds "Server-Timing: upstream;dur=...;desc="N calls"" to responses (handy in browser devtools)
+UPSTREAM_SERVER_TIMING = os.getenv('UPSTREAM_SERVER_TIMING', 'false').lower() == 'true'
+
+UPSTREAM_CALL_BUCKETS = (0, 1, 2, 3, 4, 5, 10, 20, 50)
+
+http_upstream_calls = metrics.histogram(
+    'http_upstream_calls', 'Supabase calls made while handling one request', ('method', 'route'), UPSTREAM_CALL_BUCKETS)
+
+# Label for requests that never reached a route: 404s and pipeline rejections
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+class MetricsStage(PipelineStage):
+    """
+    Request metrics per route template (/tasks/{task_id}, not the raw path) and
+    the /metrics endpoint itself. Goes first in the pipeline so latency covers the
+    other stages too, and scrapes are answered before the rate limiter sees them.
+    """
+
+    def __init__(self, path: str = '/metrics', token: str = METRICS_TOKEN, registry=metrics,
+                 server_timing: bool = UPSTREAM_SERVER_TIMING):
+        self.path = path
+        self.token = token
+        self.registry = registry
+        self.server_timing = server_timing
+        # (method, route) -> histogram series, looked up once per route instead of per observation
+        self._route_series = {}
+
+    def _authorized(self, ctx) -> bool:
+        if not self.token:
+            return True
+        for name, value in ctx.scope['headers']:
+            if name == b'authorization':
+                return hmac.compare_digest(value, f'Bearer {self.token}'.encode())
+        return False
+
+    async def check(self, ctx):
+        scope = ctx.scope
+        if scope['path'] == self.path:
+            if not self._authorized(ctx):
+                return Rejection(JSONResponse(status_code=401, content={"error": "Unauthorized"}))
+            return Rejection(Response(
+                self.registry.render(), media_type='text/plain; version=0.0.4; charset=utf-8'
+            ))
+
+        size = 0
+        for name, value in scope['headers']:
+            if name == b'content-length':
+                size = int(value) if value.isdigit() else 0
+                break
+        # Upstream calls of this request are counted into `upstream`
+        upstream = RequestUpstream(scope)
+        # [start, request size, response size, upstream calls, context token]
+        ctx.state['metrics'] = [time.perf_counter(), size, None, upstream, current_request.set(upstream)]
+        http_requests_in_flight.inc()
+        return None
+
+    def on_response(self, ctx, status, headers):
+        measured = ctx.state.get('metrics')
+        if measured is None:
+            return
+        for name, value in headers.raw:
+            if name == b'content-length':
+                measured[2] = int(value)
+                break
+        if self.server_timing:
+            upstream = measured[3]
+            headers.append('Server-Timing', f'upstream;dur={upstream.seconds * 1000:.1f};desc="{upstream.calls} calls"')
+
+    def on_complete(self, ctx):
+        measured = ctx.state.get('metrics')
+        if measured is None:
+            return
+        http_requests_in_flight.dec()
+        duration = time.perf_counter() - measured[0]
+        current_request.reset(measured[4])
+
+        scope = ctx.scope
+        # Set by the router when a route matched, scope is shared with the app
+        route = scope.get('route')
+        labels = (scope['method'], route.path if route is not None else UNMATCHED_ROUTE)
+        series = self._route_series.get(labels)
+        if series is None:
+            series = self._route_series[labels] = (
+                http_request_duration.labels(labels), http_request_size.labels(labels),
+                http_response_size.labels(labels), http_upstream_calls.labels(labels),
+            )
+
+        # No response at all means the app raised, the server answers 500
+        http_requests.inc(labels + (str(ctx.status or 500),))
+        http_request_duration.observe_series(series[0], duration)
+        http_request_size.observe_series(series[1], measured[1])
+        # Streamed responses have no Content-Length and are left out of the size histogram
+        if measured[2] is not None:
+            http_response_size.observe_series(series[2], measured[2])
+        http_upstream_calls.observe_series(series[3], measured[3].calls)
@@ -0,0 +1,42 @@
+import logging
+import os
+
+from infrastructure.middleware.pipeline import PipelineStage, PrebuiltResponse, Rejection
+from infrastructure.serialization.codec import dumps
+
+logger = logging.getLogger(__name__)
+
+# Schema written at build time by `python -m tools.build_openapi`, empty = always generate in process
+OPENAPI_SCHEMA_PATH = os.getenv('OPENAPI_SCHEMA_PATH', 'openapi.json')
+
+
+class OpenAPIStage(PipelineStage):
+    """
+    Serves /openapi.json (and so /docs) as constant bytes. They come from the
+    file built at deploy time, or from app.openapi() encoded once on the first
+    request when there is no file - FastAPI's own route would encode the whole
+    schema again on every request. Nothing is loaded until the first request.
+    """
+
+    methods = ('GET', 'HEAD')
+
+    def __init__(self, app, path: str = '/openapi.json', schema_path: str = OPENAPI_SCHEMA_PATH):
+        self.app = app
+        self.path = path
+        self.schema_path = schema_path
+        self._rejection = None
+
+    def _load(self) -> bytes:
+        if self.schema_path and os.path.exists(self.schema_path):
+            with open(self.schema_path, 'rb') as f:
+                return f.read()
+        logger.info('No prebuilt OpenAPI schema, generating it from the routes')
+        return dumps(self.app.openapi())
+
+    async def check(self, ctx):
+        scope = ctx.scope
+        if scope['path'] != self.path or scope['method'] not in self.methods:
+            return None
+        if self._rejection is None:
+            self._rejection = Rejection(PrebuiltResponse(200, self._load(), cache_control=b'no-cache'), decorate=False)
+        return self._rejection
@@ -0,0 +1,229 @@
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class RequestContext:
+    """Per-request state shared by the pipeline stages"""
+
+    __slots__ = ('scope', 'receive', 'state', 'rejection', 'response_started', 'status')
+
+    def __init__(self, scope: Scope, receive: Receive):
+        self.scope = scope
+        self.receive = receive
+        self.state = {}
+        # Set by a stage while the app is already running (see RequestRejected)
+        self.rejection = None
+        self.response_started = False
+        # Status actually sent to the client, None if the app failed before answering
+        self.status = None
+
+
+class Rejection:
+    """Response produced by a stage instead of calling the app"""
+
+    __slots__ = ('response', 'decorate')
+
+    def __init__(self, response, decorate: bool = True):
+        self.response = response
+        # decorate=False sends the response as is, without on_response() of other stages
+        self.decorate = decorate
+
+
+class PrebuiltResponse:
+    """
+    Constant response: the ASGI messages are built once and sent as they are.
+    Works as Rejection.response with decorate=False (on_response() hooks would
+    modify the shared header list), HEAD gets the same headers without the body.
+    """
+
+    __slots__ = ('status_code', 'start', 'body', 'empty')
+
+    def __init__(self, status: int, body: bytes, media_type: bytes = b'application/json',
+                 cache_control: bytes = b'no-store'):
+        self.status_code = status
+        self.start = {
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', media_type),
+                (b'content-length', str(len(body)).encode()),
+                (b'cache-control', cache_control),
+            ],
+        }
+        self.body = {'type': 'http.response.body', 'body': body}
+        self.empty = {'type': 'http.response.body', 'body': b''}
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send(self.start)
+        await send(self.empty if scope['method'] == 'HEAD' else self.body)
+
+
+class RequestRejected(Exception):
+    """
+    Raised from a wrapped receive() after setting ctx.rejection - stops the app
+    from reading the request, the pipeline then sends ctx.rejection instead of
+    whatever the app tried to answer.
+    """
+
+
+class PipelineStage:
+    """
+    One step of SecurityPipelineMiddleware.
+    check() runs before the app and may return a Rejection,
+    on_response() can modify status/headers of every decorated response,
+    on_complete() runs once the request is over, whatever the outcome.
+    """
+
+    async def check(self, ctx: RequestContext):
+        return None
+
+    def on_response(self, ctx: RequestContext, status: int, headers: MutableHeaders) -> None:
+        pass
+
+    def on_complete(self, ctx: RequestContext) -> None:
+        pass
+
+
+class SecurityPipelineMiddleware:
+    """
+    Pure ASGI middleware running all stages in a single pass.
+    Checks run in the order of `stages`, the first Rejection wins,
+    on_response() hooks run in reverse order (like nested middlewares).
+    """
+
+    def __init__(self, app: ASGIApp, stages=()):
+        self.app = app
+        self.stages = list(stages)
+        self.reversed_stages = self.stages[::-1]
+        # Only stages overriding on_complete() cost anything after the response
+        self.completing_stages = [
+            stage for stage in self.reversed_stages if type(stage).on_complete is not PipelineStage.on_complete
+        ]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        ctx = RequestContext(scope, receive)
+        stages = self.stages
+        reversed_stages = self.reversed_stages
+
+        async def send_wrapper(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                ctx.status = message['status']
+                headers = MutableHeaders(raw=message['headers'])
+                for stage in reversed_stages:
+                    stage.on_response(ctx, message['status'], headers)
+            await send(message)
+
+        async def app_send(message: Message) -> None:
+            # After a late rejection the app's own answer (usually 400 for an unreadable body) is dropped
+            if ctx.rejection is not None and not ctx.response_started:
+                return
+            if message['type'] == 'http.response.start':
+                ctx.response_started = True
+            await send_wrapper(message)
+
+        try:
+            for stage in stages:
+                rejection = await stage.check(ctx)
+                if rejection is not None:
+                    await self._reject(ctx, rejection, send, send_wrapper)
+                    return
+
+            try:
+                await self.app(scope, ctx.receive, app_send)
+            except Exception:
+                if ctx.rejection is None or ctx.response_started:
+                    raise
+            if ctx.rejection is not None and not ctx.response_started:
+                await self._reject(ctx, ctx.rejection, send, send_wrapper)
+        finally:
+            for stage in self.completing_stages:
+                stage.on_complete(ctx)
+
+    @staticmethod
+    async def _reject(ctx: RequestContext, rejection: Rejection, send: Send, send_wrapper: Send) -> None:
+        if not rejection.decorate:
+            ctx.status = rejection.response.status_code
+        target = send_wrapper if rejection.decorate else send
+        await rejection.response(ctx.scope, ctx.receive, target)
+
+
+class HeaderSizeLimit(PipelineStage):
+    """431 when the total size of request headers is over max_size"""
+
+    def __init__(self, max_size: int = 16 * 1024):  # 16KB
+        self.max_size = max_size
+
+    async def check(self, ctx):
+        total_size = sum(len(k) + len(v) for k, v in ctx.scope['headers'])
+        if total_size > self.max_size:
+            return Rejection(JSONResponse(status_code=431, content={"error": "Request Header Fields Too Large"}))
+        return None
+
+
+class BodySizeLimit(PipelineStage):
+    """
+    413 when the body of a POST/PUT/PATCH request is over max_size.
+    Content-Length is checked up front, without it the bytes are counted while
+    the app reads them - the body is never buffered here.
+    """
+
+    methods = ("POST", "PUT", "PATCH")
+
+    def __init__(self, max_size: int = 1024 * 1024):  # 1MB
+        self.max_size = max_size
+
+    def _too_large(self) -> Rejection:
+        return Rejection(JSONResponse(status_code=413, content={"error": "Payload Too Large"}))
+
+    async def check(self, ctx):
+        if ctx.scope['method'] not in self.methods:
+            return None
+
+        for name, value in ctx.scope['headers']:
+            if name == b'content-length':
+                try:
+                    if int(value) > self.max_size:
+                        return self._too_large()
+                    # The server does not deliver more than Content-Length
+                    return None
+                except ValueError:
+                    break
+
+        receive = ctx.receive
+        max_size = self.max_size
+        received = 0
+
+        async def counting_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > max_size:
+                    ctx.rejection = self._too_large()
+                    raise RequestRejected()
+            return message
+
+        ctx.receive = counting_receive
+        return None
+
+
+class SecurityHeaders(PipelineStage):
+    """Security headers equivalent to Helmet.js"""
+
+    headers = {
+        "X-Content-Type-Options": "nosniff",
+        "X-Frame-Options": "SAMEORIGIN",
+        "X-XSS-Protection": "0",
+        "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+        "Content-Security-Policy": "default-src 'self'",
+        "Referrer-Policy": "no-referrer",
+    }
+
+    def on_response(self, ctx, status, headers):
+        for name, value in self.headers.items():
+            headers[name] = value
@@ -1,73 +1,284 @@
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
-from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import OrderedDict
+import asyncio
+import logging
+import math
+import os
+import tempfile
+import time
+
+from infrastructure.middleware.pipeline import PipelineStage, Rejection
+from infrastructure.middleware.rateLimitStorage import (
+    BatchedStorage, MemoryStorage, RateLimitStorage, RedisStorage, SharedMemoryStorage
+)
+from infrastructure.monitoring.metrics import rate_limit_rejections
+
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ALGORITHM = os.getenv('RATE_LIMIT_ALGORITHM', 'sliding_window')
+RATE_LIMIT_GLOBAL_LIMIT = int(os.getenv('RATE_LIMIT_GLOBAL_LIMIT', '50'))
+RATE_LIMIT_GLOBAL_WINDOW = float(os.getenv('RATE_LIMIT_GLOBAL_WINDOW', '900'))  # 15 minutes
+RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv('RATE_LIMIT_SWEEP_INTERVAL', '60'))
+
+# memory - per worker, shm - shared by workers on one host, redis - shared by all hosts
+RATE_LIMIT_STORAGE = os.getenv('RATE_LIMIT_STORAGE', 'memory')
+RATE_LIMIT_SHM_PATH = os.getenv(
+    'RATE_LIMIT_SHM_PATH',
+    os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'todo-api-ratelimit'),
+)
+RATE_LIMIT_SHM_SLOTS = int(os.getenv('RATE_LIMIT_SHM_SLOTS', '262144'))  # 32 bytes each
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+
+
+def limiter_storage_uri(storage: str = RATE_LIMIT_STORAGE) -> str:
+    """`limits` storage for the slowapi limiter - same backend as the global limit"""
+    if storage == 'shm':
+        return f'shm://{RATE_LIMIT_SHM_PATH}-login'
+    if storage == 'redis':
+        return RATE_LIMIT_REDIS_URL
+    return 'memory://'
 
 
 # Initialize limiter - shared instance
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(key_func=get_remote_address, storage_uri=limiter_storage_uri())
+
+
+# Algorithms return a plain tuple (cheaper than a namedtuple on the hot path):
+# (allowed, remaining requests, seconds until the limit is fully reset, seconds until the next allowed request)
+
+
+class SlidingWindowCounter:
+    """
+    Approximated sliding window: count of the current fixed window plus
+    the previous window's count weighted by how much of it still overlaps.
+    State per key: [window_index, previous_count, current_count].
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+
+    def new_state(self, now: float) -> list:
+        return [int(now // self.window), 0, 0]
+
+    def hit(self, state: list, now: float) -> tuple:
+        window, limit = self.window, self.limit
+        index = int(now // window)
+        if index != state[0]:
+            state[1] = state[2] if index == state[0] + 1 else 0
+            state[2] = 0
+            state[0] = index
+        elapsed = now - index * window
+        previous, current = state[1], state[2]
+        estimated = previous * (window - elapsed) / window + current
+
+        if estimated + 1 > limit:
+            return (False, 0, window - elapsed, self.retry_after(previous, current, elapsed))
+
+        state[2] = current + 1
+        return (True, int(limit - estimated - 1), window - elapsed, 0.0)
+
+    def retry_after(self, previous: int, current: int, elapsed: float) -> float:
+        window, limit = self.window, self.limit
+        if current + 1 > limit:
+            # Wait for the next window, then until the current count has decayed enough
+            return (window - elapsed) + window * max(0.0, 1 - (limit - 1) / max(current, 1))
+        # Previous window's weight has to drop below the remaining budget
+        needed = window - window * (limit - 1 - current) / previous
+        return max(0.0, needed - elapsed)
+
+    def undo(self, state: list, now: float) -> None:
+        if int(now // self.window) == state[0] and state[2] > 0:
+            state[2] -= 1
+
+    def is_idle(self, state: list, now: float) -> bool:
+        # Both counters belong to windows that no longer matter
+        return state[0] < int(now // self.window) - 1
+
+
+class TokenBucket:
+    """
+    Bucket of `limit` tokens refilled at limit/window tokens per second.
+    State per key: [tokens, last_refill].
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.rate = limit / window
+
+    def new_state(self, now: float) -> list:
+        return [float(self.limit), now]
 
-# In-memory storage for rate limiting (simple implementation)
-# In production, use Redis or similar
-_rate_limit_storage = defaultdict(list)
+    def _refill(self, state: list, now: float) -> float:
+        tokens = min(self.limit, state[0] + (now - state[1]) * self.rate)
+        state[0] = tokens
+        state[1] = now
+        return tokens
 
-class GlobalRateLimitMiddleware(BaseHTTPMiddleware):
+    def hit(self, state: list, now: float) -> tuple:
+        tokens = self._refill(state, now)
+        if tokens < 1:
+            return (False, 0, (self.limit - tokens) / self.rate, (1 - tokens) / self.rate)
+        tokens -= 1
+        state[0] = tokens
+        return (True, int(tokens), (self.limit - tokens) / self.rate, 0.0)
+
+    def undo(self, state: list, now: float) -> None:
+        state[0] = min(self.limit, state[0] + 1)
+
+    def is_idle(self, state: list, now: float) -> bool:
+        # A full bucket is the same as no state at all
+        return state[0] + (now - state[1]) * self.rate >= self.limit
+
+
+ALGORITHMS = {
+    'sliding_window': SlidingWindowCounter,
+    'token_bucket': TokenBucket,
+}
+
+
+class RateLimitEngine:
+    """
+    O(1) rate limiting per key with memory bounded by the number of active keys.
+    Keys are kept in least-recently-used order, so idle ones are evicted from
+    the front of the dict every sweep_interval seconds without a full scan.
+    """
+
+    def __init__(self, algorithm, sweep_interval: float = RATE_LIMIT_SWEEP_INTERVAL, clock=time.time):
+        self.algorithm = algorithm
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.evicted = 0
+        self._states = OrderedDict()
+        self._next_sweep = clock() + sweep_interval
+
+    def hit(self, key: str, now: float = None) -> tuple:
+        if now is None:
+            now = self.clock()
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+        states = self._states
+        state = states.get(key)
+        if state is None:
+            state = states[key] = self.algorithm.new_state(now)
+        else:
+            states.move_to_end(key)
+        return self.algorithm.hit(state, now)
+
+    def undo(self, key: str, now: float = None) -> None:
+        """Give back a request that should not count (e.g. rejected with 413 later on)"""
+        state = self._states.get(key)
+        if state is not None:
+            self.algorithm.undo(state, self.clock() if now is None else now)
+
+    def sweep(self, now: float = None) -> int:
+        if now is None:
+            now = self.clock()
+        self._next_sweep = now + self.sweep_interval
+        states = self._states
+        is_idle = self.algorithm.is_idle
+        evicted = 0
+        while states:
+            key = next(iter(states))
+            if not is_idle(states[key], now):
+                break
+            states.popitem(last=False)
+            evicted += 1
+        self.evicted += evicted
+        return evicted
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+
+def create_engine(limit: int = RATE_LIMIT_GLOBAL_LIMIT, window: float = RATE_LIMIT_GLOBAL_WINDOW,
+                  algorithm: str = RATE_LIMIT_ALGORITHM) -> RateLimitEngine:
+    return RateLimitEngine(ALGORITHMS[algorithm](limit, window))
+
+
+def create_storage(storage: str = RATE_LIMIT_STORAGE, limit: int = RATE_LIMIT_GLOBAL_LIMIT,
+                   window: float = RATE_LIMIT_GLOBAL_WINDOW,
+                   algorithm: str = RATE_LIMIT_ALGORITHM) -> RateLimitStorage:
+    if storage == 'memory':
+        return MemoryStorage(create_engine(limit, window, algorithm))
+    if storage == 'shm':
+        backend = SharedMemoryStorage(ALGORITHMS[algorithm](limit, window),
+                                      f'{RATE_LIMIT_SHM_PATH}-global', RATE_LIMIT_SHM_SLOTS)
+        return BatchedStorage(backend)
+    if storage == 'redis':
+        if algorithm != 'sliding_window':
+            raise ValueError('Redis rate limit storage supports only the sliding_window algorithm')
+        return BatchedStorage(RedisStorage(SlidingWindowCounter(limit, window), RATE_LIMIT_REDIS_URL))
+    raise ValueError(f'Unknown RATE_LIMIT_STORAGE: {storage}')
+
+
+class GlobalRateLimit(PipelineStage):
     """Global rate limiter - 50 requests per 15 minutes"""
-    
-    async def dispatch(self, request: Request, call_next):
 
+    skip_paths = ("/docs", "/openapi.json", "/redoc", "/favicon.ico")
+
+    def __init__(self, storage: RateLimitStorage = None):
+        self.storage = storage or create_storage()
+        # The loop keeps only weak references to tasks, undo tasks are held here until done
+        self._undos = set()
+
+    async def check(self, ctx):
         # Skip rate limiting for docs and static files only
-        if request.url.path.startswith(("/docs", "/openapi.json", "/redoc", "/favicon.ico")):
-            return await call_next(request)
-
-        # Get client identifier
-        identifier = get_remote_address(request)
-        current_time = datetime.now()
-        window_start = current_time - timedelta(minutes=15)
-
-        # Clean old entries
-        if identifier in _rate_limit_storage:
-            _rate_limit_storage[identifier] = [
-                ts for ts in _rate_limit_storage[identifier]
-                if ts > window_start
-            ]
-
-        # Check limit
-        request_count = len(_rate_limit_storage[identifier])
-
-        # Call next middleware/endpoint
-        response = await call_next(request)
-
-        # If a previous middleware returned 413, do not count or rate limit
-        if getattr(response, 'status_code', None) == 413:
-            return response
-
-        if request_count >= 50:
-            reset_time = current_time + timedelta(minutes=15)
-            response = JSONResponse(
+        if ctx.scope['path'].startswith(self.skip_paths):
+            return None
+
+        # Get client identifier (same as slowapi get_remote_address)
+        client = ctx.scope.get('client')
+        identifier = client[0] if client and client[0] else "127.0.0.1"
+        now = time.time()
+        try:
+            allowed, remaining, reset_after, retry_after = await self.storage.hit(identifier, now)
+        except Exception as e:
+            # Shared backend is down - let the request through instead of failing every request
+            logger.warning(f"Rate limit storage unavailable, request allowed: {e}")
+            return None
+
+        # Rejected before the endpoint runs
+        if not allowed:
+            rate_limit_rejections.inc(('global',))
+            return Rejection(JSONResponse(
                 status_code=429,
                 content={"error": "Zbyt wiele requestow. Sprobuj ponownie za 15 minut."},
                 headers={
-                    "Retry-After": "900",
-                    "RateLimit-Limit": "50",
+                    "Retry-After": str(math.ceil(retry_after)),
+                    "RateLimit-Limit": str(self.storage.algorithm.limit),
                     "RateLimit-Remaining": "0",
-                    "RateLimit-Reset": str(int(reset_time.timestamp()))
+                    "RateLimit-Reset": str(int(now + reset_after))
                 }
-            )
-            return response
+            ), decorate=False)
+
+        ctx.state['rate_limit'] = (identifier, now, remaining, reset_after)
+        return None
 
-        # Record this request (only if not 413)
-        _rate_limit_storage[identifier].append(current_time)
+    def on_response(self, ctx, status, headers):
+        checked = ctx.state.get('rate_limit')
+        if checked is None:
+            return
+        identifier, now, remaining, reset_after = checked
 
-        # Add rate limit headers
-        remaining = 50 - request_count - 1
-        reset_time = current_time + timedelta(minutes=15)
+        # 413 (body over the limit while streaming) does not count
+        if status == 413:
+            task = asyncio.ensure_future(self._undo(identifier, now))
+            self._undos.add(task)
+            task.add_done_callback(self._undos.discard)
+            return
 
-        response.headers["RateLimit-Limit"] = "50"
-        response.headers["RateLimit-Remaining"] = str(max(0, remaining))
-        response.headers["RateLimit-Reset"] = str(int(reset_time.timestamp()))
+        headers["RateLimit-Limit"] = str(self.storage.algorithm.limit)
+        headers["RateLimit-Remaining"] = str(remaining)
+        headers["RateLimit-Reset"] = str(int(now + reset_after))
 
-        return response
+    async def _undo(self, identifier: str, now: float) -> None:
+        try:
+            await self.storage.undo(identifier, now)
+        except Exception as e:
+            logger.warning(f"Rate limit storage unavailable, undo skipped: {e}")
@@ -0,0 +1,439 @@
+import asyncio
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from limits.storage import Storage
+
+from infrastructure.database.executor import run_sync
+
+
+class RateLimitStorage(ABC):
+    """
+    Where GlobalRateLimit keeps its per-client state.
+    hit() checks and counts one request atomically and returns the algorithm tuple
+    (allowed, remaining, reset_after, retry_after).
+    `algorithm` is the SlidingWindowCounter/TokenBucket the state belongs to.
+    """
+
+    algorithm = None
+
+    @abstractmethod
+    async def hit(self, key: str, now: float) -> tuple:
+        ...
+
+    @abstractmethod
+    async def undo(self, key: str, now: float) -> None:
+        ...
+
+
+class MemoryStorage(RateLimitStorage):
+    """Process-local state - every worker has its own budget"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.algorithm = engine.algorithm
+
+    async def hit(self, key, now):
+        return self.engine.hit(key, now)
+
+    async def undo(self, key, now):
+        self.engine.undo(key, now)
+
+
+class BatchedStorage(RateLimitStorage):
+    """
+    Collects hits made in the same event loop iteration and sends them to the
+    backend with one hit_many() call - one lock for shared memory, one
+    pipeline round-trip for Redis.
+    """
+
+    def __init__(self, backend, max_batch: int = 256):
+        self.backend = backend
+        self.algorithm = backend.algorithm
+        self.max_batch = max_batch
+        self.batches = 0
+        self._pending = []
+        # The loop keeps only weak references to tasks, a flush must not be collected
+        # while callers wait on its futures
+        self._flushes = set()
+
+    async def hit(self, key, now):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((key, now, future))
+        if len(self._pending) == 1:
+            asyncio.get_running_loop().call_soon(self._schedule_flush)
+        return await future
+
+    def _schedule_flush(self) -> None:
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            task = asyncio.ensure_future(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch) -> None:
+        self.batches += 1
+        try:
+            results = await self.backend.hit_many([(key, now) for key, now, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def undo(self, key, now):
+        await self.backend.undo(key, now)
+
+
+# ============================================
+# SHARED MEMORY (workers on one host)
+# ============================================
+
+# Non-blocking tries of the shared memory lock before giving up on it (waiting in a
+# thread for the global limit, failing open for the slowapi one)
+LOCK_ATTEMPTS = 8
+
+
+def _key_hash(key: str) -> int:
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+
+class SharedMemoryTable:
+    """
+    Fixed-size open addressing hash table in a memory-mapped file.
+    Slot = 8-byte key hash + up to three numbers of state (32 bytes).
+    Every process opens the same file, writes are serialized with flock().
+    """
+
+    MAGIC = b'RLSHM001'
+    HEADER = struct.Struct('<8sQ')
+    SLOT = struct.Struct('<Qddd')
+
+    def __init__(self, path: str, slots: int = 262144, max_probe: int = 32):
+        self.path = path
+        self.max_probe = max_probe
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            size = os.fstat(self._fd).st_size
+            if size < self.HEADER.size:
+                size = self.HEADER.size + slots * self.SLOT.size
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, slots), 0)
+            magic, self.slots = self.HEADER.unpack(os.pread(self._fd, self.HEADER.size, 0))
+            if magic != self.MAGIC:
+                raise ValueError(f'{path} is not a rate limit table')
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        self._mm = mmap.mmap(self._fd, size)
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Takes the table lock, without waiting when not `blocking` (returns False if
+        it is held). flock() excludes other processes, the thread lock other threads.
+        """
+        if not self._thread_lock.acquire(blocking):
+            return False
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._thread_lock.release()
+            return False
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        return True
+
+    def release(self) -> None:
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    @contextmanager
+    def locked(self):
+        """Blocking - never on the event loop, SharedMemoryStorage runs it in a thread"""
+        self.acquire()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    @contextmanager
+    def try_locked(self, attempts: int = LOCK_ATTEMPTS):
+        """Takes the lock without waiting, yields whether it was taken"""
+        for _ in range(attempts):
+            if self.acquire(blocking=False):
+                try:
+                    yield True
+                finally:
+                    self.release()
+                return
+            # Lets the holder (microseconds in the table) finish before the next try
+            os.sched_yield()
+        yield False
+
+    def _offset(self, index: int) -> int:
+        return self.HEADER.size + index * self.SLOT.size
+
+    def find(self, key: str, is_idle, now: float):
+        """
+        Slot for `key` (call under locked()). Returns (offset, key_hash, state),
+        state is None for a new key. An idle slot of another key may be reused,
+        a live one never is - offset is None when the probe window has no room.
+        """
+        key_hash = _key_hash(key)
+        home = key_hash % self.slots
+        free = None
+        for probe in range(self.max_probe):
+            offset = self._offset((home + probe) % self.slots)
+            slot_hash, a, b, c = self.SLOT.unpack_from(self._mm, offset)
+            if slot_hash == key_hash:
+                return offset, key_hash, [a, b, c]
+            if slot_hash == 0:
+                return (free if free is not None else offset), key_hash, None
+            if free is None and is_idle([a, b, c], now):
+                free = offset
+        # Table is crowded around this key. Taking over a live slot would reset another
+        # client's counters, so a key that finds no room is simply not tracked
+        return free, key_hash, None
+
+    def write(self, offset: int, key_hash: int, state: list) -> None:
+        self.SLOT.pack_into(self._mm, offset, key_hash, *(list(state) + [0.0, 0.0, 0.0])[:3])
+
+
+class SharedMemoryStorage(RateLimitStorage):
+    """Rate limit state shared by all workers on the host through SharedMemoryTable"""
+
+    def __init__(self, algorithm, path: str, slots: int = 262144):
+        self.algorithm = algorithm
+        self.table = SharedMemoryTable(path, slots)
+
+    def _hit(self, key, now):
+        offset, key_hash, state = self.table.find(key, self.algorithm.is_idle, now)
+        if state is None:
+            state = self.algorithm.new_state(now)
+        result = self.algorithm.hit(state, now)
+        # No room in the table: fails open, counted from a fresh state every time
+        if offset is not None:
+            self.table.write(offset, key_hash, state)
+        return result
+
+    def _hit_many(self, items) -> list:
+        return [self._hit(key, now) for key, now in items]
+
+    def _undo(self, key, now):
+        offset, key_hash, state = self.table.find(key, self.algorithm.is_idle, now)
+        if state is not None:
+            self.algorithm.undo(state, now)
+            self.table.write(offset, key_hash, state)
+
+    def _blocking(self, func, *args):
+        with self.table.locked():
+            return func(*args)
+
+    async def _locked(self, func, *args):
+        # The lock is only ever taken without waiting on the event loop - the critical
+        # section is a few microseconds, so after yielding it is usually free again.
+        # A worker that keeps holding it is waited for in a thread instead, the rest
+        # of this worker's requests keep running meanwhile
+        for _ in range(LOCK_ATTEMPTS):
+            if self.table.acquire(blocking=False):
+                try:
+                    return func(*args)
+                finally:
+                    self.table.release()
+            await asyncio.sleep(0)
+        return await run_sync(self._blocking, func, *args)
+
+    async def hit(self, key, now):
+        return await self._locked(self._hit, key, now)
+
+    async def hit_many(self, items) -> list:
+        return await self._locked(self._hit_many, items)
+
+    async def undo(self, key, now):
+        await self._locked(self._undo, key, now)
+
+
+class SharedMemoryLimitsStorage(Storage):
+    """
+    `limits` storage (used by the slowapi limiter) on top of SharedMemoryTable,
+    registered as shm:///path/to/file. Fixed window state: [expires_at, count].
+    slowapi calls it synchronously on the event loop, so the lock is never waited
+    for: when other workers keep it, a hit fails open (counted as the first one).
+    """
+
+    STORAGE_SCHEME = ['shm']
+
+    def __init__(self, uri: str = None, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = uri[len('shm://'):] if uri else options.get('path')
+        self.table = SharedMemoryTable(path, int(options.get('slots', 65536)))
+
+    @property
+    def base_exceptions(self):
+        return OSError
+
+    @staticmethod
+    def _is_idle(state, now):
+        return state[0] <= now
+
+    def incr(self, key: str, expiry: float, amount: int = 1, **kwargs) -> int:
+        now = time.time()
+        with self.table.try_locked() as locked:
+            if not locked:
+                return amount
+            offset, key_hash, state = self.table.find(key, self._is_idle, now)
+            if state is None or state[0] <= now:
+                state = [now + expiry, 0]
+            state[1] += amount
+            if offset is not None:
+                self.table.write(offset, key_hash, state)
+            return int(state[1])
+
+    def decr(self, key: str, amount: int = 1) -> int:
+        now = time.time()
+        with self.table.try_locked() as locked:
+            if not locked:
+                return 0
+            offset, key_hash, state = self.table.find(key, self._is_idle, now)
+            if state is None or state[0] <= now:
+                return 0
+            state[1] = max(0, state[1] - amount)
+            self.table.write(offset, key_hash, state)
+            return int(state[1])
+
+    def _read(self, key: str):
+        now = time.time()
+        with self.table.try_locked() as locked:
+            if not locked:
+                return None
+            _, _, state = self.table.find(key, self._is_idle, now)
+        if state is None or state[0] <= now:
+            return None
+        return state
+
+    def get(self, key: str) -> int:
+        state = self._read(key)
+        return int(state[1]) if state else 0
+
+    def get_expiry(self, key: str) -> float:
+        state = self._read(key)
+        return state[0] if state else time.time()
+
+    def check(self) -> bool:
+        return True
+
+    def _busy(self) -> OSError:
+        # OSError is base_exceptions, limits wraps it like any storage failure
+        return BlockingIOError(f'{self.table.path} is locked by another worker')
+
+    def reset(self):
+        with self.table.try_locked() as locked:
+            if not locked:
+                raise self._busy()
+            self.table._mm[self.table.HEADER.size:] = bytes(len(self.table._mm) - self.table.HEADER.size)
+        return None
+
+    def clear(self, key: str) -> None:
+        now = time.time()
+        with self.table.try_locked() as locked:
+            if not locked:
+                raise self._busy()
+            offset, key_hash, state = self.table.find(key, self._is_idle, now)
+            if state is not None:
+                self.table.write(offset, key_hash, [0.0, 0.0])
+
+
+# ============================================
+# REDIS (workers on many hosts)
+# ============================================
+
+# Sliding window counter, same math as SlidingWindowCounter.hit, executed atomically in Redis
+SLIDING_WINDOW_HIT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local index = math.floor(now / window)
+local state = redis.call('HMGET', KEYS[1], 'i', 'p', 'c')
+local i = tonumber(state[1]) or index
+local p = tonumber(state[2]) or 0
+local c = tonumber(state[3]) or 0
+if index ~= i then
+  if index == i + 1 then p = c else p = 0 end
+  c = 0
+end
+local elapsed = now - index * window
+local allowed = 0
+if p * (window - elapsed) / window + c + 1 <= limit then
+  c = c + 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'i', index, 'p', p, 'c', c)
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 2000))
+return {allowed, p, c, tostring(elapsed)}
+"""
+
+SLIDING_WINDOW_UNDO = """
+local index = math.floor(tonumber(ARGV[1]) / tonumber(ARGV[2]))
+local state = redis.call('HMGET', KEYS[1], 'i', 'c')
+if tonumber(state[1]) == index and (tonumber(state[2]) or 0) > 0 then
+  redis.call('HINCRBY', KEYS[1], 'c', -1)
+end
+return 0
+"""
+
+
+class RedisStorage(RateLimitStorage):
+    """
+    Sliding window counter kept in Redis (or any server speaking the Redis protocol).
+    Each hit is one Lua script call, hit_many() sends a whole batch in one pipeline.
+    """
+
+    def __init__(self, algorithm, url: str, prefix: str = 'ratelimit:global:'):
+        import redis.asyncio as redis
+
+        self.algorithm = algorithm
+        self.prefix = prefix
+        self.client = redis.from_url(url)
+        self._hit_script = self.client.register_script(SLIDING_WINDOW_HIT)
+        self._undo_script = self.client.register_script(SLIDING_WINDOW_UNDO)
+
+    def _result(self, reply) -> tuple:
+        allowed, previous, current, elapsed = int(reply[0]), int(reply[1]), int(reply[2]), float(reply[3])
+        window, limit = self.algorithm.window, self.algorithm.limit
+        estimated = previous * (window - elapsed) / window + current
+        if not allowed:
+            return (False, 0, window - elapsed, self.algorithm.retry_after(previous, current, elapsed))
+        # current already includes this request
+        return (True, max(0, int(limit - estimated)), window - elapsed, 0.0)
+
+    def _args(self, now: float) -> list:
+        return [repr(now), repr(self.algorithm.window), self.algorithm.limit]
+
+    async def hit(self, key, now):
+        reply = await self._hit_script(keys=[self.prefix + key], args=self._args(now))
+        return self._result(reply)
+
+    async def hit_many(self, items) -> list:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, now in items:
+                await self._hit_script(keys=[self.prefix + key], args=self._args(now), client=pipe)
+            replies = await pipe.execute()
+        return [self._result(reply) for reply in replies]
+
+    async def undo(self, key, now):
+        await self._undo_script(keys=[self.prefix + key], args=[repr(now), repr(self.algorithm.window)])
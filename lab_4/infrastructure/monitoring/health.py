@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from infrastructure.monitoring.metrics import metrics
+from infrastructure.serialization.codec import dumps
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_URL = os.getenv('SUPABASE_URL', '')
+SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY', '')
+# How often (s) GoTrue and PostgREST are probed for /health/ready
+HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', '10'))
+HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', '2'))
+
+# A result older than this many intervals means the probe loop itself is stuck
+STALE_INTERVALS = 3
+
+upstream_up = metrics.gauge(
+    'upstream_up', 'Result of the last readiness probe of each Supabase service (1 = reachable)', ('service',))
+
+
+class UpstreamProbe:
+    """
+    Checks GoTrue (/auth/v1/health) and PostgREST (one empty select, a real
+    database round trip) every `interval` seconds from a background task.
+    /health/ready only reads the last result, already encoded, so readiness
+    probes from any number of load balancers never reach Supabase.
+    """
+
+    def __init__(self, url: str = SUPABASE_URL, key: str = SUPABASE_ANON_KEY,
+                 interval: float = HEALTH_PROBE_INTERVAL, timeout: float = HEALTH_PROBE_TIMEOUT,
+                 transport: httpx.AsyncBaseTransport = None):
+        self.targets = {
+            'gotrue': f'{url}/auth/v1/health',
+            'postgrest': f'{url}/rest/v1/tasks?select=id&limit=0',
+        }
+        self.headers = {'apikey': key, 'Authorization': f'Bearer {key}'}
+        self.interval = interval
+        self.timeout = timeout
+        # Tests and the load test swap in a stub transport
+        self.transport = transport
+        # None until the first probe, so its outcome is logged either way
+        self.ready = None
+        self.checked_at = None
+        self.body = self.stale_body = dumps({'status': 'starting', 'checks': {}})
+        # Past this monotonic time the stored result is not trusted any more
+        self.expires_at = 0.0
+
+    async def _check(self, client: httpx.AsyncClient, service: str, url: str) -> dict:
+        started = time.perf_counter()
+        try:
+            response = await client.get(url, headers=self.headers)
+            error = None if response.status_code < 400 else f'HTTP {response.status_code}'
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        return {'ok': error is None, 'latency_ms': round((time.perf_counter() - started) * 1000, 1), 'error': error}
+
+    async def probe(self, client: httpx.AsyncClient) -> None:
+        """One round of checks, stores the result and its encoded body"""
+        results = await asyncio.gather(*[self._check(client, service, url) for service, url in self.targets.items()])
+        checks = dict(zip(self.targets, results))
+        ready = all(check['ok'] for check in checks.values())
+        for service, check in checks.items():
+            upstream_up.set(1 if check['ok'] else 0, (service,))
+
+        if ready != self.ready:
+            if ready:
+                logger.info('Supabase reachable, ready')
+            else:
+                failed = ', '.join(f"{service}: {check['error']}" for service, check in checks.items() if not check['ok'])
+                logger.warning(f'Supabase unreachable, not ready ({failed})')
+
+        self.checked_at = datetime.now(timezone.utc).isoformat()
+        self.body = dumps({'status': 'ready' if ready else 'unavailable', 'checked_at': self.checked_at, 'checks': checks})
+        self.stale_body = dumps({'status': 'stale', 'checked_at': self.checked_at, 'checks': checks})
+        self.ready = ready
+        self.expires_at = time.monotonic() + self.interval * STALE_INTERVALS + self.timeout
+
+    def current(self) -> tuple:
+        """(ready, body) of the last probe, not ready once the result is stale"""
+        if time.monotonic() > self.expires_at:
+            return False, self.stale_body
+        return self.ready, self.body
+
+    async def run(self) -> None:
+        """Probe loop, started from the app lifespan"""
+        async with httpx.AsyncClient(timeout=self.timeout, transport=self.transport) as client:
+            while True:
+                try:
+                    await self.probe(client)
+                except Exception:
+                    # The previous result goes stale at expires_at, the loop keeps going
+                    logger.exception('Readiness probe failed')
+                await asyncio.sleep(self.interval)
+
+
+upstream_probe = UpstreamProbe()
@@ -0,0 +1,250 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Directory shared by all workers of one deployment, empty = single process.
+# Clear it when the deployment (re)starts, like PROMETHEUS_MULTIPROC_DIR.
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+# How often each worker writes its snapshot to METRICS_DIR
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv('METRICS_SNAPSHOT_INTERVAL', '5'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Series keyed by a tuple of label values. Updates are plain dict/list
+    operations without locks: they only happen on the event loop thread and
+    never await in between, so no other update can interleave.
+    """
+
+    type = 'untyped'
+    # Gauges of a dead worker are dropped when merging, counters are kept
+    cumulative = True
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.series = {}
+
+    def snapshot(self) -> list:
+        return [[list(labels), value] for labels, value in self.series.items()]
+
+    @staticmethod
+    def merge(values: list):
+        return sum(values)
+
+    def render(self, series: dict) -> list:
+        return [f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}'
+                for labels, value in series.items()]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        series = self.series
+        series[labels] = series.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+    cumulative = False
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        series = self.series
+        series[labels] = series.get(labels, 0) + amount
+
+    def dec(self, labels: tuple = (), amount: float = 1) -> None:
+        series = self.series
+        series[labels] = series.get(labels, 0) - amount
+
+    def set(self, value: float, labels: tuple = ()) -> None:
+        self.series[labels] = value
+
+
+class Histogram(Metric):
+    """
+    Fixed buckets, each series is [count per bucket..., count over the last bucket, sum].
+    Counts are stored per bucket and made cumulative only when rendered.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def labels(self, labels: tuple = ()) -> list:
+        """The series list itself, callers on a hot path keep it and use observe_series()"""
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        return series
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        self.observe_series(self.labels(labels), value)
+
+    def observe_series(self, series: list, value: float) -> None:
+        # le is inclusive: a value equal to a bound belongs to that bucket
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @staticmethod
+    def merge(values: list) -> list:
+        return [sum(column) for column in zip(*values)]
+
+    def render(self, series: dict) -> list:
+        lines = []
+        bounds = ['le="%s"' % _number(float(bound)) for bound in self.buckets] + ['le="+Inf"']
+        for labels, value in series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, value[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, bound)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(value[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics of one worker, rendered in the Prometheus text format.
+    With `directory` set every worker writes its snapshot there and render()
+    merges the snapshots of all workers, so any worker answers for all of them.
+    """
+
+    def __init__(self, directory: str = METRICS_DIR, interval: float = METRICS_SNAPSHOT_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.metrics = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    # ---- multiple workers ----
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def write_snapshot(self) -> None:
+        if not self.directory:
+            return
+        path = self._path(os.getpid())
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.snapshot(), f, separators=(',', ':'))
+        # Readers never see a half written file
+        os.replace(temporary, path)
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _worker_snapshots(self) -> list:
+        """(snapshot, alive) of every worker, this one taken live instead of from its file"""
+        snapshots = [(self.snapshot(), True)]
+        if not self.directory:
+            return snapshots
+        own = self._path(os.getpid())
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if path == own:
+                continue
+            try:
+                pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+                with open(path) as f:
+                    snapshots.append((json.load(f), self._alive(pid)))
+            except (OSError, ValueError) as e:
+                logger.warning(f'Skipping metrics snapshot {path}: {e}')
+        return snapshots
+
+    def render(self) -> bytes:
+        merged = {name: {} for name in self.metrics}
+        for snapshot, alive in self._worker_snapshots():
+            for name, metric in self.metrics.items():
+                if not alive and not metric.cumulative:
+                    continue
+                series = merged[name]
+                for labels, value in snapshot.get(name, ()):
+                    series.setdefault(tuple(labels), []).append(value)
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            series = {labels: metric.merge(values) for labels, values in sorted(merged[name].items())}
+            lines.extend(metric.render(series))
+        return ('\n'.join(lines) + '\n').encode()
+
+    async def run(self) -> None:
+        """Periodic snapshot for the other workers, started from the app lifespan"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                logger.warning(f'Metrics snapshot failed: {e}')
+
+
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter(
+    'http_requests_total', 'HTTP requests by route template and status code', ('method', 'route', 'status'))
+http_request_duration = metrics.histogram(
+    'http_request_duration_seconds', 'Time until the response is fully sent', ('method', 'route'))
+http_request_size = metrics.histogram(
+    'http_request_size_bytes', 'Request body size from Content-Length', ('method', 'route'), SIZE_BUCKETS)
+http_response_size = metrics.histogram(
+    'http_response_size_bytes', 'Response body size from Content-Length', ('method', 'route'), SIZE_BUCKETS)
+http_requests_in_flight = metrics.gauge(
+    'http_requests_in_flight', 'Requests currently being handled')
+rate_limit_rejections = metrics.counter(
+    'rate_limit_rejections_total', 'Requests rejected with 429 by each rate limiter', ('limiter',))
+# Both series exist from the start, a rate() over them works before the first 429
+for limiter in ('global', 'slowapi'):
+    rate_limit_rejections.inc((limiter,), 0)
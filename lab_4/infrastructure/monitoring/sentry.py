@@ -1,22 +1,181 @@
-import sentry_sdk
-from sentry_sdk.integrations.fastapi import FastApiIntegration
-from sentry_sdk.integrations.starlette import StarletteIntegration
-from sentry_sdk.integrations.logging import LoggingIntegration
+import asyncio
 import os
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Share of requests traced when traffic is low
+SENTRY_TRACES_SAMPLE_RATE = float(os.getenv('SENTRY_TRACES_SAMPLE_RATE', '0.2'))
+# Traces per second (per worker) the sampler backs off to under load
+SENTRY_TRACES_PER_SECOND = float(os.getenv('SENTRY_TRACES_PER_SECOND', '2'))
+# Per-route overrides "prefix=rate,prefix=rate", longest prefix wins
+SENTRY_TRACES_ROUTE_RATES = os.getenv('SENTRY_TRACES_ROUTE_RATES', '')
+# How often aggregated rate limit events are sent
+SENTRY_RATE_LIMIT_FLUSH_INTERVAL = float(os.getenv('SENTRY_RATE_LIMIT_FLUSH_INTERVAL', '60'))
+
+# sentry_sdk module once init_sentry() enabled it - without a DSN it is never imported
+_sentry_sdk = None
+
+
+def current_span():
+    """Current Sentry span, None when Sentry is off or nothing is traced"""
+    return _sentry_sdk.get_current_span() if _sentry_sdk is not None else None
+
+
+DEFAULT_ROUTE_RATES = {
+    # Probes, docs and long-lived streams are never traced
+    '/health': 0.0,
+    '/favicon.ico': 0.0,
+    '/docs': 0.0,
+    '/redoc': 0.0,
+    '/openapi.json': 0.0,
+    '/metrics': 0.0,
+    '/tasks/stream': 0.0,
+    # Low volume, worth seeing in full
+    '/auth': 1.0,
+    '/admin': 1.0,
+}
+
+
+def parse_route_rates(value: str) -> dict:
+    rates = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        prefix, rate = item.split('=', 1)
+        rates[prefix.strip()] = float(rate)
+    return rates
+
+
+class TracesSampler:
+    """
+    traces_sampler for sentry_sdk.init: per-route rate, scaled down when the
+    request rate would produce more than `traces_per_second` traces.
+    Error events are not affected (sample_rate stays 1.0) and a sampled parent
+    trace is always continued.
+    """
+
+    def __init__(self, base_rate: float = SENTRY_TRACES_SAMPLE_RATE,
+                 traces_per_second: float = SENTRY_TRACES_PER_SECOND,
+                 route_rates: dict = None, clock=time.monotonic):
+        self.base_rate = base_rate
+        self.traces_per_second = traces_per_second
+        rates = dict(DEFAULT_ROUTE_RATES)
+        rates.update(route_rates if route_rates is not None else parse_route_rates(SENTRY_TRACES_ROUTE_RATES))
+        # Longest prefix first
+        self.route_rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._second = int(clock())
+        self._count = 0
+        self._requests_per_second = 0.0
+
+    def route_rate(self, path: str) -> float:
+        for prefix, rate in self.route_rates:
+            if path.startswith(prefix):
+                return rate
+        return self.base_rate
+
+    def _observe(self) -> float:
+        """Requests per second, exponentially smoothed over whole seconds"""
+        now = int(self.clock())
+        with self._lock:
+            if now != self._second:
+                elapsed = now - self._second
+                # Seconds without traffic decay the estimate
+                self._requests_per_second = 0.5 ** (elapsed - 1) * (0.5 * self._requests_per_second + 0.5 * self._count)
+                self._second = now
+                self._count = 0
+            self._count += 1
+            return max(self._requests_per_second, float(self._count))
+
+    def __call__(self, sampling_context: dict) -> float:
+        parent_sampled = sampling_context.get('parent_sampled')
+        if parent_sampled is not None:
+            return 1.0 if parent_sampled else 0.0
+
+        scope = sampling_context.get('asgi_scope') or {}
+        path = scope.get('path') or (sampling_context.get('transaction_context') or {}).get('name') or ''
+        rate = self.route_rate(path)
+        if rate <= 0.0:
+            return 0.0
+
+        requests_per_second = self._observe()
+        if requests_per_second * rate > self.traces_per_second:
+            rate = self.traces_per_second / requests_per_second
+        return rate
+
+
+class RateLimitEvents:
+    """
+    Counts 429s per (path, client) in process and sends one Sentry message per
+    pair every flush interval, instead of one event per rejected request.
+    """
+
+    def __init__(self, interval: float = SENTRY_RATE_LIMIT_FLUSH_INTERVAL, max_keys: int = 10000,
+                 clock=time.monotonic):
+        self.interval = interval
+        self.max_keys = max_keys
+        self.clock = clock
+        self._counts = {}
+        self._since = clock()
+        self._lock = threading.Lock()
+
+    def record(self, path: str, client: str) -> None:
+        key = (path, client)
+        with self._lock:
+            if key not in self._counts and len(self._counts) >= self.max_keys:
+                # Keeps memory bounded when many addresses are rejected at once
+                key = (path, 'other')
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def flush(self) -> int:
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            since, self._since = self._since, self.clock()
+        if _sentry_sdk is None:
+            return 0
+        window = round(self._since - since)
+        for (path, client), count in counts.items():
+            _sentry_sdk.capture_message(
+                f"Rate limit exceeded for {path}",
+                level="warning",
+                extras={"path": path, "client": client, "count": count, "window_seconds": window},
+            )
+        return len(counts)
+
+    async def run(self) -> None:
+        """Periodic flush, started from the app lifespan"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Rate limit events flush failed: {e}")
+
+
+rate_limit_events = RateLimitEvents()
+
+
 def init_sentry() -> None:
     """
     Initialize Sentry only if DSN is available
     """
+    global _sentry_sdk
     sentry_dsn = os.getenv('SENTRY_DSN')
     
     if not sentry_dsn:
         print("Sentry: brak DSN, monitoring wylaczony")
         return
-    
+
+    # Imported only here, the SDK and its integrations are a large share of startup time
+    import sentry_sdk
+    from sentry_sdk.integrations.fastapi import FastApiIntegration
+    from sentry_sdk.integrations.starlette import StarletteIntegration
+    from sentry_sdk.integrations.logging import LoggingIntegration
+
     environment = os.getenv("NODE_ENV", os.getenv("ENVIRONMENT", "development"))
     
     sentry_sdk.init(
@@ -33,8 +192,11 @@ def init_sentry() -> None:
 
         send_default_pii=True,
 
-        traces_sample_rate=1.0,
+        # Errors are always sent, traces are sampled per route and back off under load
+        sample_rate=1.0,
+        traces_sampler=TracesSampler(),
 
     )
     
-    print(f"Sentry: monitoring wlaczony (environment: {environment})")
\ No newline at end of file
+    _sentry_sdk = sentry_sdk
+    print(f"Sentry: monitoring wlaczony (environment: {environment})")
@@ -0,0 +1,172 @@
+import contextvars
+import logging
+import os
+import random
+import time
+
+import httpx
+
+from infrastructure.database.executor import run_sync
+from infrastructure.monitoring.metrics import metrics
+from infrastructure.monitoring.sentry import current_span
+from infrastructure.serialization.codec import loads
+
+logger = logging.getLogger(__name__)
+
+# Calls slower than this (ms) are counted and may be logged
+UPSTREAM_SLOW_MS = float(os.getenv('UPSTREAM_SLOW_MS', '500'))
+# Share of slow calls written to the log, all of them are counted in metrics
+UPSTREAM_SLOW_LOG_SAMPLE_RATE = float(os.getenv('UPSTREAM_SLOW_LOG_SAMPLE_RATE', '0.1'))
+
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1_000, 10_000)
+
+upstream_requests = metrics.counter(
+    'upstream_requests_total', 'Calls to Supabase by service, table, operation and status',
+    ('service', 'table', 'operation', 'status'))
+upstream_duration = metrics.histogram(
+    'upstream_request_duration_seconds', 'Duration of calls to Supabase including the response body',
+    ('service', 'table', 'operation'))
+upstream_rows = metrics.histogram(
+    'upstream_rows', 'Rows returned by PostgREST calls', ('table', 'operation'), ROW_BUCKETS)
+upstream_slow = metrics.counter(
+    'upstream_slow_requests_total', 'Calls to Supabase slower than UPSTREAM_SLOW_MS', ('service', 'table', 'operation'))
+
+
+class RequestUpstream:
+    """Upstream calls made while handling one request"""
+
+    __slots__ = ('scope', 'calls', 'seconds')
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.calls = 0
+        self.seconds = 0.0
+
+
+# Set by MetricsStage for the duration of a request
+current_request = contextvars.ContextVar('upstream_request', default=None)
+
+
+class UpstreamCall:
+    """
+    Times one upstream call: metrics, a child span of the current Sentry
+    transaction (if any) and a sampled log line when the call is slow.
+    Set `status` and `rows` inside the block, an exception counts as status 'error'.
+    """
+
+    __slots__ = ('service', 'table', 'operation', 'status', 'rows', '_started', '_span')
+
+    def __init__(self, service: str, table: str, operation: str):
+        self.service = service
+        self.table = table
+        self.operation = operation
+        self.status = 'ok'
+        self.rows = None
+
+    def __enter__(self) -> 'UpstreamCall':
+        parent = current_span()
+        self._span = parent.start_child(
+            op=f'db.{self.service}', name=f'{self.operation} {self.table}'
+        ) if parent is not None else None
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        duration = time.perf_counter() - self._started
+        if exc_type is not None:
+            self.status = 'error'
+        labels = (self.service, self.table, self.operation)
+        upstream_requests.inc(labels + (str(self.status),))
+        upstream_duration.observe(duration, labels)
+        if self.rows is not None:
+            upstream_rows.observe(self.rows, (self.table, self.operation))
+
+        request = current_request.get()
+        if request is not None:
+            request.calls += 1
+            request.seconds += duration
+
+        if self._span is not None:
+            self._span.set_data('status', self.status)
+            if self.rows is not None:
+                self._span.set_data('rows', self.rows)
+            self._span.finish()
+
+        if duration * 1000 >= UPSTREAM_SLOW_MS:
+            upstream_slow.inc(labels)
+            if random.random() < UPSTREAM_SLOW_LOG_SAMPLE_RATE:
+                origin = f"{request.scope['method']} {request.scope['path']}" if request is not None else '-'
+                logger.warning(
+                    f"Slow upstream call: {self.service} {self.operation} {self.table} "
+                    f"{duration * 1000:.0f} ms, status {self.status}, rows {self.rows}, request {origin}"
+                )
+
+
+def _postgrest_call(request: httpx.Request) -> tuple:
+    """(table, operation) of a PostgREST request, rpc calls use the function name as table"""
+    path = request.url.path
+    resource = path.split('/rest/v1/', 1)[-1].strip('/')
+    if resource.startswith('rpc/'):
+        return resource[4:], 'rpc'
+    method = request.method
+    if method == 'GET':
+        return resource, 'select'
+    if method == 'HEAD':
+        return resource, 'count'
+    if method == 'POST':
+        prefer = request.headers.get('prefer', '')
+        return resource, 'upsert' if 'resolution=' in prefer else 'insert'
+    if method == 'PATCH':
+        return resource, 'update'
+    if method == 'PUT':
+        return resource, 'upsert'
+    if method == 'DELETE':
+        return resource, 'delete'
+    return resource, method.lower()
+
+
+def _row_count(response: httpx.Response):
+    # Reads return "0-24/*", mutations often "*/*" - then the returned representation is counted
+    content_range = response.headers.get('content-range', '')
+    span = content_range.split('/', 1)[0]
+    if '-' in span:
+        start, end = span.split('-', 1)
+        if start.isdigit() and end.isdigit():
+            return int(end) - int(start) + 1
+    content = response.content
+    if content[:1] == b'[':
+        try:
+            return len(loads(content))
+        except ValueError:
+            return None
+    return 0 if span == '*' and not content else None
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the transport of the shared PostgREST session, so every
+    table(...).execute() and rpc(...) is recorded without touching the call sites.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        table, operation = _postgrest_call(request)
+        with UpstreamCall('postgrest', table, operation) as call:
+            response = await self.transport.handle_async_request(request)
+            # The client reads the whole body anyway, reading it here puts it into the duration
+            await response.aread()
+            call.status = response.status_code
+            if response.status_code < 400:
+                call.rows = _row_count(response)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+async def call_auth(func, *args, **kwargs):
+    """run_sync for supabase.auth (GoTrue) calls, recorded under the method name"""
+    with UpstreamCall('gotrue', 'auth', getattr(func, '__name__', 'call')):
+        return await run_sync(func, *args, **kwargs)
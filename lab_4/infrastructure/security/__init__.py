@@ -0,0 +1 @@
+# Security package
@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Bloom filter of breached passwords built with tools/build_password_filter.py, empty = check disabled
+PASSWORD_BLOOM_PATH = os.getenv('PASSWORD_BLOOM_PATH', '')
+
+WEAK_PASSWORDS = frozenset(['123', 'password', 'abc', '1234', 'qwerty'])
+
+
+class PasswordRule:
+    __slots__ = ('pattern', 'message')
+
+    def __init__(self, pattern: str, message: str):
+        # Compiled once at import, not on every registration
+        self.pattern = re.compile(pattern)
+        self.message = message
+
+
+PASSWORD_RULES = (
+    PasswordRule(r'[A-Z]', 'Password must contain an uppercase letter'),
+    PasswordRule(r'[a-z]', 'Password must contain a lowercase letter'),
+    PasswordRule(r'[0-9]', 'Password must contain a digit'),
+    PasswordRule(r'[^A-Za-z0-9]', 'Password must contain a special character'),
+)
+
+
+class BloomFilter:
+    """
+    Read-only Bloom filter in a memory-mapped file. Pages live in the shared page
+    cache, so every worker maps the same memory and only touched pages are resident.
+    Keys are SHA-1 digests of the password (same as the HIBP corpus).
+
+    File: header (magic, bit count, hash count) followed by the bit array.
+    """
+
+    MAGIC = b'PWBLOOM1'
+    HEADER = struct.Struct('<8sQI4x')
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.bits, self.hashes = self.HEADER.unpack_from(self._mm, 0)
+        if magic != self.MAGIC or len(self._mm) < self.HEADER.size + (self.bits + 7) // 8:
+            self._mm.close()
+            raise ValueError(f'{path} is not a password Bloom filter')
+        self.path = path
+
+    @staticmethod
+    def positions(digest: bytes, bits: int, hashes: int):
+        # Double hashing (Kirsch-Mitzenmacher): k indexes from two 64-bit halves of one digest
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:16], 'little') | 1
+        return [(h1 + i * h2) % bits for i in range(hashes)]
+
+    def contains_digest(self, digest: bytes) -> bool:
+        mm = self._mm
+        offset = self.HEADER.size
+        for position in self.positions(digest, self.bits, self.hashes):
+            if not mm[offset + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __contains__(self, password: str) -> bool:
+        return self.contains_digest(hashlib.sha1(password.encode('utf-8')).digest())
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def bloom_parameters(count: int, false_positive_rate: float) -> tuple:
+    """(bits, hashes) for `count` entries at the requested false positive rate"""
+    count = max(count, 1)
+    bits = max(8, math.ceil(-count * math.log(false_positive_rate) / math.log(2) ** 2))
+    hashes = max(1, round(bits / count * math.log(2)))
+    return bits, hashes
+
+
+def write_bloom_filter(digests, count: int, path: str, false_positive_rate: float = 0.001) -> tuple:
+    """Builds the filter from SHA-1 digests, written to a temp file and renamed (workers never see half a file)"""
+    bits, hashes = bloom_parameters(count, false_positive_rate)
+    array = bytearray((bits + 7) // 8)
+    positions = BloomFilter.positions
+    for digest in digests:
+        for position in positions(digest, bits, hashes):
+            array[position >> 3] |= 1 << (position & 7)
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(BloomFilter.HEADER.pack(BloomFilter.MAGIC, bits, hashes))
+        f.write(array)
+    os.replace(tmp_path, path)
+    return bits, hashes
+
+
+class PasswordPolicy:
+    """Registration password rules, the breached-password filter is opened on first use"""
+
+    def __init__(self, bloom_path: str = PASSWORD_BLOOM_PATH, min_length: int = 8):
+        self.bloom_path = bloom_path
+        self.min_length = min_length
+        self._bloom = None
+        self._bloom_failed = False
+
+    @property
+    def bloom(self) -> Optional[BloomFilter]:
+        if self._bloom is None and self.bloom_path and not self._bloom_failed:
+            try:
+                self._bloom = BloomFilter(self.bloom_path)
+            except (OSError, ValueError) as e:
+                self._bloom_failed = True
+                logger.warning(f'Breached password filter unavailable, check disabled: {e}')
+        return self._bloom
+
+    def check(self, password: str) -> Optional[str]:
+        """Error message for the first failed rule, None when the password is accepted"""
+        if len(password) < self.min_length:
+            return f'Password must be at least {self.min_length} characters long'
+        for rule in PASSWORD_RULES:
+            if not rule.pattern.search(password):
+                return rule.message
+        if password.lower() in WEAK_PASSWORDS:
+            return 'Password too weak'
+        bloom = self.bloom
+        if bloom is not None and password in bloom:
+            return 'Password appeared in a data breach, choose a different one'
+        return None
+
+
+password_policy = PasswordPolicy()
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import time
+
+import jwt
+from jwt import PyJWKClient
+
+from infrastructure.cache.ttl import TTLCache
+from infrastructure.database.executor import run_sync
+
+
+SUPABASE_URL = os.getenv('SUPABASE_URL', '')
+SUPABASE_JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET')
+SUPABASE_JWT_AUDIENCE = os.getenv('SUPABASE_JWT_AUDIENCE', 'authenticated')
+
+# local  - verify signature/exp/aud in process (remote call only if the token can't be checked locally)
+# remote - always ask GoTrue (supabase.auth.get_user), results are still cached
+AUTH_VERIFY_MODE = os.getenv('AUTH_VERIFY_MODE', 'local')
+AUTH_REMOTE_FALLBACK = os.getenv('AUTH_REMOTE_FALLBACK', 'true').lower() == 'true'
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '10000'))
+AUTH_TOKEN_CACHE_TTL = float(os.getenv('AUTH_TOKEN_CACHE_TTL', '300'))
+
+ASYMMETRIC_ALGORITHMS = ('RS256', 'ES256')
+
+
+class InvalidToken(Exception):
+    """Token was checked and rejected (bad signature, expired, wrong audience...)"""
+
+
+class TokenUnverifiable(Exception):
+    """Token can't be checked locally (no secret / key for its algorithm)"""
+
+
+class TokenUser:
+    """Subset of the supabase User object rebuilt from verified JWT claims"""
+
+    __slots__ = ('id', 'email', 'role', 'aud', 'app_metadata', 'user_metadata')
+
+    def __init__(self, claims: dict):
+        self.id = claims['sub']
+        self.email = claims.get('email')
+        self.role = claims.get('role')
+        self.aud = claims.get('aud')
+        self.app_metadata = claims.get('app_metadata') or {}
+        self.user_metadata = claims.get('user_metadata') or {}
+
+
+class TokenUserResponse:
+    """Same shape as supabase.auth.get_user() result - routes use user.user.id"""
+
+    __slots__ = ('user', 'claims')
+
+    def __init__(self, claims: dict):
+        self.user = TokenUser(claims)
+        self.claims = claims
+
+
+class TokenVerifier:
+    """
+    Verifies Supabase access tokens and caches the result by token hash.
+    remote is an async callable with the same result as supabase.auth.get_user.
+    """
+
+    def __init__(self, remote=None, mode: str = AUTH_VERIFY_MODE,
+                 remote_fallback: bool = AUTH_REMOTE_FALLBACK,
+                 secret: str = SUPABASE_JWT_SECRET,
+                 audience: str = SUPABASE_JWT_AUDIENCE,
+                 cache_size: int = AUTH_TOKEN_CACHE_SIZE,
+                 cache_ttl: float = AUTH_TOKEN_CACHE_TTL):
+        self.remote = remote
+        self.mode = mode
+        self.remote_fallback = remote_fallback
+        self.secret = secret
+        self.audience = audience
+        self.issuer = f'{SUPABASE_URL.rstrip("/")}/auth/v1' if SUPABASE_URL else None
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._jwks = None
+
+    async def verify(self, token: str):
+        key = hashlib.sha256(token.encode()).digest()
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        claims = None
+        if self.mode != 'remote':
+            try:
+                claims = await self.decode(token)
+            except TokenUnverifiable:
+                if not self.remote_fallback:
+                    raise InvalidToken('Token can not be verified locally')
+
+        if claims is not None:
+            user = TokenUserResponse(claims)
+            expires_in = float(claims['exp']) - time.time()
+        else:
+            user = await self._verify_remote(token)
+            expires_in = self._expires_in(token)
+
+        # Never keep a token in the cache longer than it is valid
+        self.cache.set(key, user, ttl=expires_in)
+        return user
+
+    async def decode(self, token: str) -> dict:
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError as e:
+            raise InvalidToken(str(e))
+
+        alg = header.get('alg')
+        if alg == 'HS256':
+            if not self.secret:
+                raise TokenUnverifiable('SUPABASE_JWT_SECRET is not configured')
+            key = self.secret
+        elif alg in ASYMMETRIC_ALGORITHMS:
+            # May download the JWKS, keep it off the event loop
+            key = await run_sync(self._signing_key, token)
+        else:
+            raise InvalidToken(f'Unsupported algorithm: {alg}')
+
+        try:
+            return jwt.decode(
+                token,
+                key,
+                algorithms=[alg],
+                audience=self.audience,
+                issuer=self.issuer,
+                options={'require': ['exp', 'sub']},
+            )
+        except jwt.InvalidTokenError as e:
+            raise InvalidToken(str(e))
+
+    def _signing_key(self, token: str):
+        if not SUPABASE_URL:
+            raise TokenUnverifiable('SUPABASE_URL is not configured')
+        if self._jwks is None:
+            # PyJWKClient keeps the fetched keys in memory, so JWKS is downloaded once per key rotation
+            self._jwks = PyJWKClient(f'{self.issuer}/.well-known/jwks.json', cache_keys=True)
+        try:
+            return self._jwks.get_signing_key_from_jwt(token).key
+        except jwt.PyJWKClientError as e:
+            raise TokenUnverifiable(str(e))
+
+    async def _verify_remote(self, token: str):
+        if self.remote is None:
+            raise InvalidToken('Remote verification is not configured')
+        user = await self.remote(token)
+        if user is None or getattr(user, 'user', None) is None:
+            raise InvalidToken('Invalid token')
+        return user
+
+    @staticmethod
+    def _expires_in(token: str) -> float:
+        try:
+            claims = jwt.decode(token, options={'verify_signature': False})
+            return float(claims['exp']) - time.time()
+        except Exception:
+            return 0.0
@@ -0,0 +1 @@
+# Serialization package
@@ -0,0 +1,40 @@
+import orjson
+from pydantic import BaseModel
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+
+def _default(obj):
+    # orjson handles datetime/UUID/dataclasses itself, pydantic models are the only extra case here
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode='json')
+    raise TypeError(f'Type is not JSON serializable: {type(obj).__name__}')
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def dumps_lines(rows) -> bytes:
+    """NDJSON: one encoded row per line"""
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+    return b''.join([orjson.dumps(row, default=_default, option=option) for row in rows])
+
+
+# orjson.JSONDecodeError is a ValueError
+loads = orjson.loads
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson. Returned directly from an endpoint it also
+    skips FastAPI's jsonable_encoder pass, PostgREST data is plain JSON types already.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+async def read_json(request: Request):
+    """Request body decoded once with orjson (Starlette keeps the bytes, request.body() is not read twice)"""
+    return loads(await request.body())
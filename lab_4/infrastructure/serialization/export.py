@@ -0,0 +1,152 @@
+import asyncio
+import csv
+import io
+import os
+import zlib
+
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from infrastructure.serialization.codec import dumps_lines
+
+# Rows fetched from PostgREST per page, at most two pages are held at a time
+EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', '1000'))
+# zlib level for gzip-encoded exports (1 fastest .. 9 smallest)
+EXPORT_GZIP_LEVEL = int(os.getenv('EXPORT_GZIP_LEVEL', '6'))
+
+# Text starting with these is run as a formula by spreadsheet apps
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class NDJSONEncoder:
+    media_type = 'application/x-ndjson'
+    extension = 'ndjson'
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+
+    def header(self) -> bytes:
+        return b''
+
+    def encode(self, rows: list) -> bytes:
+        # Rows carry extra columns when the order keys had to be selected for paging
+        columns = self.columns
+        if rows and len(rows[0]) != len(columns):
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        return dumps_lines(rows)
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    text = str(value)
+    # Quoted so user-entered text like "=HYPERLINK(...)" stays text in Excel
+    return "'" + text if text.startswith(FORMULA_PREFIXES) else text
+
+
+class CSVEncoder:
+    media_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+
+    @staticmethod
+    def _write(records) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(records)
+        return buffer.getvalue().encode()
+
+    def header(self) -> bytes:
+        return self._write([self.columns])
+
+    def encode(self, rows: list) -> bytes:
+        columns = self.columns
+        return self._write([[_cell(row.get(column)) for column in columns] for row in rows])
+
+
+ENCODERS = {'ndjson': NDJSONEncoder, 'csv': CSVEncoder}
+
+
+async def _prefetched(pages):
+    """Pages of `pages`, the next one is requested while the current one is sent"""
+    iterator = pages.__aiter__()
+    pending = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            try:
+                page = await pending
+            except StopAsyncIteration:
+                return
+            pending = asyncio.ensure_future(iterator.__anext__())
+            yield page
+    finally:
+        # The page being fetched has to stop before the iterator can be closed
+        pending.cancel()
+        await asyncio.gather(pending, return_exceptions=True)
+        await pages.aclose()
+
+
+async def _chunks(first: list, stream, encoder, compressor):
+    def output(chunk: bytes) -> bytes:
+        if compressor is None:
+            return chunk
+        # Sync flush: every page leaves compressed right away instead of waiting in zlib
+        return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    yield output(encoder.header() + encoder.encode(first))
+    async for page in stream:
+        yield output(encoder.encode(page))
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def _accepts_gzip(request: Request) -> bool:
+    for coding in request.headers.get('accept-encoding', '').split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() != 'gzip':
+            continue
+        quality = params.strip().removeprefix('q=')
+        try:
+            return not quality or float(quality) > 0
+        except ValueError:
+            return True
+    return False
+
+
+async def export_response(request: Request, pages, columns, export_format: str, name: str) -> StreamingResponse:
+    """
+    Streams the rows of the async page iterator `pages` as NDJSON or CSV,
+    gzip-encoded when the client accepts it. Memory stays at two pages however
+    many rows there are. The first page is fetched before answering, so a failing
+    query is still a proper error status - a failure later cuts the stream off.
+    """
+    encoder_class = ENCODERS.get(export_format)
+    if encoder_class is None:
+        raise HTTPException(400, detail={'error': f'Unknown format: {export_format}'})
+    encoder = encoder_class(columns)
+
+    stream = _prefetched(pages)
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        first = []
+
+    headers = {
+        'Content-Disposition': f'attachment; filename="{name}.{encoder.extension}"',
+        'Cache-Control': 'no-store',
+        # Proxies pass chunks on instead of buffering the whole export
+        'X-Accel-Buffering': 'no',
+        'Vary': 'Accept-Encoding',
+    }
+    compressor = None
+    if _accepts_gzip(request):
+        compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+        headers['Content-Encoding'] = 'gzip'
+    return StreamingResponse(_chunks(first, stream, encoder, compressor),
+                             media_type=encoder.media_type, headers=headers)
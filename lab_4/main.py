@@ -1,66 +1,79 @@
+import gc
+# No collections while the modules and routes are built - they all live as long as the worker (see the end of the file)
+gc.disable()
+
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi import Request
-from fastapi.responses import JSONResponse
-
-# Middleware to limit total header size (e.g., 16KB)
-class HeaderSizeLimitMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        max_header_size = 16 * 1024  # 16KB
-        total_size = sum(len(k) + len(v) for k, v in request.headers.items())
-        if total_size > max_header_size:
-            return JSONResponse(status_code=431, content={"error": "Request Header Fields Too Large"})
-        return await call_next(request)
-
-# Middleware to limit request body size (e.g., 1MB)
-class BodySizeLimitMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        from starlette.requests import ClientDisconnect
-        max_body_size = 1024 * 1024  # 1MB
-        body = None
-        if request.method in ("POST", "PUT", "PATCH"):  # Only read body for these methods
-            try:
-                body = await request.body()
-            except ClientDisconnect:
-                body = None
-        if body is not None and len(body) > max_body_size:
-            return JSONResponse(status_code=413, content={"error": "Payload Too Large"})
-        return await call_next(request)
 from dotenv import load_dotenv
 load_dotenv()
 
-from infrastructure.monitoring.sentry import init_sentry
+from infrastructure.monitoring.sentry import init_sentry, rate_limit_events
+from infrastructure.monitoring.metrics import metrics, rate_limit_rejections
 # Initialize Sentry before anything else
 init_sentry()
 
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI, Request
 
 from fastapi.responses import Response, JSONResponse
 
-from starlette.middleware.base import BaseHTTPMiddleware
-
 from slowapi.errors import RateLimitExceeded
-from infrastructure.middleware.rateLimit import limiter, GlobalRateLimitMiddleware
+from infrastructure.middleware.rateLimit import limiter, GlobalRateLimit
+from infrastructure.middleware.pipeline import (
+    SecurityPipelineMiddleware, BodySizeLimit, HeaderSizeLimit, SecurityHeaders
+)
+from infrastructure.middleware.metrics import MetricsStage
+from infrastructure.middleware.health import HealthStage
+from infrastructure.middleware.openapi import OpenAPIStage
+from infrastructure.monitoring.health import upstream_probe
 from routes import tasks, admin
 from routes import last_lessons_endpoints
 from auth import router as auth_router
+from infrastructure.database.pool import postgrest_pool
+from infrastructure.events.hub import task_events
+from infrastructure.events.realtime import RealtimeSource
+from database import supabase
 import logging
-import sentry_sdk
-
-class HelmetMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        # Security headers equivalent to Helmet.js
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "SAMEORIGIN"
-        response.headers["X-XSS-Protection"] = "0"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        response.headers["Content-Security-Policy"] = "default-src 'self'"
-        response.headers["Referrer-Policy"] = "no-referrer"
-        return response
-
-
-app = FastAPI(title='Todo API')
+
+
+async def load_supabase_client():
+    """supabase-py is imported on first use - load it now, not in the first login request"""
+    try:
+        await asyncio.to_thread(supabase.load)
+    except Exception:
+        logging.exception("Supabase client could not be created")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    supabase_client = asyncio.create_task(load_supabase_client())
+    # One Realtime subscription per worker feeds every /tasks/stream connection
+    realtime_source = None
+    if task_events.source == 'realtime':
+        realtime_source = RealtimeSource(task_events)
+        await realtime_source.start()
+    rate_limit_flush = asyncio.create_task(rate_limit_events.run())
+    metrics_snapshots = asyncio.create_task(metrics.run())
+    # /health/ready answers from the result of this loop, never from a request
+    readiness_probe = asyncio.create_task(upstream_probe.run())
+    yield
+    supabase_client.cancel()
+    readiness_probe.cancel()
+    rate_limit_flush.cancel()
+    rate_limit_events.flush()
+    metrics_snapshots.cancel()
+    # Counters of a stopped worker stay in the totals of the others
+    metrics.write_snapshot()
+    if realtime_source is not None:
+        await realtime_source.stop()
+    # Close the shared PostgREST connection pool
+    await postgrest_pool.close()
+    # Last writes of /data and /items, the log is folded into its snapshot
+    if last_lessons_endpoints.persistence is not None:
+        await asyncio.to_thread(last_lessons_endpoints.persistence.close)
+
+
+app = FastAPI(title='Todo API', lifespan=lifespan)
 app.state.limiter = limiter
 
 # ============================================
@@ -84,12 +97,9 @@ async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
     """Custom handler for rate limiting"""
     from datetime import datetime, timedelta
     
-    # Optionally capture rate limit events in Sentry
-    sentry_sdk.capture_message(
-        f"Rate limit exceeded for {request.url.path}",
-        level="warning",
-        extras={"path": request.url.path, "client": request.client.host if request.client else "unknown"}
-    )
+    # Counted here, sent to Sentry as one summary per path and client every flush interval
+    rate_limit_events.record(request.url.path, request.client.host if request.client else "unknown")
+    rate_limit_rejections.inc(("slowapi",))
     
     if request.url.path.startswith("/auth"):
         reset_time = datetime.now() + timedelta(minutes=1)
@@ -130,12 +140,14 @@ async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
 #)
 
 
-app.add_middleware(HeaderSizeLimitMiddleware)
-app.add_middleware(BodySizeLimitMiddleware)
-app.add_middleware(HelmetMiddleware)
-from slowapi.middleware import SlowAPIMiddleware
-app.add_middleware(SlowAPIMiddleware)
-app.add_middleware(GlobalRateLimitMiddleware)
+# Metrics (and /metrics), /health/live and /health/ready, body limit (413), global rate limit (429), header limit (431),
+# /openapi.json from prebuilt bytes and Helmet headers in one pure ASGI middleware - order of the stages is the order of the checks.
+# /auth/login limit is enforced by the @limiter.limit decorator itself.
+app.add_middleware(
+    SecurityPipelineMiddleware,
+    stages=[MetricsStage(), HealthStage(), BodySizeLimit(), GlobalRateLimit(), HeaderSizeLimit(), OpenAPIStage(app),
+            SecurityHeaders()],
+)
 
 # ============================================
 # CONFIGURE LOGGING
@@ -162,4 +174,8 @@ async def favicon():
 app.include_router(auth_router)
 app.include_router(tasks.router)
 app.include_router(last_lessons_endpoints.router)
-app.include_router(admin.router)
\ No newline at end of file
+app.include_router(admin.router)
+
+# Startup objects stay for the whole life of the worker: moved out of the collected generations
+gc.freeze()
+gc.enable()
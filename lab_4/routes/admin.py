@@ -1,41 +1,102 @@
-from fastapi import APIRouter, HTTPException, Depends
-from auth import get_current_user, get_authenticated_supabase
-from supabase import Client
+from fastapi import APIRouter, HTTPException, Depends, Request
+from auth import get_current_user, get_authenticated_supabase, token_verifier
+from postgrest import AsyncPostgrestClient
 from database import supabase as admin_supabase
+from infrastructure.database.pool import postgrest_pool
+from infrastructure.database import executor
+from infrastructure.cache.etag import etag_matches, make_etag, not_modified, set_etag, version_stamp
+from infrastructure.cache.missing import missing_tasks
+from infrastructure.events.hub import task_events
+from infrastructure.serialization.codec import FastJSONResponse
+from infrastructure.serialization.export import EXPORT_PAGE_SIZE, export_response
+from infrastructure.database.pagination import keyset_pages
+from infrastructure.monitoring.upstream import call_auth
+from infrastructure.cache.roles import get_role, invalidate_role, role_cache
+from schemas import RoleUpdate
 
-router = APIRouter(prefix='/admin', tags=['admin'])
+router = APIRouter(prefix='/admin', tags=['admin'], default_response_class=FastJSONResponse)
+
+PROFILE_FIELDS = ('id', 'email', 'role', 'created_at')
 
 async def require_admin(user = Depends(get_current_user)):
-    profile_response = admin_supabase.table('profiles').select('role').eq('id', user.user.id).execute()
+    role = await get_role(user.user.id)
     
-    if not profile_response.data or profile_response.data[0].get('role') != 'admin':
+    if role != 'admin':
         raise HTTPException(403, detail={'error': 'Admin access required'})
     
     return user
 
 @router.get('/users')
 async def get_all_users(
+    request: Request,
     user = Depends(require_admin),
-    supabase: Client = Depends(get_authenticated_supabase)
+    supabase: AsyncPostgrestClient = Depends(get_authenticated_supabase)
 ):
-    response = supabase.table('profiles').select('id, email, role, created_at').execute()
-    return response.data
+    version = await version_stamp(supabase, 'profiles_version')
+    etag = make_etag(user.user.id, version) if version else None
+    if etag and etag_matches(request.headers.get('if-none-match'), etag):
+        return not_modified(etag)
+
+    result = await supabase.table('profiles').select('id, email, role, created_at').execute()
+    response = FastJSONResponse(result.data)
+    if etag:
+        set_etag(response, etag)
+    return response
+
+@router.get('/users/export')
+async def export_users(
+    request: Request,
+    format: str = 'ndjson',
+    user = Depends(require_admin),
+    supabase: AsyncPostgrestClient = Depends(get_authenticated_supabase)
+):
+    """All profiles as NDJSON or CSV, streamed page by page instead of one list"""
+    pages = keyset_pages(lambda: supabase.table('profiles').select(','.join(PROFILE_FIELDS)),
+                         ('id',), EXPORT_PAGE_SIZE, desc=False)
+    return await export_response(request, pages, PROFILE_FIELDS, format, 'users')
+
+@router.get('/stats')
+async def get_stats(user = Depends(require_admin)):
+    return {
+        'postgrest_pool': postgrest_pool.stats(),
+        'auth_executor': executor.stats(),
+        'token_cache': token_verifier.cache.stats(),
+        'role_cache': role_cache.stats(),
+        'missing_task_cache': missing_tasks.stats(),
+        'task_events': task_events.stats(),
+    }
+
+@router.patch('/users/{user_id}')
+async def update_user_role(
+    user_id: str,
+    role_update: RoleUpdate,
+    user = Depends(require_admin),
+    supabase: AsyncPostgrestClient = Depends(get_authenticated_supabase)
+):
+    response = await supabase.table('profiles').update({'role': role_update.role}).eq('id', user_id).execute()
+    invalidate_role(user_id)
+
+    if not response.data:
+        raise HTTPException(404, detail={'error': 'User not found'})
+
+    return response.data[0]
 
 @router.delete('/users/{user_id}', status_code=204)
 async def delete_user(
     user_id: str,
     user = Depends(require_admin),
-    supabase: Client = Depends(get_authenticated_supabase)
+    supabase: AsyncPostgrestClient = Depends(get_authenticated_supabase)
 ):
-    check_response = admin_supabase.table('profiles').select('id').eq('id', user_id).execute()
+    check_response = await postgrest_pool.base.table('profiles').select('id').eq('id', user_id).execute()
     
     if not check_response.data:
         raise HTTPException(404, detail={'error': 'User not found'})
     
-    response = supabase.table('profiles').delete().eq('id', user_id).execute()
+    response = await supabase.table('profiles').delete().eq('id', user_id).execute()
+    invalidate_role(user_id)
     
     try:
-        admin_supabase.auth.admin.delete_user(user_id)
+        await call_auth(admin_supabase.auth.admin.delete_user, user_id)
     except Exception:
         pass
     
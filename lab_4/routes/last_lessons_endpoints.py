@@ -1,7 +1,11 @@
 
-from fastapi import APIRouter, Depends, Response, Request
+from fastapi import APIRouter, Depends, HTTPException, Response, Request, Query
 from infrastructure.middleware.rateLimit import limiter
+from infrastructure.database.memory import IndexedStore
+from infrastructure.database.persistence import open_persistence
+from infrastructure.database.pagination import PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor
 from pydantic import BaseModel
+from typing import Optional
 from datetime import datetime
 from auth import get_current_user
 from schemas import HealthResponse
@@ -33,16 +37,36 @@ class ItemWithDescription(BaseModel):
         }
 
 
-data = [
+# Rows posted to /data and /items survive restarts with LESSONS_PERSISTENCE set, closed in main's lifespan
+persistence = open_persistence()
+
+data = IndexedStore([
     {"id": 1, "name": "Element 1"},
     {"id": 2, "name": "Element 2"}
-]
+], table="data", persistence=persistence)
 
 
-items = [
+items = IndexedStore([
     {"id": 1, "name": "Element 1", "description": "description 1"},
     {"id": 2, "name": "Element 2", "description": "description 2"}
-]
+], table="items", persistence=persistence)
+
+
+def list_page(store: IndexedStore, request: Request, limit: int, cursor: Optional[str], name: Optional[str]) -> Response:
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, 1)[0]
+        except InvalidCursor:
+            raise HTTPException(400, detail={'error': 'Invalid cursor'})
+    # Body comes encoded from the store, no per-request serialization
+    body, last = store.page(limit, after, name)
+    response = Response(body, media_type='application/json')
+    if last is not None:
+        next_cursor = encode_cursor(last, ('id',))
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.url.include_query_params(cursor=next_cursor, limit=limit)}>; rel="next"'
+    return response
 
 
 
@@ -75,7 +99,7 @@ async def get_health():
     "/data",
     responses={
         200: {
-            "description": "List of all data items",
+            "description": "Page of data items by id, X-Next-Cursor and Link headers point to the next one",
             "content": {
                 "application/json": {
                     "example": [
@@ -87,15 +111,20 @@ async def get_health():
         }
     }
 )
-def get_data(user=Depends(get_current_user)):
-    
-    return data
+async def get_data(
+    request: Request,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    name: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    return list_page(data, request, limit, cursor, name)
 
 @router.get(
     "/items",
     responses={
         200: {
-            "description": "List of all items with descriptions",
+            "description": "Page of items by id, X-Next-Cursor and Link headers point to the next one",
             "content": {
                 "application/json": {
                     "example": [
@@ -107,8 +136,34 @@ def get_data(user=Depends(get_current_user)):
         }
     }
 )
-def get_items(user=Depends(get_current_user)):
-    return items
+async def get_items(
+    request: Request,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    name: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    return list_page(items, request, limit, cursor, name)
+
+@router.get(
+    "/items/{item_id}",
+    responses={
+        200: {
+            "description": "Item with description",
+            "content": {
+                "application/json": {
+                    "example": {"id": 1, "name": "Element 1", "description": "Opis"}
+                }
+            }
+        },
+        404: {"description": "Item not found"}
+    }
+)
+async def get_item(item_id: int, user=Depends(get_current_user)):
+    item = items.get(item_id)
+    if item is None:
+        raise HTTPException(404, detail={'error': 'Item not found'})
+    return item
 
 @router.post(
     "/items",
@@ -127,14 +182,11 @@ def get_items(user=Depends(get_current_user)):
         }
     }
 )
-def add_item(item: ItemWithDescription, user=Depends(get_current_user)):
-    new_item = {
-        "id": len(items) + 1,
+async def add_item(item: ItemWithDescription, user=Depends(get_current_user)):
+    return await items.append({
         "name": item.name,
         "description": item.description
-    }
-    items.append(new_item)
-    return new_item
+    })
 
 @router.post(
     "/data",
@@ -152,12 +204,8 @@ def add_item(item: ItemWithDescription, user=Depends(get_current_user)):
         }
     }
 )
-def add_data(item: Item, user=Depends(get_current_user)):
-    
-    new_item = {
-        "id": len(data) + 1,
+async def add_data(item: Item, user=Depends(get_current_user)):
+    return await data.append({
         "name": item.name
-    }
-    data.append(new_item)
-    return new_item
+    })
 
@@ -1,65 +1,434 @@
-from fastapi import APIRouter, HTTPException, Depends, Response, Request
+from fastapi import APIRouter, HTTPException, Depends, Response, Request, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
+import os
+import uuid
 from schemas import TaskCreate, TaskUpdate, Task
 from auth import get_current_user, get_authenticated_supabase
-from supabase import Client
+from postgrest import AsyncPostgrestClient
+from postgrest.exceptions import APIError
+from infrastructure.database.pool import postgrest_pool
+from infrastructure.events.hub import event_stream, task_events
+from infrastructure.serialization.codec import FastJSONResponse, read_json
+from infrastructure.cache.missing import forget_missing, is_missing, mark_missing
+from infrastructure.cache.etag import etag_matches, make_etag, not_modified, set_etag, version_stamp
+from infrastructure.database.pagination import (
+    PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor, keyset_filter, keyset_pages, parse_fields
+)
+from infrastructure.serialization.export import EXPORT_PAGE_SIZE, export_response
 
-router = APIRouter(prefix='/tasks', tags=['tasks'])
+router = APIRouter(prefix='/tasks', tags=['tasks'], default_response_class=FastJSONResponse)
 
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '500'))
+
+
+
+TASK_FIELDS = ('id', 'title', 'completed', 'user_id', 'created_at')
+# Newest first, id breaks ties between tasks created in the same instant
+TASK_ORDER = ('created_at', 'id')
 
 
 @router.get('/')
 async def get_tasks(
+    request: Request,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     user = Depends(get_current_user),
-    supabase: Client = Depends(get_authenticated_supabase)
+    supabase: AsyncPostgrestClient = Depends(get_authenticated_supabase)
 ):
-    response = supabase.table('tasks').select('*').order(
-        'created_at', desc=True).execute()
-    return response.data
+    try:
+        columns, requested = parse_fields(fields, TASK_FIELDS, TASK_ORDER)
+    except ValueError as e:
+        raise HTTPException(400, detail={'error': str(e)})
+
+    query = supabase.table('tasks').select(columns)
+    if cursor:
+        try:
+            values = decode_cursor(cursor, len(TASK_ORDER))
+        except InvalidCursor:
+            raise HTTPException(400, detail={'error': 'Invalid cursor'})
+        query = query.or_(keyset_filter(TASK_ORDER, values))
+    for key in TASK_ORDER:
+        query = query.order(key, desc=True)
+
+    # Version stamp first - a matching If-None-Match skips the list query entirely,
+    # and the list fetched after it is never older than the ETag it is sent with
+    version = await version_stamp(supabase, 'tasks_version')
+    etag = make_etag(user.user.id, version, request.url.query) if version else None
+    if etag and etag_matches(request.headers.get('if-none-match'), etag):
+        return not_modified(etag)
+
+    # One extra row tells whether there is a next page
+    result = await query.limit(limit + 1).execute()
+    tasks = result.data
+    headers = {}
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_cursor(tasks[-1], TASK_ORDER)
+        next_url = request.url.include_query_params(cursor=next_cursor, limit=limit)
+        headers['X-Next-Cursor'] = next_cursor
+        headers['Link'] = f'<{next_url}>; rel="next"'
+
+    if requested is not None and len(requested) != len(columns.split(',')):
+        tasks = [{name: task[name] for name in requested} for task in tasks]
+    response = FastJSONResponse(tasks, headers=headers)
+    if etag:
+        set_etag(response, etag)
+    return response
+
+@router.get('/stream')
+async def stream_tasks(user = Depends(get_current_user)):
+    """Server-Sent Events with insert/update/delete of the caller's tasks"""
+    # Stream ends with the token, the client reconnects with a fresh one
+    claims = getattr(user, 'claims', None) or {}
+    expires_at = float(claims['exp']) if 'exp' in claims else None
+    return StreamingResponse(
+        event_stream(user.user.id, expires_at=expires_at),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@router.get('/export')
+async def export_tasks(
+    request: Request,
+    format: str = 'ndjson',
+    fields: Optional[str] = None,
+    user = Depends(get_current_user),
+    supabase: AsyncPostgrestClient = Depends(get_authenticated_supabase)
+):
+    """All of the caller's tasks as NDJSON or CSV, streamed page by page"""
+    try:
+        columns, requested = parse_fields(fields, TASK_FIELDS, TASK_ORDER)
+    except ValueError as e:
+        raise HTTPException(400, detail={'error': str(e)})
+    if requested is None:
+        columns, requested = ','.join(TASK_FIELDS), TASK_FIELDS
+
+    pages = keyset_pages(lambda: supabase.table('tasks').select(columns), TASK_ORDER, EXPORT_PAGE_SIZE)
+    return await export_response(request, pages, requested, format, 'tasks')
 
 @router.post('/', status_code=201)
 async def create_task(
     request: Request,
     user = Depends(get_current_user),
-    supabase: Client = Depends(get_authenticated_supabase)
+    supabase: AsyncPostgrestClient = Depends(get_authenticated_supabase)
 ):
     content_type = request.headers.get('content-type', '')
     if 'application/json' not in content_type:
         raise HTTPException(400, 'Content-Type must be application/json')
     try:
-        data = await request.json()
-    except Exception:
+        data = await read_json(request)
+    except ValueError:
         raise HTTPException(400, 'Invalid JSON payload')
     from schemas import TaskCreate
     try:
         task = TaskCreate(**data)
     except Exception:
         raise HTTPException(400, 'Invalid task data')
-    response = supabase.table('tasks').insert(
+    response = await supabase.table('tasks').insert(
         {'title': task.title, 'user_id': user.user.id}).execute()
-    return response.data[0]
+    forget_missing(str(response.data[0]['id']))
+    task_events.record_mutation(user.user.id, 'insert', response.data[0])
+    return FastJSONResponse(response.data[0], status_code=201)
+
+def _classify_missing(ids, existing) -> list:
+    """404/403 results for ids a mutation did not touch (same rule as update_task)"""
+    return [
+        {'id': task_id, 'status': 403, 'error': 'Access denied'} if task_id in existing
+        else {'id': task_id, 'status': 404, 'error': 'Task not found'}
+        for task_id in ids
+    ]
+
+
+async def _batch_create(supabase, items, user_id) -> list:
+    results = [None] * len(items)
+    rows, indexes = [], []
+    for index, item in enumerate(items):
+        try:
+            task = TaskCreate(**item)
+        except Exception:
+            results[index] = {'index': index, 'status': 400, 'error': 'Invalid task data'}
+            continue
+        rows.append({'title': task.title, 'user_id': user_id})
+        indexes.append(index)
+
+    if rows:
+        # One INSERT for all valid items, PostgREST returns the rows in the same order
+        try:
+            response = await supabase.table('tasks').insert(rows).execute()
+            for index, task in zip(indexes, response.data):
+                forget_missing(str(task['id']))
+                results[index] = {'index': index, 'status': 201, 'task': task}
+        except APIError:
+            for index in indexes:
+                results[index] = {'index': index, 'status': 500, 'error': 'Database error'}
+    return results
+
+
+def _is_task_id(task_id: str) -> bool:
+    """Whether `task_id` can be a tasks.id (uuid) - anything else makes PostgREST fail with 22P02"""
+    try:
+        uuid.UUID(task_id)
+    except (ValueError, TypeError, AttributeError):
+        return False
+    return True
+
+
+def _parse_patch(item):
+    """Validated {completed?, title?} of an update, or an error message"""
+    patch = {}
+    if 'completed' in item:
+        if not isinstance(item['completed'], bool):
+            return None, 'Invalid task data'
+        patch['completed'] = item['completed']
+    if 'title' in item:
+        try:
+            patch['title'] = TaskCreate(title=item['title']).title
+        except Exception:
+            return None, 'Invalid task data'
+    if not patch:
+        return None, 'Nothing to update'
+    return patch, None
+
+
+def _parse_update(item):
+    """(task_id, patch) or an error message"""
+    if 'id' not in item or not isinstance(item['id'], (str, int)) or isinstance(item['id'], bool):
+        return None, 'Missing task id'
+    patch, error = _parse_patch(item)
+    if error:
+        return None, error
+    return (str(item['id']), patch), None
+
+
+async def _batch_update(supabase, items) -> list:
+    results = [None] * len(items)
+    groups = {}  # same patch -> one UPDATE ... WHERE id IN (...)
+    seen = set()
+    for index, item in enumerate(items):
+        parsed, error = _parse_update(item)
+        if error:
+            results[index] = {'id': item.get('id'), 'status': 400, 'error': error}
+            continue
+        task_id, patch = parsed
+        if task_id in seen:
+            results[index] = {'id': task_id, 'status': 400, 'error': 'Duplicate task id'}
+            continue
+        seen.add(task_id)
+        groups.setdefault(tuple(sorted(patch.items())), {})[task_id] = index
+
+    async def run(patch, ids):
+        # Malformed ids would fail the whole group, they end up as 404 misses instead
+        ids = [task_id for task_id in ids if _is_task_id(task_id)]
+        if not ids:
+            return []
+        response = await supabase.table('tasks').update(patch).in_('id', ids).execute()
+        return response.data
+
+    # Groups are independent, send them concurrently over the shared pool
+    outcomes = await asyncio.gather(
+        *(run(dict(key), ids) for key, ids in groups.items()), return_exceptions=True)
+
+    missed = []
+    for ids, outcome in zip(groups.values(), outcomes):
+        if isinstance(outcome, Exception):
+            for task_id, index in ids.items():
+                results[index] = {'id': task_id, 'status': 500, 'error': 'Database error'}
+            continue
+        updated = {str(task['id']): task for task in outcome}
+        for task_id, index in ids.items():
+            if task_id in updated:
+                results[index] = {'id': task_id, 'status': 200, 'task': updated[task_id]}
+            else:
+                missed.append((task_id, index))
+
+    if missed:
+        outcome = await _missing_results(supabase, [task_id for task_id, _ in missed])
+        for (_, index), result in zip(missed, outcome):
+            results[index] = result
+    return results
+
+
+async def _batch_delete(supabase, items) -> list:
+    results = [None] * len(items)
+    ids = {}
+    for index, task_id in enumerate(items):
+        if not isinstance(task_id, (str, int)) or isinstance(task_id, bool):
+            results[index] = {'id': task_id, 'status': 400, 'error': 'Missing task id'}
+            continue
+        ids.setdefault(str(task_id), []).append(index)
+    if not ids:
+        return results
+
+    deleted = set()
+    well_formed = [task_id for task_id in ids if _is_task_id(task_id)]
+    if well_formed:
+        try:
+            response = await supabase.table('tasks').delete().in_('id', well_formed).execute()
+        except APIError:
+            for task_id, indexes in ids.items():
+                for index in indexes:
+                    results[index] = {'id': task_id, 'status': 500, 'error': 'Database error'}
+            return results
+        deleted = {str(task['id']) for task in response.data}
+    missed = [task_id for task_id in ids if task_id not in deleted]
+    outcome = dict(zip(missed, await _missing_results(supabase, missed))) if missed else {}
+    for task_id, indexes in ids.items():
+        for index in indexes:
+            results[index] = outcome.get(task_id) or {'id': task_id, 'status': 204}
+    return results
+
+
+async def _missing_results(supabase, ids) -> list:
+    # A malformed id would fail the lookup with 22P02, it can't exist anyway
+    lookup = [task_id for task_id in ids if _is_task_id(task_id)]
+    # task_exists sees past RLS, so its 404s are safe to cache. The checks run concurrently
+    # over the shared pool, only for ids the mutation missed
+    answers = await asyncio.gather(*(_task_exists(supabase, task_id) for task_id in lookup))
+    existing = {task_id for task_id, exists in zip(lookup, answers) if exists}
+    verified = None not in answers
+    if not verified:
+        # Not installed - the anon client may not see other users' rows, nothing is cached
+        check_response = await postgrest_pool.base.table('tasks').select('id').in_('id', lookup).execute()
+        existing = {str(row['id']) for row in check_response.data}
+    results = _classify_missing(ids, existing)
+    for result in results:
+        if result['status'] == 404 and (verified or not _is_task_id(result['id'])):
+            mark_missing(result['id'])
+    return results
+
+
+@router.post('/batch')
+async def batch_tasks(
+    request: Request,
+    user = Depends(get_current_user),
+    supabase: AsyncPostgrestClient = Depends(get_authenticated_supabase)
+):
+    """
+    Bulk create/update/delete: {"create": [{title}], "update": [{id, title?, completed?}], "delete": [id]}.
+    Phases run in that order, every item gets its own status in the response.
+    """
+    content_type = request.headers.get('content-type', '')
+    if 'application/json' not in content_type:
+        raise HTTPException(400, 'Content-Type must be application/json')
+    try:
+        data = await read_json(request)
+    except ValueError:
+        raise HTTPException(400, 'Invalid JSON payload')
+
+    if not isinstance(data, dict):
+        raise HTTPException(400, 'Invalid batch payload')
+    operations = {}
+    for name in ('create', 'update', 'delete'):
+        items = data.get(name) or []
+        if not isinstance(items, list) or (name != 'delete' and not all(isinstance(i, dict) for i in items)):
+            raise HTTPException(400, 'Invalid batch payload')
+        operations[name] = items
+    if sum(len(items) for items in operations.values()) > BATCH_MAX_ITEMS:
+        raise HTTPException(400, f'Batch is limited to {BATCH_MAX_ITEMS} items')
+
+    results = {
+        'create': await _batch_create(supabase, operations['create'], user.user.id),
+        'update': await _batch_update(supabase, operations['update']),
+        'delete': await _batch_delete(supabase, operations['delete']),
+    }
+    for name, event in (('create', 'insert'), ('update', 'update'), ('delete', 'delete')):
+        for result in results[name]:
+            if result['status'] in (200, 201):
+                task_events.record_mutation(user.user.id, event, result['task'])
+            elif result['status'] == 204:
+                task_events.record_mutation(user.user.id, event, {'id': result['id']})
+    return FastJSONResponse(results)
+
+# sql/003 functions PostgREST reported as missing (PGRST202)
+_uninstalled_functions = set()
+
+
+async def _checked_mutation(supabase, function: str, params: dict, query, task_id: str) -> dict:
+    """
+    {'status': 200/204/403/404, 'task'?} from one sql/003 RPC call.
+    Falls back to the mutation + existence lookup when the function is not installed.
+    """
+    if function not in _uninstalled_functions:
+        try:
+            response = await supabase.rpc(function, params).execute()
+            return response.data
+        except APIError as e:
+            if e.code == '22P02' and not _is_task_id(task_id):
+                # Not a valid id for the column type - can't exist. With a well-formed id
+                # the bad value is in the payload, which must not mark a real task missing
+                return {'status': 404}
+            if e.code != 'PGRST202':
+                raise
+            # Not installed - don't ask again until restart
+            _uninstalled_functions.add(function)
+
+    response = await query.execute()
+    if response.data:
+        return {'status': 200, 'task': response.data[0]}
+    exists = await _task_exists(supabase, task_id)
+    if exists is None:
+        # Without task_exists only the anon client can look, under RLS it may not see the row
+        check_response = await postgrest_pool.base.table('tasks').select('id').eq('id', task_id).execute()
+        return {'status': 403 if check_response.data else 404, 'unverified': True}
+    return {'status': 403 if exists else 404}
+
+
+async def _task_exists(supabase, task_id: str):
+    """
+    sql/003 task_exists (sees past RLS) through the caller's client,
+    None when the function is not installed.
+    """
+    if 'task_exists' in _uninstalled_functions:
+        return None
+    try:
+        response = await supabase.rpc('task_exists', {'p_id': task_id}).execute()
+    except APIError as e:
+        if e.code != 'PGRST202':
+            raise
+        _uninstalled_functions.add('task_exists')
+        return None
+    return bool(response.data)
+
+
+def _raise_for_miss(task_id: str, result: dict) -> None:
+    if result['status'] == 404:
+        # An RLS-limited lookup can't tell a missing task from someone else's -
+        # caching that would hide the task from its owner
+        if not result.get('unverified'):
+            mark_missing(task_id)
+        raise HTTPException(404, detail={'error': 'Task not found'})
+    if result['status'] == 403:
+        raise HTTPException(403, detail={'error': 'Access denied'})
+
 
 @router.patch('/{task_id}')
 async def update_task(
     task_id: str,
     request: Request,
     user = Depends(get_current_user),
-    supabase: Client = Depends(get_authenticated_supabase)
+    supabase: AsyncPostgrestClient = Depends(get_authenticated_supabase)
 ):
-    body = await request.json()
-    update_data = {}
-    if 'completed' in body:
-        update_data['completed'] = body['completed']
-    if 'title' in body:
-        update_data['title'] = body['title']
-    response = supabase.table('tasks').update(update_data).eq('id', task_id).execute()
-    if not response.data:
-        from database import supabase as admin_supabase
-        check_response = admin_supabase.table('tasks').select('id').eq('id', task_id).execute()
-        if not check_response.data:
-            raise HTTPException(404, detail={'error': 'Task not found'})
-        else:
-            raise HTTPException(403, detail={'error': 'Access denied'})
-    return response.data[0]
+    if is_missing(task_id):
+        raise HTTPException(404, detail={'error': 'Task not found'})
+    try:
+        body = await read_json(request)
+    except ValueError:
+        raise HTTPException(400, 'Invalid JSON payload')
+    if not isinstance(body, dict):
+        raise HTTPException(400, 'Invalid task data')
+    # Same rules as /tasks/batch, a value the sql/003 cast rejects never reaches it
+    update_data, error = _parse_patch(body)
+    if error:
+        raise HTTPException(400, error)
+    result = await _checked_mutation(
+        supabase, 'update_task_checked', {'p_id': task_id, 'p_patch': update_data},
+        supabase.table('tasks').update(update_data).eq('id', task_id), task_id)
+    _raise_for_miss(task_id, result)
+    task_events.record_mutation(user.user.id, 'update', result['task'])
+    return FastJSONResponse(result['task'])
 
 @router.options('/', include_in_schema=False)
 async def options_tasks():
@@ -71,21 +440,13 @@ async def options_tasks():
 async def delete_task(
     task_id: str, 
     user = Depends(get_current_user),
-    supabase: Client = Depends(get_authenticated_supabase)
+    supabase: AsyncPostgrestClient = Depends(get_authenticated_supabase)
 ):
-
-    response = supabase.table('tasks').delete().eq('id', task_id).execute()
-    
-
-    if not response.data:
-
-        from database import supabase as admin_supabase
-        check_response = admin_supabase.table('tasks').select('id').eq('id', task_id).execute()
-        
-        if not check_response.data:
-            raise HTTPException(404, detail={'error': 'Task not found'})
-        else:
-            raise HTTPException(403, detail={'error': 'Access denied'})
-    
+    if is_missing(task_id):
+        raise HTTPException(404, detail={'error': 'Task not found'})
+    result = await _checked_mutation(
+        supabase, 'delete_task_checked', {'p_id': task_id},
+        supabase.table('tasks').delete().eq('id', task_id), task_id)
+    _raise_for_miss(task_id, result)
+    task_events.record_mutation(user.user.id, 'delete', {'id': task_id})
     return None
-
@@ -1,6 +1,6 @@
 
 from pydantic import BaseModel, EmailStr, validator
-from typing import Optional
+from typing import Optional, Literal
 from datetime import datetime
 
 
@@ -41,6 +41,10 @@ class TaskUpdate(BaseModel):
     completed: bool
 
 
+class RoleUpdate(BaseModel):
+    role: Literal['user', 'admin']
+
+
 class Task(BaseModel):
     id: str
     title: constr(strip_whitespace=True, min_length=1, max_length=255)
@@ -0,0 +1,3 @@
+-- Keyset pagination of GET /tasks/ (order by created_at desc, id desc per user)
+create index if not exists tasks_user_created_at_id_idx
+    on public.tasks (user_id, created_at desc, id desc);
@@ -0,0 +1,47 @@
+-- updated_at on tasks and profiles + cheap version stamps for ETags
+-- (GET /tasks/ and GET /admin/users answer If-None-Match from these alone)
+
+alter table public.tasks add column if not exists updated_at timestamptz not null default now();
+alter table public.profiles add column if not exists updated_at timestamptz not null default now();
+
+create or replace function public.set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$;
+
+drop trigger if exists tasks_set_updated_at on public.tasks;
+create trigger tasks_set_updated_at
+    before update on public.tasks
+    for each row execute function public.set_updated_at();
+
+drop trigger if exists profiles_set_updated_at on public.profiles;
+create trigger profiles_set_updated_at
+    before update on public.profiles
+    for each row execute function public.set_updated_at();
+
+-- security invoker: RLS of the caller applies, so the stamp covers exactly the rows the caller can list.
+-- A delete lowers count, an insert or update moves max(updated_at).
+create or replace function public.tasks_version()
+returns json
+language sql
+stable
+security invoker
+as $$
+    select json_build_object('count', count(*), 'updated_at', max(updated_at)) from public.tasks;
+$$;
+
+create or replace function public.profiles_version()
+returns json
+language sql
+stable
+security invoker
+as $$
+    select json_build_object('count', count(*), 'updated_at', max(updated_at)) from public.profiles;
+$$;
+
+create index if not exists tasks_user_updated_at_idx on public.tasks (user_id, updated_at desc);
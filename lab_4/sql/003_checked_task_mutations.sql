@@ -0,0 +1,52 @@
+-- PATCH/DELETE /tasks/{id} in one round-trip: mutate under the caller's RLS and,
+-- when nothing was touched, tell "does not exist" (404) from "not yours" (403).
+
+-- Existence check has to see every row, so it bypasses RLS - it returns nothing but a boolean
+create or replace function public.task_exists(p_id public.tasks.id%type)
+returns boolean
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select exists (select 1 from public.tasks where id = p_id);
+$$;
+
+revoke all on function public.task_exists(public.tasks.id%type) from public, anon;
+grant execute on function public.task_exists(public.tasks.id%type) to authenticated;
+
+create or replace function public.update_task_checked(p_id public.tasks.id%type, p_patch jsonb)
+returns json
+language plpgsql
+security invoker
+as $$
+declare
+    v_task public.tasks;
+begin
+    update public.tasks set
+        title = coalesce(p_patch->>'title', title),
+        completed = coalesce((p_patch->>'completed')::boolean, completed)
+    where id = p_id
+    returning * into v_task;
+
+    if found then
+        return json_build_object('status', 200, 'task', row_to_json(v_task));
+    end if;
+    return json_build_object('status', case when public.task_exists(p_id) then 403 else 404 end);
+end;
+$$;
+
+create or replace function public.delete_task_checked(p_id public.tasks.id%type)
+returns json
+language plpgsql
+security invoker
+as $$
+begin
+    delete from public.tasks where id = p_id;
+
+    if found then
+        return json_build_object('status', 204);
+    end if;
+    return json_build_object('status', case when public.task_exists(p_id) then 403 else 404 end);
+end;
+$$;
@@ -0,0 +1,4 @@
+-- TASK_EVENTS_SOURCE=realtime: publish task changes to Supabase Realtime.
+-- Full replica identity makes DELETE events carry user_id, so they can be routed to the owner's streams.
+alter table public.tasks replica identity full;
+alter publication supabase_realtime add table public.tasks;
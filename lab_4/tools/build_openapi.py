@@ -0,0 +1,46 @@
+"""
+Writes the app's OpenAPI schema to a file at build time, so a starting worker
+serves /openapi.json from bytes instead of generating it from the routes.
+Rebuild it whenever routes or schemas change, --check fails when the file
+is out of date (for CI).
+
+Run from lab_4/:
+    python -m tools.build_openapi [openapi.json] [--check]
+then OPENAPI_SCHEMA_PATH points at the file (default openapi.json).
+"""
+
+import argparse
+import os
+import sys
+
+from infrastructure.middleware.openapi import OPENAPI_SCHEMA_PATH
+from infrastructure.serialization.codec import dumps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output', nargs='?', default=OPENAPI_SCHEMA_PATH or 'openapi.json')
+    parser.add_argument('--check', action='store_true', help='only compare with the existing file, exit 1 if it differs')
+    args = parser.parse_args()
+
+    from main import app
+    openapi = app.openapi()
+    schema = dumps(openapi)
+
+    if args.check:
+        current = open(args.output, 'rb').read() if os.path.exists(args.output) else None
+        if current != schema:
+            print(f'{args.output} is out of date, run python -m tools.build_openapi {args.output}')
+            sys.exit(1)
+        print(f'{args.output} is up to date')
+        return
+
+    temporary = f'{args.output}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(schema)
+    os.replace(temporary, args.output)
+    print(f"{len(openapi['paths'])} paths -> {args.output}: {len(schema) / 1024:.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Builds the breached-password Bloom filter used by /auth/register.
+
+Input is a text file with one entry per line, either a plain password or a
+SHA-1 hash in hex (HIBP format "HASH:count" is accepted). Use "-" for stdin.
+
+Run from lab_4/:
+    python -m tools.build_password_filter passwords.txt data/breached.bloom [--fp-rate 0.001]
+then set PASSWORD_BLOOM_PATH=data/breached.bloom
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+
+from infrastructure.security.passwords import write_bloom_filter
+
+
+SHA1_HEX = re.compile(r'^[0-9A-Fa-f]{40}(:\d+)?$')
+
+
+def read_digests(path: str, hashed: str):
+    """SHA-1 digests of the non-empty lines of `path`"""
+    source = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    try:
+        for raw in source:
+            line = raw.rstrip(b'\r\n')
+            if not line:
+                continue
+            text = line.decode('utf-8', errors='surrogateescape')
+            if hashed == 'yes' or (hashed == 'auto' and SHA1_HEX.match(text)):
+                yield bytes.fromhex(text[:40])
+            else:
+                yield hashlib.sha1(line).digest()
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+
+
+def count_lines(path: str) -> int:
+    count = 0
+    with open(path, 'rb') as f:
+        for raw in f:
+            if raw.strip():
+                count += 1
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='text file with passwords or SHA-1 hashes, "-" for stdin')
+    parser.add_argument('output', help='filter file to write')
+    parser.add_argument('--fp-rate', type=float, default=0.001, help='false positive rate (default 0.001)')
+    parser.add_argument('--count', type=int, help='number of entries (required for stdin, counted otherwise)')
+    parser.add_argument('--hashed', choices=('auto', 'yes', 'no'), default='auto',
+                        help='lines are SHA-1 hex hashes (auto detects per line)')
+    args = parser.parse_args()
+
+    if args.source == '-' and not args.count:
+        parser.error('--count is required when reading from stdin')
+    count = args.count or count_lines(args.source)
+
+    started = time.perf_counter()
+    bits, hashes = write_bloom_filter(read_digests(args.source, args.hashed), count, args.output, args.fp_rate)
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(args.output)
+    print(f'{count} entries -> {args.output}: {size / 1024 / 1024:.1f} MiB, '
+          f'{bits} bits, {hashes} hashes, built in {elapsed:.1f} s')
+
+
+if __name__ == '__main__':
+    main()